@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+""" Benchmark: blocklist lookups and memory
+
+    Writes a blocklist file of N random numbers, maps it, and measures:
+    load time, lookup rate, and the memory the process has gained.
+    Compares it with a `set` of strings.
+
+    Usage: python benchmarks/blocklist.py [N]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import random
+import resource
+import tempfile
+from array import array
+from time import time
+
+from smsframework.blocklist import Blocklist
+
+
+def rss():
+    """ Current max RSS, MB """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def lookups(container, numbers):
+    """ Look the numbers up
+
+        :returns: lookups per second
+    """
+    start = time()
+    for number in numbers:
+        number in container
+    return len(numbers) / (time() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000000
+    path = os.path.join(tempfile.mkdtemp(), 'optout.bin')
+    random.seed(0)
+
+    # Write the file directly: a Blocklist would need the numbers in memory
+    keys = array('Q', sorted(set(int('1' + str(random.randint(10 ** 10, 10 ** 11))) for _ in range(n))))
+    with open(path, 'wb') as f:
+        f.write(Blocklist.MAGIC)
+        keys.tofile(f)
+    probe = [str(k)[1:] for k in random.sample(list(keys[:100000]), 50000)] + \
+            [str(random.randint(10 ** 10, 10 ** 11)) for _ in range(50000)]
+    del keys
+
+    before = rss()
+    start = time()
+    bl = Blocklist.load(path)
+    print('Blocklist: {:,} numbers, loaded in {:.3f}s, {:,.0f} lookups/s, +{:.0f}MB RSS'.format(
+        len(bl), time() - start, lookups(bl, probe), rss() - before))
+
+    before = rss()
+    start = time()
+    strings = set(bl)
+    print('set(str):  {:,} numbers, built in {:.3f}s, {:,.0f} lookups/s, +{:.0f}MB RSS'.format(
+        len(strings), time() - start, lookups(strings, probe), rss() - before))
+    os.unlink(path)
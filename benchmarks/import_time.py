@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+""" Benchmark: import time of smsframework modules
+
+    Every statement is measured in a fresh interpreter, median of N runs.
+    Also lists the heavy optional modules that end up being imported.
+
+    Usage: python benchmarks/import_time.py [N]
+"""
+from __future__ import print_function
+
+import sys
+import subprocess
+
+
+STATEMENTS = (
+    'import smsframework',
+    'import smsframework.providers',
+    'from smsframework.providers import LoopbackProvider',
+    'from smsframework.providers import ForwardClientProvider',
+    'import smsframework; smsframework.Gateway().add_provider("fwd", "forward-client", server_url="http://localhost")',
+)
+
+HEAVY = ('json', 'urllib.request', 'inspect', 'concurrent.futures', 'flask', 'werkzeug')
+
+
+def measure(statement):
+    """ Measure a statement in a fresh interpreter
+
+        :returns: (time, ms; heavy modules imported)
+    """
+    code = (
+        'import sys, time\n'
+        't = time.time()\n'
+        '{}\n'
+        't = time.time() - t\n'
+        'print(t * 1000)\n'
+        'print(",".join(m for m in {!r} if m in sys.modules))\n'
+    ).format(statement, HEAVY)
+    out = subprocess.check_output([sys.executable, '-c', code]).decode().split('\n')
+    return float(out[0]), out[1]
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+
+    for statement in STATEMENTS:
+        runs = sorted(measure(statement) for i in range(n))
+        total, heavy = runs[len(runs) // 2]
+        print('{:>8.1f} ms  {}'.format(total, statement))
+        print('             heavy modules: {}'.format(heavy or '-'))
@@ -0,0 +1,38 @@
+#! /usr/bin/env python
+""" Benchmark: message id generation throughput
+
+    Every generator is called from 1 and from 4 threads; prints ids per second.
+
+    Usage: python benchmarks/msgid.py [N]
+"""
+from __future__ import print_function
+
+import sys
+import threading
+from time import time
+
+from smsframework.lib.msgid import CounterIdGenerator, SnowflakeIdGenerator
+
+
+def measure(generator, threads, n):
+    """ Generate `n` ids in each of the `threads`
+
+        :returns: ids per second
+    """
+    def run():
+        for _ in range(n):
+            generator()
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return threads * n / (time() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for generator in (CounterIdGenerator(), SnowflakeIdGenerator(node=1)):
+        for threads in (1, 4):
+            print('{:<22} threads={}: {:>12,.0f} ids/s'.format(type(generator).__name__, threads, measure(generator, threads, n)))
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+""" Benchmark: latency of escalated messages while bulk traffic saturates the workers
+
+    A provider takes 20ms per message. A campaign of N bulk messages is submitted at once,
+    and an OTP message is submitted every 50ms. Prints the OTP send latencies:
+    with every message in one lane, and with the priority lanes and a reserved worker.
+
+    Usage: python benchmarks/priority_lanes.py [N]
+"""
+from __future__ import print_function
+
+import sys
+import threading
+from time import time, sleep
+
+from smsframework import Gateway, OutgoingMessage
+from smsframework.providers import NullProvider
+from smsframework.dispatcher import Dispatcher
+
+
+class SlowProvider(NullProvider):
+    def send(self, message):
+        sleep(0.02)
+        return super(SlowProvider, self).send(message)
+
+
+def measure(n, prioritize):
+    """ Run the campaign with OTPs
+
+        :returns: list of OTP latencies, ms
+    """
+    gw = Gateway()
+    gw.add_provider('slow', SlowProvider)
+    latencies = []
+    submitted = {}
+    gw.onSend += lambda message: message.body == 'otp' and latencies.append((time() - submitted[id(message)]) * 1000)
+
+    if prioritize:
+        dispatcher = Dispatcher(gw, workers=8, reserved={'high': 1})
+    else:
+        dispatcher = Dispatcher(gw, workers=8)
+
+    def bulk():
+        for i in range(n):
+            dispatcher.submit(OutgoingMessage('+1', 'bulk'))
+    t = threading.Thread(target=bulk)
+    t.start()
+
+    while t.is_alive() or dispatcher.stats()['queued']['normal']:
+        message = OutgoingMessage('+2', 'otp').options(escalate=prioritize)
+        submitted[id(message)] = time()
+        dispatcher.submit(message)
+        sleep(0.05)
+    dispatcher.join()
+    dispatcher.close()
+    return sorted(latencies)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for prioritize in (False, True):
+        latencies = measure(n, prioritize)
+        print('{:<10}: {} OTPs, latency p50 {:.0f}ms, p99 {:.0f}ms, max {:.0f}ms'.format(
+            'lanes' if prioritize else 'one lane', len(latencies),
+            latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], latencies[-1]))
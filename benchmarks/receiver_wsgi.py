@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+""" Benchmark: WsgiReceiver vs Flask blueprints, requests per second
+
+    Posts forwarded status reports to ForwardClientProvider's '/status' receiver:
+    1. In-process: calling the WSGI application directly, which measures the dispatch overhead alone
+    2. Over HTTP: through a local wsgiref server
+
+    Usage: python benchmarks/receiver_wsgi.py [N]
+"""
+from __future__ import print_function
+
+import sys
+import threading
+import timeit
+from io import BytesIO
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+from wsgiref.util import setup_testing_defaults
+
+try:  # Py3
+    from http.client import HTTPConnection
+except ImportError:  # Py2
+    from httplib import HTTPConnection
+
+from flask import Flask
+
+from smsframework import Gateway, MessageDelivered
+from smsframework.providers import ForwardClientProvider
+from smsframework.providers.forward.provider import jsonex_dumps
+
+
+PATH = '/sms/fwd/status'
+BODY = jsonex_dumps({'status': MessageDelivered('1')})
+
+
+def make_gateway():
+    gw = Gateway()
+    gw.add_provider('fwd', ForwardClientProvider, server_url='http://localhost')
+    gw.onStatus += lambda status: None
+    return gw
+
+
+def make_apps():
+    """ Get the applications to compare: { name: WSGI app } """
+    flask_app = Flask(__name__)
+    make_gateway().receiver_blueprints_register(flask_app, prefix='/sms')
+    return {
+        'flask': flask_app,
+        'wsgi': make_gateway().receiver_wsgi_app(prefix='/sms'),
+    }
+
+
+def bench_in_process(app, n):
+    def request():
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': PATH,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(BODY)),
+            'wsgi.input': BytesIO(BODY),
+        }
+        setup_testing_defaults(environ)
+        b''.join(app(environ, lambda status, headers: None))
+    return n / timeit.timeit(request, number=n)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def bench_http(app, n):
+    server = make_server('127.0.0.1', 0, app, handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    port = server.server_address[1]
+
+    def request():
+        conn = HTTPConnection('127.0.0.1', port)  # wsgiref speaks HTTP/1.0: a connection per request
+        conn.request('POST', PATH, BODY, {'Content-Type': 'application/json'})
+        assert conn.getresponse().read()
+        conn.close()
+
+    try:
+        return n / timeit.timeit(request, number=n)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    apps = make_apps()
+
+    for title, bench, count in (('in-process', bench_in_process, n), ('wsgiref', bench_http, n // 5)):
+        results = {name: bench(app, count) for name, app in apps.items()}
+        print('{:<12} flask: {:>8.0f} req/s   wsgi: {:>8.0f} req/s   x{:.1f}'.format(
+            title, results['flask'], results['wsgi'], results['wsgi'] / results['flask']))
@@ -0,0 +1,58 @@
+#! /usr/bin/env python
+""" Benchmark: ShardedGateway vs a single Gateway, messages per second
+
+    Sends N messages with LoopbackProvider, which only measures the Python-side work per message.
+    An onSend handler serializes every message with JsonEx, like the forward providers do.
+
+    1. With a single Gateway, in the current process
+    2. With ShardedGateway, with 1, 2, .. CPU count worker processes
+
+    Usage: python benchmarks/sharded_send.py [N]
+"""
+from __future__ import print_function
+
+import sys
+import multiprocessing
+from time import time
+
+from smsframework import Gateway, OutgoingMessage
+from smsframework.providers import LoopbackProvider
+from smsframework.sharded import ShardedGateway
+from smsframework.providers.forward.provider import jsonex_dumps
+
+
+def make_gateway():
+    gw = Gateway()
+    gw.add_provider('lo', LoopbackProvider)
+    gw.onSend += jsonex_dumps
+    return gw
+
+
+def make_messages(n):
+    return (OutgoingMessage('+{}'.format(i % 10000), 'hello #{}'.format(i)) for i in range(n))
+
+
+def bench_single(n):
+    gw = make_gateway()
+    lo = gw.get_provider('lo')
+    t = time()
+    for i, message in enumerate(make_messages(n)):
+        gw.send(message)
+        if i % 10000 == 0:
+            lo.get_traffic()  # don't accumulate
+    return n / (time() - t)
+
+
+def bench_sharded(n, processes):
+    with ShardedGateway(make_gateway, processes=processes) as sgw:
+        t = time()
+        sgw.send_many(make_messages(n))
+        return n / (time() - t)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    print('{:>10.0f} msg/s  Gateway'.format(bench_single(n)))
+    for processes in sorted({1, 2, multiprocessing.cpu_count()}):
+        print('{:>10.0f} msg/s  ShardedGateway, {} processes'.format(bench_sharded(n, processes), processes))
@@ -26,7 +26,7 @@ setup(
         'clickatell': ['smsframework-clickatell >= 0.0.3'],
         'vianett': ['smsframework-vianett >= 0.0.2'],
         'receiver': ['flask >= 0.10'],
-        'async': ['asynctools >= 0.1.3'],
+        'async': ['futures; python_version < "3"'],
     },
     include_package_data=True,
     test_suite='nose.collector',
@@ -1,5 +1,11 @@
+import threading
+from copy import copy
+from time import time, sleep
+
+from . import exc
 from .IProvider import IProvider
-from .lib.events import EventHook
+from .lib import get_logger
+from .lib.events import EventHook, EventBatcher
 
 
 class Gateway(object):
@@ -51,8 +57,23 @@ class Gateway(object):
 
         # Events
         self.onSend = EventHook()
+        self.onSendError = EventHook()
         self.onReceive = EventHook()
         self.onStatus = EventHook()
+        self.onReceiveBatch = EventHook()
+        self.onStatusBatch = EventHook()
+
+        #: Batches for onReceiveBatch. Configure with its `max_size` and `max_wait`
+        #: :type: EventBatcher
+        self.receive_batcher = EventBatcher(self.onReceiveBatch)
+
+        #: Batches for onStatusBatch. Configure with its `max_size` and `max_wait`
+        #: :type: EventBatcher
+        self.status_batcher = EventBatcher(self.onStatusBatch)
+
+        # Lifecycle calls in progress: { (method, provider name): Thread }
+        self._lifecycle_calls = {}
+        self._lifecycle_lock = threading.Lock()
 
 
 
@@ -65,12 +86,17 @@ class Gateway(object):
 
             :type name: str
             :param name: Provider name that will be used to uniquely identify it
-            :type Provider: type
-            :param Provider: Provider class that inherits from `smsframework.IProvider`
+            :type Provider: type | str
+            :param Provider: Provider class that inherits from `smsframework.IProvider`,
+                or a registered provider name: see :func:`smsframework.providers.registry.get_provider_class`
             :param config: Provider configuration. Please refer to the Provider documentation.
             :rtype: IProvider
             :returns: The created provider
+            :raises KeyError: unknown provider name
         """
+        if isinstance(Provider, str):
+            from .providers.registry import get_provider_class  # local import: resolved on demand
+            Provider = get_provider_class(Provider)
         assert issubclass(Provider, IProvider), 'Provider does not implement IProvider'
         assert isinstance(name, str), 'Provider name must be a string'
 
@@ -120,8 +146,134 @@ class Gateway(object):
 
 
 
+    #region Lifecycle
+
+    #: Lifecycle state: 'new', 'open', 'closed'. See :meth:`open`, :meth:`close`
+    state = 'new'
+
+    def open(self, timeout=None):
+        """ Warm up all providers, in parallel: see :meth:`IProvider.open`
+
+            Call it at startup, so that the first messages don't have to wait for connections and such.
+            Failed providers are logged and reported, but remain in use.
+
+            :type timeout: float | None
+            :param timeout: Max time to wait for the providers, seconds
+            :rtype: dict
+            :returns: Failed providers: { name: exception }
+        """
+        errors = {name: e for name, (result, e) in self._call_providers('open', timeout).items() if e is not None}
+        for name, e in errors.items():
+            get_logger(__name__).warning('Provider "{}" warm-up failed: {!r}'.format(name, e))
+        self.state = 'open'
+        return errors
+
+    def health(self, timeout=5, required=None):
+        """ Check the health of all providers, in parallel: see :meth:`IProvider.health_check`
+
+            The Gateway is ready when it's open, and all the required providers are healthy.
+
+            :type timeout: float | None
+            :param timeout: Max time to wait for the providers, seconds. Slower ones are unhealthy
+            :type required: list[str] | None
+            :param required: Names of the providers that have to be healthy. Default: all
+            :rtype: dict
+            :returns: { ready: bool, state: str, providers: { name: { healthy: bool, error: str | None } } }
+        """
+        providers = {}
+        for name, (result, e) in self._call_providers('health_check', timeout).items():
+            providers[name] = {'healthy': e is None and bool(result), 'error': None if e is None else repr(e)}
+        required = providers.keys() if required is None else required
+        return {
+            'ready': self.state == 'open' and all(providers.get(name, {}).get('healthy') for name in required),
+            'state': self.state,
+            'providers': providers,
+        }
+
+    def close(self, timeout=None):
+        """ Fire the collected batch events, and close all providers in parallel: see :meth:`IProvider.close`
+
+            Call it at shutdown. The Gateway is not ready afterwards. The threads of the batch events are stopped.
+
+            :type timeout: float | None
+            :param timeout: Max time to wait for the providers, seconds
+            :rtype: dict
+            :returns: Failed providers: { name: exception }
+        """
+        self.state = 'closed'
+        self.receive_batcher.close()
+        self.status_batcher.close()
+        errors = {name: e for name, (result, e) in self._call_providers('close', timeout).items() if e is not None}
+        for name, e in errors.items():
+            get_logger(__name__).warning('Provider "{}" failed to close: {!r}'.format(name, e))
+        return errors
+
+    def _call_providers(self, method, timeout, providers=None):
+        """ Call a method of the providers, in parallel
+
+            :type method: str
+            :type timeout: float | None
+            :type providers: dict | None
+            :param providers: { name: IProvider }. Default: all
+            :rtype: dict
+            :returns: { name: (result, exception) }. Providers that time out get `ConnectionError`,
+                and so do providers still busy with the previous call: a hanging provider holds one thread, not more
+        """
+        results = {}
+        def call(name, provider):
+            try:
+                results[name] = (getattr(provider, method)(), None)
+            except Exception as e:
+                results[name] = (None, e)
+
+        threads, busy = [], []
+        for name, provider in list((providers if providers is not None else self._providers).items()):
+            with self._lifecycle_lock:
+                t = self._lifecycle_calls.get((method, name))
+                if t is not None and t.is_alive():
+                    busy.append(name)
+                    continue
+                t = threading.Thread(target=call, args=(name, provider), name='smsframework-{}-{}'.format(method, name))
+                t.daemon = True
+                t.start()
+                self._lifecycle_calls[method, name] = t
+            threads.append((name, t))
+
+        deadline = None if timeout is None else time() + timeout
+        for name, t in threads:
+            t.join(None if deadline is None else max(0, deadline - time()))
+        timed_out = (None, exc.ConnectionError('Provider {}() timed out'.format(method)))
+        with self._lifecycle_lock:
+            for name, t in threads:
+                if not t.is_alive() and self._lifecycle_calls.get((method, name)) is t:
+                    del self._lifecycle_calls[method, name]
+        still_running = (None, exc.ConnectionError('Provider {}() is still running'.format(method)))
+        ret = {name: results.get(name, timed_out) for name, t in threads}
+        ret.update((name, still_running) for name in busy)
+        return ret
+
+    #endregion
+
+
+
     #region Sending
 
+    #: Admission control: limits the number of messages being sent. See :class:`smsframework.admission.AdmissionControl`
+    #: :type: smsframework.admission.AdmissionControl | None
+    admission = None
+
+    #: Opt-out list: messages to these numbers are never sent. See :class:`smsframework.blocklist.Blocklist`
+    #: :type: smsframework.blocklist.Blocklist | None
+    blocklist = None
+
+    #: Duplicate suppression: repeated messages are not sent. See :class:`smsframework.dedupe.Deduplicator`
+    #: :type: smsframework.dedupe.Deduplicator | None
+    dedupe = None
+
+    #: Retry policy for all providers. Providers can override it with `IProvider.retry_policy`.
+    #: :type: smsframework.retry.RetryPolicy | None
+    retry_policy = None
+
     def router(self, message, *args):
         """ Router function that decides which provider to use for the given message for sending.
 
@@ -136,11 +288,14 @@ class Gateway(object):
         # By default, this always uses the default provider
         return None
 
-    def send(self, message):
+    def send(self, message, timeout=None):
         """ Send a message object
 
             :type message: data.OutgoingMessage
             :param message: The message to send
+            :type timeout: float | None
+            :param timeout: Sending timeout, seconds: the deadline for this send, if the message has none or a later one.
+                The message options are not modified: the options may be shared. See: :meth:`OutgoingMessage.time_left`
             :rtype: data.OutgoingMessage
             :returns: The sent message with populated fields
             :raises AssertionError: wrong provider name encountered (returned by the router, or provided to OutgoingMessage)
@@ -148,27 +303,87 @@ class Gateway(object):
             :raises AuthError: provider authentication failed
             :raises LimitsError: sending limits exceeded
             :raises CreditError: not enough money on the account
+            :raises DeadlineError: the deadline has passed before the message was handed over to the provider
+            :raises OverloadError: rejected by the admission control: see `Gateway.admission`
+            :raises BlockedError: the destination number is blocked: see `Gateway.blocklist`
+
+            Duplicate messages are not sent when `Gateway.dedupe` is set: they get the msgid of the original message.
+
+            When a retry policy is set, transient errors are retried: see :class:`smsframework.retry.RetryPolicy`
+        """
+        return self._send_routed(message, None, timeout)
+
+    def _send_routed(self, message, provider_name, timeout=None, retry=True):
+        """ Send a message that may have been routed earlier, e.g. when it was queued. See :meth:`send`
+
+            :type provider_name: str | None
+            :param provider_name: The provider the message was routed to: it's not routed again,
+                and the router is told with `router.resume(message, provider_name)`, if it has that method.
+                None to route it now
+            :type retry: bool
+            :param retry: Retry according to the retry policy. False to make a single attempt: the caller retries
+        """
+        # Deadline: for this send only
+        options = message.provider_options
+        if timeout is not None:
+            deadline = time() + timeout
+            if options.deadline is None or deadline < options.deadline:
+                message.provider_options = copy(options)  # shared by template messages, reused by the caller
+                message.provider_options.deadline = deadline
+
+        try:
+            # Opt-out
+            if self.blocklist is not None and message.dst in self.blocklist:
+                e = exc.BlockedError('Destination number is blocked: {}'.format(message.dst))
+                self.onSendError(message, e)
+                raise e
+
+            # Duplicates
+            if self.dedupe is not None:
+                return self.dedupe.send(message, lambda message: self._send(message, provider_name, retry))
+
+            return self._send(message, provider_name, retry)
+        finally:
+            message.provider_options = options
+
+    def _send(self, message, provider_name=None, retry=True):
+        """ Route, admit, and send a message; fire onSend
+
+            :type message: data.OutgoingMessage
+            :type provider_name: str | None
+            :param provider_name: The provider the message was routed to earlier. None to route it now
+            :type retry: bool
+            :param retry: Retry according to the retry policy
+            :rtype: data.OutgoingMessage
         """
         # Which provider to use?
-        provider_name = self._default_provider  # default
-        if message.provider is not None:
-            assert message.provider in self._providers, \
-                'Unknown provider specified in OutgoingMessage.provideer: {}'.format(provider_name)
-            provider = self.get_provider(message.provider)
+        if provider_name is None:
+            provider = self._route(message)
         else:
-            # Apply routing
-            if message.routing_values is not None: # Use the default provider when no routing values are given
-                # Routing values are present
-                provider_name = self.router(message, *message.routing_values) or self._default_provider
-                assert provider_name in self._providers, \
-                    'Routing function returned an unknown provider name: {}'.format(provider_name)
             provider = self.get_provider(provider_name)
+            resume = getattr(self.router, 'resume', None)
+            if resume is not None:
+                resume(message, provider_name)
 
-        # Set message provider name
-        message.provider = provider.name
+        # Admission
+        admission = self.admission
+        if admission is not None:
+            try:
+                admission.acquire(message, provider.name)
+            except exc.OverloadError as e:
+                self.onSendError(message, e)
+                raise
 
         # Send the message using the provider
-        message = provider.send(message)
+        try:
+            policy = (provider.retry_policy or self.retry_policy) if retry else None
+            if policy is None:
+                message = self._send_once(provider, message)
+            else:
+                message = self._send_retrying(policy, provider, message)
+        finally:
+            if admission is not None:
+                admission.release(provider.name)
 
         # Emit the send event
         self.onSend(message)
@@ -176,11 +391,124 @@ class Gateway(object):
         # Finish
         return message
 
+    def send_template(self, template, recipients, timeout=None):
+        """ Send a template message to many recipients
+
+            Messages are made lazily, one at a time. Failed messages do not stop the sending:
+            the errors are reported with the onSendError event.
+
+            :type template: data.MessageTemplate
+            :param template: The message template
+            :type recipients: collections.Iterable
+            :param recipients: Iterable of (dst, values) tuples, where `values` is a dict of template variables
+            :type timeout: float | None
+            :param timeout: Timeout for the whole batch, seconds: every message gets the time that's left.
+                The template is not modified
+            :rtype: tuple
+            :returns: (number of messages sent, number of messages failed)
+            :raises AssertionError: wrong provider name encountered
+            :raises KeyError: missing template variable
+            :raises DeadlineError: the deadline has passed: the rest of the messages are not sent
+        """
+        deadline = None if timeout is None else time() + timeout  # local: the template may be reused
+
+        sent = failed = 0
+        for message in template.messages(recipients):
+            try:
+                self.send(message, None if deadline is None else deadline - time())
+            except (AssertionError, exc.DeadlineError):
+                raise
+            except Exception:
+                failed += 1
+            else:
+                sent += 1
+        return sent, failed
+
+    def _route(self, message):
+        """ Decide on the provider to send the message with
+
+            :type message: data.OutgoingMessage
+            :rtype: IProvider
+            :raises AssertionError: wrong provider name encountered
+        """
+        provider_name = self._default_provider  # default
+        if message.provider is not None:
+            assert message.provider in self._providers, \
+                'Unknown provider specified in OutgoingMessage.provideer: {}'.format(provider_name)
+            return self.get_provider(message.provider)
+
+        # Apply routing
+        if message.routing_values is not None: # Use the default provider when no routing values are given
+            # Routing values are present
+            provider_name = self.router(message, *message.routing_values) or self._default_provider
+            assert provider_name in self._providers, \
+                'Routing function returned an unknown provider name: {}'.format(provider_name)
+        return self.get_provider(provider_name)
+
+    def _send_once(self, provider, message):
+        """ Make a single attempt to send the message with the provider
+
+            Emits onSendError on failure
+
+            :type provider: IProvider
+            :type message: data.OutgoingMessage
+            :rtype: data.OutgoingMessage
+        """
+        # Set message provider name
+        message.provider = provider.name
+
+        # Deadline passed?
+        if message.provider_options.deadline is not None and message.time_left() <= 0:
+            e = exc.DeadlineError('Sending deadline exceeded')
+            self.onSendError(message, e)
+            raise e
+
+        # Send
+        try:
+            return provider.send(message)
+        except Exception as e:
+            if isinstance(e, exc.CreditError):
+                provider.invalidate_cache()  # the cached balance is wrong
+            self.onSendError(message, e)
+            raise
+
+    def _send_retrying(self, policy, provider, message):
+        """ Send the message, retrying according to the policy. Sleeps between the attempts
+
+            :type policy: smsframework.retry.RetryPolicy
+            :type provider: IProvider
+            :type message: data.OutgoingMessage
+            :rtype: data.OutgoingMessage
+        """
+        policy.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                return self._send_once(provider, message)
+            except Exception as e:
+                retry = policy.retry(message, e, attempt)
+                if retry is None:
+                    raise
+                delay, provider_name = retry
+                sleep(delay)
+                provider = self.get_provider(provider_name)
+                attempt += 1
+
     #region
 
 
     #region Receipt
 
+    #: Multipart message reassembly: `onReceive` is fired for complete messages only.
+    #: See :class:`smsframework.multipart.MultipartReassembler`
+    #: :type: smsframework.multipart.MultipartReassembler | None
+    reassembly = None
+
+    def flush_batches(self):
+        """ Fire onReceiveBatch and onStatusBatch with the items collected so far, in the current thread """
+        self.receive_batcher.flush()
+        self.status_batcher.flush()
+
     def receiver_blueprint_for(self, name):
         """ Get a Flask blueprint for the named provider that handles incoming messages & status reports
 
@@ -247,4 +575,34 @@ class Gateway(object):
         # Finish
         return app
 
+    def receiver_wsgi_app(self, prefix='/', **kwargs):
+        """ Get a lightweight WSGI application that serves all provider receivers under '/{prefix}/provider-name'
+
+            Unlike the blueprints, this does not require Flask, but only supports providers
+            that implement :meth:`IProvider.make_receiver_routes`.
+
+            :type prefix: str
+            :param prefix: URL prefix to hide the receivers under.
+            :param kwargs: More options for :class:`smsframework.lib.wsgi.WsgiReceiver`
+            :rtype: smsframework.lib.wsgi.WsgiReceiver
+        """
+        from .lib.wsgi import WsgiReceiver  # local import as the user is not required to use receivers at all
+        return WsgiReceiver(self, prefix, **kwargs)
+
+    def receiver_asgi_app(self, prefix='/', **kwargs):
+        """ Get an ASGI application that serves all provider receivers under '/{prefix}/provider-name'
+
+            Like :meth:`receiver_wsgi_app`, but handles requests on the event loop,
+            and supports coroutine functions as event handlers.
+
+            Note: this requires Python 3.5+
+
+            :type prefix: str
+            :param prefix: URL prefix to hide the receivers under.
+            :param kwargs: More options for :class:`smsframework.lib.asgi.AsgiReceiver`
+            :rtype: smsframework.lib.asgi.AsgiReceiver
+        """
+        from .lib.asgi import AsgiReceiver  # local import: Python 3 only
+        return AsgiReceiver(self, prefix, **kwargs)
+
     #endregion
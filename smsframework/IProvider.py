@@ -7,6 +7,10 @@ class IProvider(object):
         Implements methods to interact with the :class:`smsframework.Gateway`
     """
 
+    #: Retry policy for this provider: overrides `Gateway.retry_policy`
+    #: :type: smsframework.retry.RetryPolicy | None
+    retry_policy = None
+
     def __init__(self, gateway, name, **config):
         """ Initialize the provider
 
@@ -46,13 +50,70 @@ class IProvider(object):
         """
         raise NotImplementedError('Provider does not support message reception')
 
+    def make_receiver_routes(self):
+        """ Get framework-independent HTTP receiver routes
+
+            These are used by the lightweight receivers that do not require Flask:
+            see :meth:`Gateway.receiver_wsgi_app`.
+
+            Every handler is a callable(smsframework.lib.http.Request) which returns a smsframework.lib.http.Response.
+            A handler may have the `error_response` attribute: callable(Exception) -> Response,
+            used by the ASGI receiver when an async event handler fails.
+
+            :rtype: dict
+            :returns: Routes: { path: handler }, e.g. { '/im': handler, '/status': handler }
+            :raises NotImplementedError: Provider does not support message reception without Flask
+        """
+        raise NotImplementedError('Provider does not support message reception without Flask')
+
+    def invalidate_cache(self):
+        """ Drop the cached results of provider API methods
+
+            The Gateway calls it when the provider raises `CreditError`: the balance has clearly changed.
+            See :func:`smsframework.lib.cache.cached`
+        """
+        for cache in list(self.__dict__.get('_api_caches', {}).values()):
+            cache.invalidate()
+
+
+    #region Lifecycle
+
+    def open(self):
+        """ Warm up: connect, authenticate, etc, so that the first message doesn't have to wait for it
+
+            Called by :meth:`Gateway.open`, in parallel with the other providers.
+            The provider must keep working even if it's never called.
+
+            :raises Exception: warm-up failed
+        """
+
+    def health_check(self):
+        """ Check that the provider can send messages
+
+            Called by :meth:`Gateway.health`, which is polled by load balancers: keep it cheap.
+
+            :rtype: bool
+            :returns: Healthy?
+            :raises Exception: unhealthy, with the reason
+        """
+        return True
+
+    def close(self):
+        """ Flush the pending work and release the resources
+
+            Called by :meth:`Gateway.close`, in parallel with the other providers.
+        """
+
+    #endregion
+
 
     #region Receiver callbacks
 
     def _receive_message(self, message):
         """ Incoming message callback
 
-            Calls Gateway.onReceive event hook
+            Calls Gateway.onReceive event hook, and collects the message for Gateway.onReceiveBatch.
+            Parts of multipart messages are combined first, if enabled: see `Gateway.reassembly`
 
             Providers are required to:
             * Cast phone numbers to digits-only
@@ -67,16 +128,13 @@ class IProvider(object):
         # Populate fields
         message.provider = self.name
 
-        # Fire the event hook
-        self.gateway.onReceive(message)
-
-        # Finish
-        return message
+        # Deliver
+        return self._deliver_message(message)
 
     def _receive_status(self, status):
         """ Incoming status callback
 
-            Calls Gateway.onStatus event hook
+            Calls Gateway.onStatus event hook, and collects the status for Gateway.onStatusBatch
 
             Providers are required to:
             * Cast phone numbers to digits-only
@@ -91,8 +149,42 @@ class IProvider(object):
         # Populate fields
         status.provider = self.name
 
+        # Deliver
+        return self._deliver_status(status)
+
+    def _deliver_message(self, message):
+        """ Deliver a received message to the gateway: reassembly, `onReceive` and `onReceiveBatch`
+
+            Unlike :meth:`_receive_message`, keeps `message.provider` as is.
+
+            :type message: IncomingMessage
+            :rtype: IncomingMessage
+        """
+        # Reassemble multipart messages
+        received = message
+        if self.gateway.reassembly is not None:
+            message = self.gateway.reassembly(message)
+            if message is None:
+                return received  # waiting for the other parts
+
+        # Fire the event hook
+        self.gateway.onReceive(message)
+        self.gateway.receive_batcher(message)
+
+        # Finish
+        return received
+
+    def _deliver_status(self, status):
+        """ Deliver a received status to the gateway: `onStatus` and `onStatusBatch`
+
+            Unlike :meth:`_receive_status`, keeps `status.provider` as is.
+
+            :type status: MessageStatus
+            :rtype: MessageStatus
+        """
         # Fire the event hook
         self.gateway.onStatus(status)
+        self.gateway.status_batcher(status)
 
         # Finish
         return status
@@ -0,0 +1,204 @@
+import threading
+from bisect import insort
+from itertools import count
+from time import time
+
+from . import exc
+
+
+class _Waiter(object):
+    """ A message waiting for admission
+
+        Has its own condition, so only the waiter that gets the slot is woken up
+    """
+
+    __slots__ = ('priority', 'seq', 'provider', 'cond', 'admitted', 'dropped')
+
+    def __init__(self, priority, seq, provider, lock):
+        self.priority = priority
+        self.seq = seq
+        self.provider = provider
+        self.cond = threading.Condition(lock)
+        self.admitted = False
+        self.dropped = False
+
+    @property
+    def rank(self):
+        """ Sort key: high priority first, then first come """
+        return -self.priority, self.seq
+
+    def __lt__(self, other):
+        return self.rank < other.rank
+
+
+class AdmissionControl(object):
+    """ Admission control: limits the number of messages being sent, sheds the excess load
+
+        Caps the number of sends in flight, for the whole gateway and per provider.
+        When there's no free slot, the message waits in a bounded queue: high priority first, then first come.
+        When the queue is full, the `policy` decides:
+
+        * 'reject': reject the new message with `OverloadError`
+        * 'drop-lowest': reject the lowest priority message: a queued one with a lower priority than the new one,
+          or else the new one
+        * 'block': wait anyway: the queue is unbounded
+
+        Use it with the Gateway:
+
+            gw.admission = AdmissionControl(max_in_flight=100, max_in_flight_per_provider=20, max_queue=50)
+
+        Message priority: escalated messages come first, see `OutgoingMessage.options(escalate=True)`.
+    """
+
+    POLICIES = ('reject', 'drop-lowest', 'block')
+
+    def __init__(self, max_in_flight=None, max_in_flight_per_provider=None, max_queue=0, policy='reject',
+                 queue_timeout=None):
+        """
+            :type max_in_flight: int | None
+            :param max_in_flight: Max number of messages being sent by the gateway. None for no limit
+            :type max_in_flight_per_provider: int | dict | None
+            :param max_in_flight_per_provider: Max number of messages being sent by a provider:
+                a number for all providers, or { provider name: number }. None for no limit
+            :type max_queue: int
+            :param max_queue: Max number of messages waiting for a slot
+            :type policy: str
+            :param policy: What to do when the queue is full: 'reject', 'drop-lowest', 'block'
+            :type queue_timeout: float | None
+            :param queue_timeout: Max time a message waits in the queue, seconds.
+                The message deadline is respected as well: see `OutgoingMessage.time_left()`.
+        """
+        assert policy in self.POLICIES, 'Unknown admission policy: {}'.format(policy)
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_provider = max_in_flight_per_provider
+        self.max_queue = max_queue
+        self.policy = policy
+        self.queue_timeout = queue_timeout
+
+        #: Messages being sent: total
+        self.in_flight = 0
+        #: Messages being sent: { provider name: number }
+        self.in_flight_per_provider = {}
+        #: Counter: messages admitted
+        self.admitted = 0
+        #: Counter: messages rejected: the queue was full, or the wait timed out
+        self.rejected = 0
+        #: Counter: queued messages dropped in favor of higher priority ones
+        self.dropped = 0
+
+        self._queue = []  # waiters, sorted by rank
+        self._seq = count()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self):
+        """ Number of messages waiting for a slot
+
+            :rtype: int
+        """
+        return len(self._queue)
+
+    def stats(self):
+        """ Get the counters
+
+            :rtype: dict
+        """
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'in_flight_per_provider': dict(self.in_flight_per_provider),
+                'queued': len(self._queue),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'dropped': self.dropped,
+            }
+
+    def _provider_limit(self, provider):
+        limit = self.max_in_flight_per_provider
+        return limit.get(provider) if isinstance(limit, dict) else limit
+
+    def _has_slot(self, provider):
+        """ Is there a free slot for the provider? Call with the lock held """
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            return False
+        limit = self._provider_limit(provider)
+        return limit is None or self.in_flight_per_provider.get(provider, 0) < limit
+
+    def _grant(self):
+        """ Hand the free slots over to the waiters, in their order, and wake them up. Call with the lock held
+
+            Afterwards, no waiter has a free slot: a new message may take one right away.
+        """
+        i = 0
+        while i < len(self._queue):
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                return
+            waiter = self._queue[i]
+            if not self._has_slot(waiter.provider):
+                i += 1
+                continue
+            del self._queue[i]
+            self._admit(waiter.provider)
+            waiter.admitted = True
+            waiter.cond.notify()
+
+    def _admit(self, provider):
+        """ Take a slot. Call with the lock held """
+        self.in_flight += 1
+        self.in_flight_per_provider[provider] = self.in_flight_per_provider.get(provider, 0) + 1
+        self.admitted += 1
+
+    def _reject(self, reason):
+        """ Count & make a rejection error. Call with the lock held """
+        self.rejected += 1
+        return exc.OverloadError(reason)
+
+    def acquire(self, message, provider):
+        """ Take a sending slot for a message. Waits in the queue when there's no free slot
+
+            :type message: smsframework.OutgoingMessage
+            :type provider: str
+            :param provider: Provider name the message is sent with
+            :raises OverloadError: the message was rejected
+        """
+        with self._lock:
+            # Free slot: nobody is waiting for it, see _grant()
+            if self._has_slot(provider):
+                self._admit(provider)
+                return
+
+            # Queue
+            waiter = _Waiter(1 if message.provider_options.escalate else 0, next(self._seq), provider, self._lock)
+            if self.policy != 'block' and len(self._queue) >= self.max_queue:
+                lowest = self._queue[-1] if self._queue else None
+                if self.policy == 'drop-lowest' and lowest is not None and lowest.priority < waiter.priority:
+                    del self._queue[-1]
+                    lowest.dropped = True
+                    self.dropped += 1
+                    lowest.cond.notify()
+                else:
+                    raise self._reject('Sending queue is full')
+            insort(self._queue, waiter)
+
+            # Wait till a slot is handed over
+            timeout = message.time_left(self.queue_timeout)
+            deadline = None if timeout is None else time() + timeout
+            while not waiter.admitted and not waiter.dropped:
+                left = None if deadline is None else deadline - time()
+                if left is not None and left <= 0:
+                    self._queue.remove(waiter)
+                    raise self._reject('Timed out waiting for a sending slot')
+                waiter.cond.wait(left)
+            if waiter.dropped:
+                raise exc.OverloadError('Dropped from the sending queue in favor of a higher priority message')
+
+    def release(self, provider):
+        """ Free a sending slot
+
+            :type provider: str
+            :param provider: Provider name the message was sent with
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.in_flight_per_provider[provider] -= 1
+            self._grant()
@@ -0,0 +1,230 @@
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from time import time
+
+
+class DeliveryStats(object):
+    """ Delivery report analytics: compact counters of message outcomes
+
+        Subscribes to the Gateway events and counts the sent messages and their statuses
+        per provider, destination number prefix and time bucket of the send time.
+        Also keeps a histogram of send-to-delivery latencies.
+
+        The counters are stored in columns of `array`s, one row per (provider, prefix, bucket):
+        no message or status objects are kept. The only per-message state is the map of messages
+        waiting for their final status, which is bounded with `max_pending`.
+
+            stats = DeliveryStats(gw, bucket=3600, prefix_length=2)
+            ...
+            stats.query(provider='main')  # { 'sent': 100, 'delivered': 95, 'delivery_rate': 0.95, ... }
+            stats.query(by='prefix')  # { '1': {...}, '44': {...} }
+            stats.latency(0.95, provider='main')  # 95th percentile latency, seconds
+
+        Statuses of messages sent before the stats were created, or forgotten, are not counted: see `unknown`.
+    """
+
+    #: Counter columns
+    COLUMNS = ('sent', 'accepted', 'delivered', 'expired', 'error')
+
+    #: Latency histogram bin upper bounds, seconds: 0.1 .. ~4 days, every bin is 1.5 times wider
+    LATENCY_BINS = tuple(0.1 * 1.5 ** i for i in range(36))
+
+    def __init__(self, gateway, bucket=3600, prefix_length=2, max_pending=1000000):
+        """ Create the stats and subscribe to the Gateway events
+
+            :type gateway: smsframework.Gateway
+            :type bucket: int
+            :param bucket: Time bucket size, seconds
+            :type prefix_length: int
+            :param prefix_length: Length of the destination number prefix to group by. 0 to disable
+            :type max_pending: int
+            :param max_pending: Max number of messages waiting for their final status.
+                The oldest ones are forgotten.
+        """
+        self.bucket = bucket
+        self.prefix_length = prefix_length
+        self.max_pending = max_pending
+
+        #: Counter: statuses of unknown messages
+        self.unknown = 0
+
+        self._lock = threading.Lock()
+
+        # Series: (provider, prefix) <-> series id
+        self._series = {}
+        self._series_keys = []
+
+        # Rows: (series id, bucket) -> row number; and the row keys, as columns
+        self._rows = {}
+        self._row_series = array('l')
+        self._row_bucket = array('l')
+
+        # Counters: column -> array, one item per row
+        self._counters = {name: array('L') for name in self.COLUMNS}
+
+        # Latency histograms: len(LATENCY_BINS) + 1 items per row; the last one is the overflow
+        self._latency = array('L')
+
+        # Messages waiting for their final status: (provider, msgid) -> (send time, row)
+        self._pending = OrderedDict()
+
+        gateway.onSend += self._on_send
+        gateway.onStatus += self._on_status
+
+
+    #region Recording
+
+    def _row(self, provider, prefix, bucket):
+        """ Get a row number, create if necessary. Call with the lock held
+
+            :rtype: int
+        """
+        series = self._series.get((provider, prefix))
+        if series is None:
+            series = self._series[(provider, prefix)] = len(self._series_keys)
+            self._series_keys.append((provider, prefix))
+
+        row = self._rows.get((series, bucket))
+        if row is None:
+            row = self._rows[(series, bucket)] = len(self._row_series)
+            self._row_series.append(series)
+            self._row_bucket.append(bucket)
+            for column in self._counters.values():
+                column.append(0)
+            self._latency.extend([0] * (len(self.LATENCY_BINS) + 1))
+        return row
+
+    def _on_send(self, message):
+        now = time()
+        prefix = (message.dst or '')[:self.prefix_length]
+        with self._lock:
+            row = self._row(message.provider, prefix, int(now // self.bucket))
+            self._counters['sent'][row] += 1
+            if message.msgid is not None:
+                self._pending[(message.provider, message.msgid)] = (now, row)
+                if len(self._pending) > self.max_pending:
+                    self._pending.popitem(last=False)
+
+    def _on_status(self, status):
+        now = time()
+        final = status.delivered or status.expired or status.error
+        with self._lock:
+            key = (status.provider, status.msgid)
+            pending = self._pending.pop(key, None) if final else self._pending.get(key)
+            if pending is None:
+                self.unknown += 1
+                return
+            sent, row = pending
+
+            if status.error:
+                self._counters['error'][row] += 1
+            elif status.expired:
+                self._counters['expired'][row] += 1
+            elif status.delivered:
+                self._counters['delivered'][row] += 1
+                i = bisect_left(self.LATENCY_BINS, now - sent)
+                self._latency[row * (len(self.LATENCY_BINS) + 1) + i] += 1
+            elif status.accepted:
+                self._counters['accepted'][row] += 1
+
+    #endregion
+
+
+    #region Queries
+
+    def _select(self, provider, prefix, since, until):
+        """ Get the numbers of the rows that match. Call with the lock held
+
+            :rtype: list[int]
+        """
+        series = {i for i, (p, pre) in enumerate(self._series_keys)
+                  if (provider is None or p == provider) and (prefix is None or pre.startswith(prefix))}
+        first = None if since is None else int(since // self.bucket)
+        last = None if until is None else int(until // self.bucket)
+        return [row for row, (s, b) in enumerate(zip(self._row_series, self._row_bucket))
+                if s in series and (first is None or b >= first) and (last is None or b <= last)]
+
+    def _totals(self, rows):
+        """ Sum up the counters of the rows. Call with the lock held
+
+            :rtype: dict
+        """
+        totals = {name: sum(column[row] for row in rows) for name, column in self._counters.items()}
+        sent = totals['sent']
+        totals['delivery_rate'] = float(totals['delivered']) / sent if sent else None
+        totals['error_rate'] = float(totals['error'] + totals['expired']) / sent if sent else None
+        return totals
+
+    def _group_key(self, row, by):
+        """ Get the group key of a row """
+        if by == 'bucket':
+            return self._row_bucket[row] * self.bucket
+        provider, prefix = self._series_keys[self._row_series[row]]
+        return provider if by == 'provider' else prefix
+
+    def query(self, provider=None, prefix=None, since=None, until=None, by=None):
+        """ Get the counters and the rates
+
+            Messages are counted in the time bucket they were sent in.
+
+            :type provider: str | None
+            :param provider: Provider name filter
+            :type prefix: str | None
+            :param prefix: Number prefix filter
+            :type since: float | None
+            :param since: Send time filter: unix timestamp, rounded to the bucket
+            :type until: float | None
+            :param until: Send time filter: unix timestamp, rounded to the bucket
+            :type by: str | None
+            :param by: Group by: 'provider', 'prefix', 'bucket' (the bucket start time)
+            :rtype: dict
+            :returns: { sent, accepted, delivered, expired, error, delivery_rate, error_rate },
+                or { group: {...} } when grouped. Rates are None when nothing was sent.
+        """
+        assert by in (None, 'provider', 'prefix', 'bucket'), 'Unknown grouping: {}'.format(by)
+        with self._lock:
+            rows = self._select(provider, prefix, since, until)
+            if by is None:
+                return self._totals(rows)
+
+            groups = {}
+            for row in rows:
+                groups.setdefault(self._group_key(row, by), []).append(row)
+            return {key: self._totals(group) for key, group in groups.items()}
+
+    def latency(self, q, provider=None, prefix=None, since=None, until=None):
+        """ Get a percentile of the send-to-delivery latency
+
+            The value is interpolated within a histogram bin: it's accurate to the bin width.
+
+            :type q: float
+            :param q: Percentile: 0..1
+            :param provider, prefix, since, until: Filters: see :meth:`query`
+            :rtype: float | None
+            :returns: Latency, seconds; None if nothing was delivered
+        """
+        width = len(self.LATENCY_BINS) + 1
+        with self._lock:
+            histogram = [0] * width
+            for row in self._select(provider, prefix, since, until):
+                offset = row * width
+                for i in range(width):
+                    histogram[i] += self._latency[offset + i]
+
+        total = sum(histogram)
+        if not total:
+            return None
+
+        target = q * total
+        seen = 0
+        for i, count in enumerate(histogram):
+            if count and seen + count >= target:
+                low = self.LATENCY_BINS[i - 1] if i > 0 else 0.0
+                high = self.LATENCY_BINS[i] if i < len(self.LATENCY_BINS) else low
+                return low + (high - low) * (target - seen) / count
+            seen += count
+        return self.LATENCY_BINS[-1]
+
+    #endregion
@@ -0,0 +1,271 @@
+import os
+import mmap
+import struct
+import threading
+import tempfile
+from array import array
+from bisect import bisect_left
+
+from .lib import digits_only
+
+
+# Keys are 8-byte unsigned integers
+try:
+    _TYPECODE = array('Q').typecode
+except ValueError:  # Python 2: no 'Q', but 'L' is 8 bytes on 64-bit Unix
+    _TYPECODE = 'L'
+assert array(_TYPECODE).itemsize == 8, 'Blocklist needs 8-byte integers: Python 3, or Python 2 on 64-bit Unix'
+_KEY = struct.Struct('=Q')
+
+
+def _key(number):
+    """ Convert a phone number to an integer key
+
+        The leading '1' keeps the leading zeros: '012' and '12' are different numbers
+
+        :type number: str
+        :rtype: int | None
+        :returns: The key, or None for a number that can't be blocked: empty, or too long
+    """
+    if not number:
+        return None
+    if not number.isdigit():  # messages have digits-only numbers already
+        number = digits_only(number)
+    if not number or len(number) > Blocklist.MAX_DIGITS:
+        return None
+    return int('1' + number)
+
+
+def _number(key):
+    """ Convert an integer key back to the phone number """
+    return str(key)[1:]
+
+
+class _MappedKeys(object):
+    """ Sorted keys in a memory-mapped file, as a read-only sequence
+
+        Python 2 can't make typed memoryviews of a mapping: the keys are unpacked on access instead
+    """
+
+    __slots__ = ('_mapped', '_offset', '_len')
+
+    def __init__(self, mapped, offset):
+        self._mapped = mapped
+        self._offset = offset
+        self._len = (len(mapped) - offset) // _KEY.size
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._len)
+            assert step == 1, 'Step is not supported'
+            keys = array(_TYPECODE)
+            if start < stop:
+                keys.fromstring(self._mapped[self._offset + start * _KEY.size:self._offset + stop * _KEY.size])
+            return keys
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError(i)
+        return _KEY.unpack_from(self._mapped, self._offset + i * _KEY.size)[0]
+
+
+class Blocklist(object):
+    """ Opt-out list: numbers that must never receive messages
+
+        Numbers are stored as 8-byte integers in a sorted array, and are looked up with a binary search:
+        20M numbers take 160MB, and a lookup is about 25 comparisons.
+
+        The array is either built in memory, or memory-mapped from a file written by :meth:`save`:
+        loading takes no time and no memory of its own, as the pages are shared with the OS file cache
+        and with the other processes that map the same file.
+
+        Incremental changes, `add()` and `remove()`, are kept in small sets on top of the array,
+        until `compact()` merges them into a new array, or `save()` writes them to a file.
+
+        Use it with the Gateway: messages to the blocked numbers fail with `BlockedError`:
+
+            gw.blocklist = Blocklist.load('/var/lib/sms/optout.bin')
+            gw.blocklist.add('+123456')
+            ...
+            gw.blocklist.reload()  # pick up the new file
+
+        Files must be replaced atomically, never rewritten in place: :meth:`save` does it right.
+    """
+
+    #: Max number length: the key has to fit into 8 bytes
+    MAX_DIGITS = 18
+
+    #: File header
+    MAGIC = b'SMSBLK1\n'
+
+    def __init__(self, numbers=()):
+        """ Create a blocklist in memory
+
+            :type numbers: collections.Iterable[str]
+            :param numbers: Phone numbers
+        """
+        #: File path, when loaded from a file
+        self.path = None
+
+        # Sorted keys: an array, or a view into a memory-mapped file
+        keys = array(_TYPECODE, sorted(set(k for k in map(_key, numbers) if k is not None)))
+        # Changes: keys added, keys removed. Never in both at once
+        self._state = (keys, set(), set())
+        # Serializes the changes: lookups don't need it
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """ Load a blocklist file written by :meth:`save`
+
+            :type path: str
+            :rtype: Blocklist
+            :raises ValueError: Not a blocklist file
+        """
+        blocklist = cls()
+        blocklist.reload(path)
+        return blocklist
+
+    def reload(self, path=None):
+        """ Replace the numbers with the file contents: memory-mapped, zero-copy
+
+            Changes not saved to the file are discarded.
+            Lookups running concurrently see either the old numbers, or the new ones.
+
+            :type path: str | None
+            :param path: The file; default: the one loaded before
+            :raises ValueError: Not a blocklist file
+        """
+        path = path or self.path
+        keys = self._map(path)
+        with self._lock:
+            # The old mapping is closed by the garbage collector once the lookups that use it finish
+            self._state = (keys, set(), set())
+            self.path = path
+
+    @classmethod
+    def _map(cls, path):
+        """ Memory-map a file
+
+            :rtype: memoryview | _MappedKeys | array
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError('Not a blocklist file: {}'.format(path))
+            size = os.fstat(f.fileno()).st_size - len(cls.MAGIC)
+            if size % 8:
+                raise ValueError('Blocklist file is truncated: {}'.format(path))
+            if not size:
+                return array(_TYPECODE)  # empty: can't map
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # the mapping outlives the file object
+        try:
+            return memoryview(mapped)[len(cls.MAGIC):].cast(_TYPECODE)
+        except TypeError:  # Python 2: no buffer interface
+            return _MappedKeys(mapped, len(cls.MAGIC))
+
+    def save(self, path=None):
+        """ Write the numbers, including the changes, to a file and map it
+
+            The file is replaced atomically: processes that have mapped the old file keep using it until they reload.
+
+            :type path: str | None
+            :param path: The file; default: the one loaded before
+        """
+        path = path or self.path
+        with self._lock:
+            keys = self._merged()
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.blocklist')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(self.MAGIC)
+                    keys.tofile(f)
+                getattr(os, 'replace', os.rename)(tmp, path)  # atomic
+            except Exception:
+                os.unlink(tmp)
+                raise
+            self._state = (self._map(path), set(), set())
+            self.path = path
+
+    #region Changes
+
+    def add(self, *numbers):
+        """ Block numbers """
+        with self._lock:
+            keys, added, removed = self._state
+            for key in map(_key, numbers):
+                if key is not None:
+                    removed.discard(key)
+                    if not self._in_keys(keys, key):
+                        added.add(key)
+
+    def remove(self, *numbers):
+        """ Unblock numbers """
+        with self._lock:
+            keys, added, removed = self._state
+            for key in map(_key, numbers):
+                if key is not None:
+                    added.discard(key)
+                    if self._in_keys(keys, key):
+                        removed.add(key)
+
+    def compact(self):
+        """ Merge the changes into a new in-memory array
+
+            Lookups get a bit faster, but a memory-mapped file is no longer shared: prefer :meth:`save`.
+        """
+        with self._lock:
+            self._state = (self._merged(), set(), set())
+
+    def _merged(self):
+        """ Get the sorted keys with the changes applied. Call with the lock held
+
+            :rtype: array
+        """
+        keys, added, removed = self._state
+        base = array(_TYPECODE, (k for k in keys if k not in removed)) if removed else keys
+        merged = array(_TYPECODE)
+        start = 0
+        for key in sorted(added):
+            i = bisect_left(base, key)
+            merged.extend(base[start:i])
+            merged.append(key)
+            start = i
+        merged.extend(base[start:])
+        return merged
+
+    #endregion
+
+    #region Lookups
+
+    @staticmethod
+    def _in_keys(keys, key):
+        i = bisect_left(keys, key)
+        return i < len(keys) and keys[i] == key
+
+    def __contains__(self, number):
+        """ Is the number blocked?
+
+            :type number: str
+        """
+        key = _key(number)
+        if key is None:
+            return False
+        keys, added, removed = self._state
+        if key in added:
+            return True
+        return key not in removed and self._in_keys(keys, key)
+
+    def __len__(self):
+        keys, added, removed = self._state
+        return len(keys) + len(added) - len(removed)
+
+    def __iter__(self):
+        """ Get the blocked numbers: shorter ones first, then sorted """
+        with self._lock:
+            keys = self._merged()
+        return (_number(key) for key in keys)
+
+    #endregion
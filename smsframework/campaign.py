@@ -0,0 +1,397 @@
+import io
+import os
+import sys
+import csv
+import json
+import logging
+import tempfile
+import threading
+from itertools import islice
+from time import time
+
+try:  # Py3
+    from queue import Queue, Full
+except ImportError:  # Py2
+    from Queue import Queue, Full
+
+from .lib.events import EventHook
+
+logger = logging.getLogger(__name__)
+
+_PY2 = sys.version_info[0] == 2
+
+
+class CsvRecipients(object):
+    """ Recipients from a CSV file with a header row, read lazily
+
+        Every row becomes a (dst, values) pair, where `values` is a dict of { column: value }.
+        The campaign resumes reading at a byte position: the file is not re-read from the start.
+    """
+
+    def __init__(self, path, dst='dst', encoding='utf-8', **fmtparams):
+        """
+            :type path: str
+            :param path: CSV file path
+            :type dst: str
+            :param dst: Name of the column with the destination phone numbers
+            :type encoding: str
+            :param encoding: File encoding
+            :param fmtparams: CSV format parameters: see :func:`csv.reader`
+        """
+        self.path = path
+        self.dst = dst
+        self.encoding = encoding
+        self.fmtparams = fmtparams
+
+    def read(self, position=None):
+        """ Read the recipients
+
+            :type position: int | None
+            :param position: Byte position to start at, as yielded earlier
+            :rtype: collections.Iterator[tuple]
+            :returns: Iterator of (position, dst, values), where `position` is where the next row starts
+        """
+        with io.open(self.path, 'rb') as f:
+            header = self._decode(next(csv.reader([self._line(f.readline())], **self.fmtparams)))
+            if position:
+                f.seek(position)
+
+            # Read line by line to know the position: csv.reader pulls as many lines as a row takes
+            state = {'position': f.tell()}
+            def lines():
+                for line in iter(f.readline, b''):
+                    state['position'] = f.tell()
+                    yield self._line(line)
+
+            for row in csv.reader(lines(), **self.fmtparams):
+                if not row:
+                    continue
+                values = dict(zip(header, self._decode(row)))
+                yield state['position'], values[self.dst], values
+
+    def _line(self, line):
+        """ Prepare a line for csv.reader: Python 2 reads bytes only, non-ASCII text fails there """
+        return line if _PY2 else line.decode(self.encoding)
+
+    def _decode(self, row):
+        """ Decode the cells of a row read by csv.reader """
+        return [cell.decode(self.encoding) for cell in row] if _PY2 else row
+
+
+class Campaign(object):
+    """ Campaign: sends a template message to a stream of recipients
+
+        * Recipients are read lazily: only `window` messages are in memory at a time.
+          When the senders fall behind, reading waits (backpressure).
+          Reading also waits while a message `window + concurrency` recipients back is still being sent,
+          e.g. retried or hung: the outcomes kept above the offset stay bounded.
+        * Messages are sent with `Gateway.send()` by `concurrency` threads
+        * Progress is saved to the checkpoint file, so a crashed campaign resumes where it stopped
+
+        The checkpoint file is a JSON lines log. It starts with the offset: {"offset": index, "position": ..., "sent": n, "failed": n},
+        where the offset is the number of recipients that are all done, followed by message outcomes:
+        {"i": index, "msgid": ...} or {"i": index, "error": ...}.
+        On resume, reading continues at the offset, and the messages that are done already are skipped.
+        Failed messages are not retried.
+
+        Every `checkpoint_every` messages the log is compacted: rewritten with the current offset,
+        and the outcomes above it, so its size stays bounded. Messages sent after that are sent again after a crash.
+        Errors of the checkpoint writes and of `onProgress` handlers are logged: they don't stop the campaign.
+
+            campaign = Campaign(gw, template, CsvRecipients('users.csv', dst='phone'), checkpoint='users.campaign')
+            campaign.onProgress += lambda c: print(c.sent, c.failed, c.rate)
+            campaign.run()
+    """
+
+    #: Stop marker
+    _STOP = object()
+
+    def __init__(self, gateway, template, recipients, checkpoint=None, concurrency=8, window=None,
+                 checkpoint_every=100, progress_every=1000):
+        """ Create a campaign
+
+            :type gateway: smsframework.Gateway
+            :type template: smsframework.MessageTemplate
+            :param template: The message template
+            :type recipients: collections.Iterable | CsvRecipients
+            :param recipients: Iterable of (dst, values) tuples, or a CsvRecipients.
+                An iterable is skipped through when resuming; a CsvRecipients seeks.
+            :type checkpoint: str | None
+            :param checkpoint: Checkpoint file path. None to disable resuming
+            :type concurrency: int
+            :param concurrency: Number of messages sent in parallel
+            :type window: int | None
+            :param window: Max number of messages waiting to be sent. Default: 2 * concurrency
+            :type checkpoint_every: int
+            :param checkpoint_every: Compact the checkpoint every N messages
+            :type progress_every: int
+            :param progress_every: Fire onProgress every N messages
+        """
+        self.gateway = gateway
+        self.template = template
+        self.recipients = recipients
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.window = window or 2 * concurrency
+        self.checkpoint_every = checkpoint_every
+        self.progress_every = progress_every
+
+        #: Event: progress, every `progress_every` messages: onProgress(campaign)
+        self.onProgress = EventHook()
+
+        #: Event: the campaign has finished: onFinish(campaign)
+        self.onFinish = EventHook()
+
+        #: Counter: messages sent
+        self.sent = 0
+        #: Counter: messages failed
+        self.failed = 0
+        #: Counter: messages skipped because they're done already
+        self.skipped = 0
+        #: Number of recipients that are all done
+        self.offset = 0
+        #: Reading position of the offset (CsvRecipients only)
+        self.position = None
+        #: Run start time
+        self.started = None
+
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._advanced = threading.Condition(self._lock)  # the offset has moved
+        self._completed = {}  # { index: (position, failed) }: done, but above the offset
+        self._skip = {}  # { index: failed }: done before this run, above the offset, not read yet
+        self._unflushed = 0
+        self._resumed = 0  # messages done before this run
+        self._file = None
+
+    @property
+    def rate(self):
+        """ Throughput of this run, messages per second
+
+            :rtype: float
+        """
+        elapsed = time() - self.started if self.started else 0
+        return (self.sent + self.failed - self._resumed) / elapsed if elapsed > 0 else 0.0
+
+    def stop(self):
+        """ Stop the campaign: stop reading, finish the messages in flight. Thread-safe """
+        self._stopped = True
+
+    def run(self):
+        """ Run the campaign, resuming from the checkpoint. Blocks until it's done or stopped
+
+            :rtype: Campaign
+        """
+        self.started = time()
+        self._skip = self._load_checkpoint()
+        if self.checkpoint:
+            self._file = io.open(self.checkpoint, 'a', encoding='utf-8')
+            if self._file.tell() and not self._ends_with_newline():
+                self._file.write(u'\n')  # crashed while writing a line
+
+        queue = Queue(self.window)
+        workers = [threading.Thread(target=self._worker, args=(queue,), name='smsframework-campaign')
+                   for i in range(self.concurrency)]
+        for t in workers:
+            t.daemon = True
+            t.start()
+
+        try:
+            for index, position, dst, values in self._read():
+                if not self._wait_offset(index, workers) or self._stopped:
+                    break
+                if index in self._skip:
+                    with self._lock:
+                        self.skipped += 1
+                        self._complete(index, position, self._skip.pop(index))
+                    continue
+                try:
+                    message = self.template._message(dst, values)
+                except Exception as e:  # bad recipient data
+                    self._done(index, position, None, e)
+                else:
+                    if not self._put(queue, (index, position, message), workers):  # blocks when the window is full
+                        raise RuntimeError('Campaign workers have died')
+        finally:
+            for t in workers:
+                if not self._put(queue, self._STOP, workers):
+                    break
+            for t in workers:
+                t.join()
+            with self._lock:
+                self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+        self._progress()
+        self.onFinish(self)
+        return self
+
+    def _wait_offset(self, index, workers):
+        """ Wait till the offset is close enough to the index: at most `window + concurrency` recipients back
+
+            :rtype: bool
+            :returns: False if the campaign is stopped
+            :raises RuntimeError: all the workers are dead
+        """
+        with self._advanced:
+            while index - self.offset >= self.window + self.concurrency and not self._stopped:
+                if not any(t.is_alive() for t in workers):
+                    raise RuntimeError('Campaign workers have died')
+                self._advanced.wait(1)
+        return not self._stopped
+
+    @staticmethod
+    def _put(queue, item, workers):
+        """ Queue an item for the workers, waiting while the queue is full
+
+            :rtype: bool
+            :returns: False if all the workers are dead: the item would never be taken
+        """
+        while True:
+            try:
+                queue.put(item, timeout=1)
+                return True
+            except Full:
+                if not any(t.is_alive() for t in workers):
+                    return False
+
+    def _read(self):
+        """ Read the recipients from the offset
+
+            :rtype: collections.Iterator[tuple]
+            :returns: Iterator of (index, position, dst, values)
+        """
+        if isinstance(self.recipients, CsvRecipients):
+            rows = self.recipients.read(self.position)
+        else:
+            rows = ((None, dst, values) for dst, values in islice(self.recipients, self.offset, None))
+        for index, (position, dst, values) in enumerate(rows, self.offset):
+            yield index, position, dst, values
+
+    def _worker(self, queue):
+        """ Send the messages """
+        while True:
+            item = queue.get()
+            if item is self._STOP:
+                return
+            index, position, message = item
+            try:
+                message = self.gateway.send(message)
+            except Exception as e:
+                self._done(index, position, message, e)
+            else:
+                self._done(index, position, message, None)
+
+
+    #region Progress
+
+    def _done(self, index, position, message, error):
+        """ Record the outcome of a message """
+        with self._lock:
+            if error is None:
+                self.sent += 1
+                record = {'i': index, 'msgid': message.msgid}
+            else:
+                self.failed += 1
+                record = {'i': index, 'error': '{}: {}'.format(error.__class__.__name__, error)}
+            self._complete(index, position, error is not None)
+
+            try:
+                if self._file is not None:
+                    self._file.write(json.dumps(record) + u'\n')
+                self._unflushed += 1
+                if self._unflushed >= self.checkpoint_every:
+                    self._flush()
+            except Exception:  # the message is done: keep sending, it's only sent again after a crash
+                logger.exception('Campaign checkpoint {}: write failed'.format(self.checkpoint))
+
+            progress = (self.sent + self.failed) % self.progress_every == 0
+        if progress:
+            self._progress()
+
+    def _progress(self):
+        """ Fire onProgress """
+        try:
+            self.onProgress(self)
+        except Exception:
+            logger.exception('onProgress handler has failed')  # the campaign is fine: don't stop it
+
+    def _complete(self, index, position, failed):
+        """ Advance the offset. Call with the lock held """
+        self._completed[index] = (position, failed)
+        if self.offset in self._completed:
+            while self.offset in self._completed:
+                self.position = self._completed.pop(self.offset)[0]
+                self.offset += 1
+            self._advanced.notify()
+
+    def _flush(self):
+        """ Compact the checkpoint: rewrite it with the offset and the outcomes above it. Call with the lock held """
+        self._unflushed = 0
+        if self._file is None:
+            return
+
+        # Outcomes above the offset: of this run, and of the previous ones, not read yet
+        above = dict(self._skip)
+        above.update((i, failed) for i, (position, failed) in self._completed.items())
+        failed_above = sum(1 for failed in above.values() if failed)
+        lines = [json.dumps({'offset': self.offset, 'position': self.position,  # counters below the offset
+                             'sent': self.sent - (len(above) - failed_above), 'failed': self.failed - failed_above})]
+        lines.extend(json.dumps({'i': i, 'error': True} if failed else {'i': i}) for i, failed in sorted(above.items()))
+
+        # Replace atomically
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.checkpoint)), prefix='.campaign')
+        try:
+            with io.open(fd, 'w', encoding='utf-8') as f:
+                f.write(u'\n'.join(lines) + u'\n')
+            self._file.close()
+            getattr(os, 'replace', os.rename)(tmp, self.checkpoint)
+        except Exception:
+            os.unlink(tmp)
+            raise
+        finally:
+            self._file = io.open(self.checkpoint, 'a', encoding='utf-8')
+
+    def _load_checkpoint(self):
+        """ Load the progress from the checkpoint
+
+            Only the outcomes above the offset are kept: at most `window + concurrency` of them.
+
+            :rtype: dict
+            :returns: Messages done above the offset: { index: failed }
+        """
+        done = {}
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return done
+
+        with io.open(self.checkpoint, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning('Campaign checkpoint {}: skipped a broken line: {!r}'.format(self.checkpoint, line))
+                    continue
+                if 'offset' in record:
+                    self.offset, self.position = record['offset'], record['position']
+                    if 'sent' in record:  # compacted: the counters below the offset
+                        self.sent, self.failed = record['sent'], record['failed']
+                    done = {i: failed for i, failed in done.items() if i >= self.offset}
+                else:
+                    if record['i'] >= self.offset:
+                        done[record['i']] = 'error' in record
+                    if 'error' in record:
+                        self.failed += 1
+                    else:
+                        self.sent += 1
+        self._resumed = self.sent + self.failed
+        return done
+
+    def _ends_with_newline(self):
+        """ Does the checkpoint file end with a newline? """
+        with io.open(self.checkpoint, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    #endregion
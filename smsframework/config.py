@@ -0,0 +1,301 @@
+import json
+import logging
+import threading
+from time import time
+from importlib import import_module
+
+from .Gateway import Gateway
+from .IProvider import IProvider
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingTable(object):
+    """ Routing rules, compiled
+
+        Every rule is a dict: { provider, prefix, route, escalate }, where the conditions are optional:
+
+        * 'prefix': destination number prefix
+        * 'route': the first routing value of the message: see `OutgoingMessage.route()`
+        * 'escalate': the message escalation flag: see `OutgoingMessage.options(escalate=True)`
+
+        Rules are tried from the longest prefix to the shortest, and in the given order for the same prefix.
+        The first rule that matches wins.
+    """
+
+    def __init__(self, rules):
+        """
+            :type rules: list[dict]
+            :param rules: Routing rules
+        """
+        #: The rules
+        self.rules = rules
+
+        # Compile: [ (prefix length, { prefix: [rule] }) ], longest prefixes first
+        table = {}
+        for rule in rules:
+            unknown = set(rule) - {'provider', 'prefix', 'route', 'escalate'}
+            assert not unknown, 'Unknown routing rule keys: {}'.format(', '.join(sorted(unknown)))
+            assert 'provider' in rule, 'Routing rule without a provider: {}'.format(rule)
+            prefix = rule.get('prefix', '')
+            table.setdefault(len(prefix), {}).setdefault(prefix, []).append(rule)
+        self._table = sorted(table.items(), reverse=True)
+
+    def match(self, message):
+        """ Find the provider for a message
+
+            :type message: smsframework.data.OutgoingMessage
+            :rtype: str | None
+            :returns: Provider name, or None when no rule matches
+        """
+        dst = message.dst or ''
+        route = message.routing_values[0] if message.routing_values else None
+        escalate = bool(message.provider_options.escalate)
+        for length, prefixes in self._table:
+            for rule in prefixes.get(dst[:length], ()):
+                if 'route' in rule and rule['route'] != route:
+                    continue
+                if 'escalate' in rule and bool(rule['escalate']) != escalate:
+                    continue
+                return rule['provider']
+        return None
+
+
+class _Config(object):
+    """ A configuration: providers & routing, used as a whole """
+
+    def __init__(self, specs=None, providers=None, default=None, routes=None):
+        #: Provider specs: { name: dict }
+        self.specs = specs or {}
+        #: Providers: { name: IProvider }
+        self.providers = providers or {}
+        #: Default provider name
+        self.default = default
+        #: Routing table
+        #: :type: RoutingTable
+        self.routes = routes or RoutingTable([])
+        #: Number of sends in progress
+        self.in_flight = 0
+
+
+def _provider_class(Provider):
+    """ Get a provider class: a class, a registered provider name, or 'module:Class'
+
+        :rtype: type
+        :raises KeyError: unknown provider name
+    """
+    if isinstance(Provider, type):
+        return Provider
+    if ':' in Provider:
+        module, cls = Provider.split(':', 1)
+        return getattr(import_module(module), cls)
+    from .providers.registry import get_provider_class
+    return get_provider_class(Provider)
+
+
+class ConfigGateway(Gateway):
+    """ Gateway configured with a dict or a JSON file, reloadable at runtime
+
+            gw = ConfigGateway({
+                'providers': {
+                    'main': {'type': 'clickatell', 'api_key': '...'},
+                    'uk': {'type': 'my_package.providers:UkProvider', 'login': '...'},
+                },
+                'default': 'main',
+                'routes': [
+                    {'prefix': '44', 'provider': 'uk'},
+                ],
+            })
+            ...
+            gw.reload('/etc/sms.json')
+
+        Providers: { name: spec }, where the spec has the provider 'type' (a registered provider name, 'module:Class',
+        or a class), and the rest of it is the provider configuration. Default provider: the first one, unless given.
+        Routes: see :class:`RoutingTable`. Messages that match no rule go through `Gateway.router` as usual.
+
+        A reload builds the new providers and the routing table first, while the sends keep using the old ones,
+        and then swaps them in at once. Providers whose spec hasn't changed are kept as they are.
+        Every send uses a single configuration from start to finish, even when retried.
+        The old providers are closed (see `IProvider.close()`) once the sends that use them are done.
+        When the gateway is open (see `Gateway.open()`), the new providers are warmed up before the swap.
+
+        Receivers that have already been created keep serving the providers they were created with.
+    """
+
+    def __init__(self, config=None):
+        """
+            :type config: dict | str | None
+            :param config: The configuration, or a JSON file path
+        """
+        #: The configuration file, if loaded from a file
+        self.path = None
+
+        self._current = _Config()
+        self._local = threading.local()  # configuration used by the current thread's send
+        self._cond = threading.Condition()  # in-flight counters
+        self._reload_lock = threading.Lock()
+
+        super(ConfigGateway, self).__init__()
+        if config is not None:
+            self.reload(config, wait=True)
+
+    #region Configuration
+
+    def _config(self):
+        """ Get the configuration to use in this thread
+
+            :rtype: _Config
+        """
+        return getattr(self._local, 'config', None) or self._current
+
+    @property
+    def _providers(self):
+        return self._config().providers
+
+    @_providers.setter
+    def _providers(self, providers):
+        self._current.providers = providers  # Gateway.__init__
+
+    @property
+    def _default_provider(self):
+        return self._config().default
+
+    @_default_provider.setter
+    def _default_provider(self, name):
+        self._current.default = name  # add_provider(), default_provider setter
+
+    @property
+    def routes(self):
+        """ Routing table
+
+            :rtype: RoutingTable
+        """
+        return self._config().routes
+
+    def reload(self, config=None, wait=False, drain_timeout=60):
+        """ Apply a new configuration
+
+            :type config: dict | str | None
+            :param config: The configuration, or a JSON file path. Default: reload the file loaded before
+            :type wait: bool
+            :param wait: Wait till the old providers are closed
+            :type drain_timeout: float
+            :param drain_timeout: Max time to wait for the sends that use the old providers, seconds
+            :raises AssertionError: invalid configuration; the current one remains in effect
+            :raises KeyError: unknown provider type; the current one remains in effect
+            :raises Exception: errors from provider constructors and warm-up; the current one remains in effect
+        """
+        if config is None:
+            assert self.path is not None, 'No configuration file to reload'
+            config = self.path
+        path = None
+        if not isinstance(config, dict):
+            path = config
+            with open(path) as f:
+                config = json.load(f)
+
+        with self._reload_lock:
+            old = self._current
+            new = self._build(config, old)
+            with self._cond:
+                self._current = new  # swap
+            if path is not None:
+                self.path = path
+
+        retired = [provider for name, provider in old.providers.items() if new.providers.get(name) is not provider]
+        drain = threading.Thread(target=self._drain, args=(old, retired, drain_timeout),
+                                 name='smsframework-config-drain')
+        drain.daemon = True
+        drain.start()
+        if wait:
+            drain.join()
+
+    def _build(self, config, old):
+        """ Build a configuration, reusing the unchanged providers
+
+            :rtype: _Config
+        """
+        unknown = set(config) - {'providers', 'default', 'routes'}
+        assert not unknown, 'Unknown configuration keys: {}'.format(', '.join(sorted(unknown)))
+        specs = config.get('providers') or {}
+        assert specs, 'No providers configured'
+
+        new = _Config(specs=specs)
+        try:
+            for name, spec in specs.items():
+                if old.specs.get(name) == spec and name in old.providers:
+                    new.providers[name] = old.providers[name]
+                    continue
+                spec = dict(spec)
+                Provider = _provider_class(spec.pop('type'))
+                assert issubclass(Provider, IProvider), 'Provider does not implement IProvider'
+                new.providers[name] = Provider(self, name, **spec)
+
+            new.default = config.get('default') or next(iter(specs))
+            assert new.default in new.providers, 'Unknown default provider: {}'.format(new.default)
+            new.routes = RoutingTable(config.get('routes') or [])
+            for rule in new.routes.rules:
+                assert rule['provider'] in new.providers, 'Routing rule for an unknown provider: {}'.format(rule)
+
+            # Warm the new providers up, if the gateway is open already
+            if self.state == 'open':
+                built = {name: p for name, p in new.providers.items() if old.providers.get(name) is not p}
+                for name, (result, e) in self._call_providers('open', None, built).items():
+                    if e is not None:
+                        raise e
+        except Exception:
+            # Close the providers made so far
+            self._close([p for name, p in new.providers.items() if old.providers.get(name) is not p])
+            raise
+        return new
+
+    def _drain(self, old, retired, timeout):
+        """ Wait till the sends using the old configuration are done, close the retired providers """
+        deadline = time() + timeout
+        with self._cond:
+            while old.in_flight:
+                left = deadline - time()
+                if left <= 0:
+                    logger.warning('Closing providers with {} sends still in progress'.format(old.in_flight))
+                    break
+                self._cond.wait(left)
+        self._close(retired)
+
+    def _close(self, providers):
+        for provider in providers:
+            try:
+                provider.close()
+            except Exception:
+                logger.exception('Failed to close provider {}'.format(provider.name))
+
+    #endregion
+
+    #region Sending
+
+    def _route(self, message):
+        if message.provider is None:
+            name = self._config().routes.match(message)
+            if name is not None:
+                return self.get_provider(name)
+        return super(ConfigGateway, self)._route(message)
+
+    def _send(self, message, provider_name=None, retry=True):
+        # Use the same configuration till the end, even when retried
+        previous = getattr(self._local, 'config', None)
+        if previous is not None:
+            return super(ConfigGateway, self)._send(message, provider_name, retry)  # nested: already counted
+
+        with self._cond:
+            config = self._current
+            config.in_flight += 1
+        self._local.config = config
+        try:
+            return super(ConfigGateway, self)._send(message, provider_name, retry)
+        finally:
+            self._local.config = None
+            with self._cond:
+                config.in_flight -= 1
+                if not config.in_flight:
+                    self._cond.notify_all()
+
+    #endregion
@@ -0,0 +1,170 @@
+from string import Formatter
+
+from .OutgoingMessage import OutgoingMessage
+from .OutgoingMessageOptions import OutgoingMessageOptions
+from ..lib import digits_only
+from ..lib.gsm import text_length, count_segments
+
+
+class MessageTemplate(object):
+    """ Message template: one body with per-recipient variables, for bulk sends
+
+        The body uses the `str.format()` syntax: 'Hi {name}, your code is {code}'.
+        It is parsed once; so is the length of its variable-free parts.
+
+        All messages made from the template share its options and params objects:
+        don't modify them on individual messages.
+    """
+
+    #: Routing values
+    routing_values = None
+
+    def __init__(self, body, src=None, provider=None):
+        """ Compile a template
+
+            :type body: str | unicode
+            :param body: Message template
+            :type src: str | None
+            :param src: Source phone number. Non-digit chars are cut off
+            :type provider: str | None
+            :param provider: Provider name to use for sending
+        """
+        self.body = body
+        self.src = src
+        self.provider = provider
+
+        #: Sending options for the Gateway, shared by all messages
+        self.provider_options = OutgoingMessageOptions()
+
+        #: Provider-dependent sending parameters, shared by all messages
+        self.provider_params = {}
+
+        # Compile: [ (literal, field name, conversion, format spec) ]
+        formatter = Formatter()
+        self._parts = [(literal, field, conversion, spec or '')
+                       for literal, field, spec, conversion in formatter.parse(body)]
+        self._formatter = formatter
+
+        # Length of the variable-free parts
+        gsm, ucs2 = text_length(''.join(part[0] for part in self._parts))
+        self._gsm_length, self._ucs2_length = gsm, ucs2
+
+    def options(self, **kwargs):
+        """ Specify sending options for the Gateway. See: :meth:`OutgoingMessage.options`
+
+            :rtype: MessageTemplate
+        """
+        self.provider_options.__dict__.update(kwargs)
+        return self
+
+    def params(self, **params):
+        """ Specify provider-specific sending parameters
+
+            :rtype: MessageTemplate
+        """
+        self.provider_params = params
+        return self
+
+    def route(self, *args):
+        """ Specify arbitrary routing values. See: :meth:`OutgoingMessage.route`
+
+            :rtype: MessageTemplate
+        """
+        self.routing_values = args
+        return self
+
+    def _values(self, values):
+        """ Format the variables
+
+            :type values: dict
+            :rtype: list
+        """
+        formatted = []
+        for literal, field, conversion, spec in self._parts:
+            if field is None:
+                continue
+            if field in values:
+                value = values[field]
+            else:
+                value = self._formatter.get_field(field, (), values)[0]  # 'user.name', 'items[0]'
+            if conversion:
+                value = self._formatter.convert_field(value, conversion)
+            formatted.append(format(value, spec))
+        return formatted
+
+    def _render(self, formatted):
+        """ Render the body with formatted variables
+
+            :type formatted: list
+            :rtype: str
+        """
+        values = iter(formatted)
+        return ''.join(literal if field is None else literal + next(values)
+                       for literal, field, conversion, spec in self._parts)
+
+    def render(self, **values):
+        """ Render the message body
+
+            :param values: Template variables
+            :rtype: str | unicode
+            :raises KeyError: missing variable
+        """
+        return self._render(self._values(values))
+
+    def segments(self, **values):
+        """ Get the encoding and the number of segments of a rendered message
+
+            Only the variables are measured: the rest is precomputed.
+
+            :param values: Template variables
+            :rtype: tuple
+            :returns: (encoding: 'gsm7' | 'ucs2', number of segments)
+        """
+        gsm, ucs2 = self._gsm_length, self._ucs2_length
+        for value in self._values(values):
+            value_gsm, value_ucs2 = text_length(value)
+            gsm = None if gsm is None or value_gsm is None else gsm + value_gsm
+            ucs2 += value_ucs2
+        return count_segments(gsm, ucs2)
+
+    def message(self, dst, **values):
+        """ Make a message for a recipient
+
+            :type dst: str
+            :param dst: Destination phone number
+            :param values: Template variables
+            :rtype: OutgoingMessage
+            :raises KeyError: missing variable
+        """
+        return self._message(dst, values)
+
+    def _message(self, dst, values):
+        # Skip OutgoingMessage.__init__(): the options are shared
+        message = OutgoingMessage.__new__(OutgoingMessage)
+        message.src = self.src
+        message.dst = digits_only(dst)
+        message.body = self._render(self._values(values))
+        message.provider = self.provider
+        message.provider_options = self.provider_options
+        message.provider_params = self.provider_params
+        if self.routing_values is not None:
+            message.routing_values = self.routing_values
+        return message
+
+    def messages(self, recipients):
+        """ Make messages for recipients, lazily
+
+            :type recipients: collections.Iterable
+            :param recipients: Iterable of (dst, values) tuples, where `values` is a dict of template variables
+            :rtype: collections.Iterator[OutgoingMessage]
+        """
+        for dst, values in recipients:
+            yield self._message(dst, values)
+
+    def __repr__(self):
+        return '{cls}({body!r}, src={src!r}, provider={provider!r})'.format(
+            cls=self.__class__.__name__,
+            body=self.body,
+            src=self.src,
+            provider=self.provider
+        )
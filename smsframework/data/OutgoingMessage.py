@@ -1,3 +1,5 @@
+from time import time
+
 from .OutgoingMessageOptions import OutgoingMessageOptions
 from ..lib import digits_only
 
@@ -54,12 +56,30 @@ class OutgoingMessage(object):
             :param expires: Message validity period, minutes
             :param senderId: Sender ID to replace the number
             :param escalate: Is a high-pri message? These are delivered faster and costier.
+            :param deadline: Sending deadline, unix timestamp. See: :meth:`time_left`
+            :param lane: Dispatcher lane name. See: :class:`smsframework.dispatcher.Dispatcher`
 
             :rtype: OutgoingMessage
         """
         self.provider_options.__dict__.update(kwargs)
         return self
 
+    def time_left(self, default=None):
+        """ Get the time left till the sending deadline.
+
+            Providers use it for their timeouts.
+
+            :type default: float | None
+            :param default: The value to use when there's no deadline. When both are given, the smallest one is used.
+            :rtype: float | None
+            :returns: Seconds left (negative when the deadline has passed), or `default`
+        """
+        deadline = self.provider_options.deadline
+        if deadline is None:
+            return default
+        left = deadline - time()
+        return left if default is None else min(left, default)
+
     def params(self, **params):
         """ Specify provider-specific sending parameters
 
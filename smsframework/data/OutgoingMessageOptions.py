@@ -15,3 +15,11 @@ class OutgoingMessageOptions(object):
 
     #: Is a high-pri message? These are delivered faster and costier.
     escalate = False
+
+    #: Dispatcher lane name, or None to choose by `escalate`.
+    #: See: :class:`smsframework.dispatcher.Dispatcher`
+    lane = None
+
+    #: Sending deadline: unix timestamp, or None for no deadline.
+    #: See: :meth:`OutgoingMessage.time_left`
+    deadline = None
@@ -1,4 +1,5 @@
 from .IncomingMessage import IncomingMessage
 from .OutgoingMessage import OutgoingMessage
+from .MessageTemplate import MessageTemplate
 from .MessageStatus import MessageStatus, \
     MessageAccepted, MessageDelivered, MessageExpired, MessageError
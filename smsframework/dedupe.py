@@ -0,0 +1,123 @@
+import threading
+from time import time
+
+from . import exc
+
+
+class _Flight(object):
+    """ A message being sent: its duplicates wait for it """
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class Deduplicator(object):
+    """ Suppresses repeated sends of the same message to the same number
+
+        A message is a duplicate when a message with the same (dst, body, src) was sent within `window` seconds.
+        Duplicates are not sent: they get the `msgid` and `provider` of the original message instead.
+        Duplicates of a message that is being sent right now wait for its result: if it fails, they are sent.
+
+        Use it with the Gateway:
+
+            gw.dedupe = Deduplicator(window=60)
+
+        Messages are remembered by their hash in two dicts, current and previous, which are rotated
+        every `window` seconds: lookups are O(1), and old messages are forgotten in bulk, with no scanning.
+        Memory is bounded by `max_size`: when the current dict gets half of it, it's rotated early,
+        and the window gets shorter for a while.
+
+        Counter: `suppressed`.
+    """
+
+    def __init__(self, window=60, max_size=1000000):
+        """
+            :type window: float
+            :param window: Time window, seconds
+            :type max_size: int
+            :param max_size: Max number of messages remembered
+        """
+        self.window = window
+        self.max_size = max_size
+
+        #: Counter: duplicates suppressed
+        self.suppressed = 0
+
+        self._lock = threading.Lock()
+        # Time buckets: { key: (time, msgid, provider) }
+        self._current = {}
+        self._previous = {}
+        self._rotated = time()
+        # Messages being sent: { key: _Flight }
+        self._flights = {}
+
+    def __len__(self):
+        """ Get the number of messages remembered """
+        return len(self._current) + len(self._previous) + len(self._flights)
+
+    @staticmethod
+    def key(message):
+        """ Get the dedupe key of a message
+
+            :type message: smsframework.data.OutgoingMessage
+            :rtype: int
+        """
+        return hash((message.dst, message.body, message.src))
+
+    def send(self, message, send):
+        """ Send a message, unless it's a duplicate
+
+            :type message: smsframework.data.OutgoingMessage
+            :type send: callable
+            :param send: Function that sends the message: send(message) -> message
+            :rtype: smsframework.data.OutgoingMessage
+            :returns: The sent message, or the duplicate with the `msgid` and `provider` of the original one
+            :raises DeadlineError: the deadline has passed while waiting for the original message
+            :raises Exception: errors from send()
+        """
+        key = self.key(message)
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    sent = self._get(key, time())
+                    if sent is not None:
+                        self.suppressed += 1
+                        _, message.msgid, message.provider = sent
+                        return message
+                    flight = self._flights[key] = _Flight()
+                    break
+            # The original is being sent: wait for it
+            if not flight.done.wait(message.time_left()):
+                raise exc.DeadlineError('Deadline exceeded while waiting for the original message')
+
+        try:
+            message = send(message)
+        except Exception:
+            with self._lock:
+                del self._flights[key]
+            raise
+        else:
+            with self._lock:
+                del self._flights[key]
+                self._current[key] = (time(), message.msgid, message.provider)
+        finally:
+            flight.done.set()
+        return message
+
+    def _get(self, key, now):
+        """ Look a sent message up, rotating the buckets if it's time. Call with the lock held
+
+            :rtype: tuple | None
+            :returns: (time, msgid, provider)
+        """
+        if now - self._rotated >= self.window or len(self._current) >= self.max_size // 2:
+            # A bucket older than the window is dropped altogether
+            self._previous = self._current if now - self._rotated < 2 * self.window else {}
+            self._current = {}
+            self._rotated = now
+
+        sent = self._current.get(key) or self._previous.get(key)
+        if sent is not None and now - sent[0] > self.window:
+            return None
+        return sent
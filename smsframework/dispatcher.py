@@ -0,0 +1,282 @@
+import heapq
+import logging
+import threading
+import itertools
+from time import time
+from collections import OrderedDict, deque
+
+from . import exc
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher(object):
+    """ Queued sending with priority lanes
+
+        Messages are queued into lanes, and are sent by a pool of worker threads with `Gateway.send()`:
+        results are reported with the Gateway events, `onSend` and `onSendError`.
+
+        Lane of a message: `OutgoingMessage.options(lane=...)`, or else 'high' for escalated messages
+        (see `OutgoingMessage.options(escalate=True)`) and 'normal' for the rest.
+
+        Scheduling:
+
+        * Weighted fair: a lane with weight 10 gets 10 times as many sends as a lane with weight 1, while both are busy;
+          a lane alone gets everything. When lanes are even, the heavier one goes first
+        * Reserved capacity: `reserved={'high': 2}` keeps 2 workers, and 2 sending slots of every provider,
+          for the 'high' lane only. Bulk traffic can't take them, so high priority messages never wait for a free worker
+        * Every provider has at most `per_provider` messages in flight: a slow provider doesn't take all the workers
+
+        Retries: failed messages are retried according to the retry policy (see `smsframework.retry.RetryPolicy`),
+        but workers don't sleep: the message is queued again once the delay is over, and the worker moves on.
+
+            dispatcher = Dispatcher(gw, workers=16, reserved={'high': 2})
+            dispatcher.submit(OutgoingMessage('+123', 'Your code: 1234').options(escalate=True))
+            for message in campaign:
+                dispatcher.submit(message)  # 'normal' lane
+            dispatcher.join()
+            dispatcher.close()
+
+        Counters: `sent`, `failed`; see also :meth:`stats`.
+    """
+
+    #: Default lanes: { name: weight }
+    LANES = {'high': 10, 'normal': 1}
+
+    def __init__(self, gateway, workers=8, lanes=None, reserved=None, per_provider=None, max_queue=10000):
+        """ Start the workers
+
+            :type gateway: smsframework.Gateway
+            :type workers: int
+            :param workers: Number of worker threads
+            :type lanes: dict | None
+            :param lanes: Lanes: { name: weight }. Must include 'high' and 'normal'. Default: `Dispatcher.LANES`
+            :type reserved: dict | None
+            :param reserved: Capacity reserved for lanes: { name: number of workers & provider slots }
+            :type per_provider: int | None
+            :param per_provider: Max number of messages in flight, per provider. Default: `workers`
+            :type max_queue: int
+            :param max_queue: Max number of messages waiting in a lane: `submit()` blocks when it's full
+        """
+        self.gateway = gateway
+        self.workers = workers
+        self.lanes = dict(lanes or self.LANES)
+        self.reserved = dict(reserved or {})
+        self.per_provider = per_provider or workers
+        self.max_queue = max_queue
+        assert 'high' in self.lanes and 'normal' in self.lanes, "Lanes must include 'high' and 'normal'"
+        assert set(self.reserved) <= set(self.lanes), 'Unknown lanes reserved: {}'.format(self.reserved)
+        assert sum(self.reserved.values()) < min(workers, self.per_provider), 'Nothing left unreserved'
+
+        #: Counter: messages sent
+        self.sent = 0
+        #: Counter: messages failed
+        self.failed = 0
+
+        self._cond = threading.Condition()
+        self._closed = False
+        # Queues: { lane: { provider: deque of (message, attempt) } }, providers in round-robin order
+        self._queues = {lane: OrderedDict() for lane in self.lanes}
+        self._queued = {lane: 0 for lane in self.lanes}
+        # Weighted fair scheduling: virtual time of every lane; the lane with the lowest one goes next
+        self._pass = {lane: 0.0 for lane in self.lanes}
+        self._vtime = 0.0
+        # Workers busy: { lane: n }; messages in flight: { provider: { lane: n } }
+        self._busy = {lane: 0 for lane in self.lanes}
+        self._in_flight = {}
+        # Retries waiting for their time: heap of (not before, seq, lane, provider, message, attempt)
+        self._delayed = []
+        self._seq = itertools.count()
+
+        self._threads = [threading.Thread(target=self._run, name='smsframework-dispatcher-{}'.format(i))
+                         for i in range(workers)]
+        for t in self._threads:
+            t.daemon = True
+            t.start()
+
+    def lane(self, message):
+        """ Get the lane of a message
+
+            :type message: smsframework.data.OutgoingMessage
+            :rtype: str
+        """
+        options = message.provider_options
+        if options.lane is not None:
+            assert options.lane in self.lanes, 'Unknown lane: {}'.format(options.lane)
+            return options.lane
+        return 'high' if options.escalate else 'normal'
+
+    def submit(self, message):
+        """ Queue a message for sending
+
+            Blocks while its lane is full.
+
+            :type message: smsframework.data.OutgoingMessage
+            :raises AssertionError: wrong provider name encountered, unknown lane
+            :raises RuntimeError: the dispatcher is closed
+        """
+        lane = self.lane(message)
+        provider = self.gateway._route(message).name
+        with self._cond:
+            while self._queued[lane] >= self.max_queue and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError('Dispatcher is closed')
+
+            self._enqueue(lane, provider, message, 0)
+            self._cond.notify_all()
+
+    def join(self, timeout=None):
+        """ Wait until all the queued messages are sent, or have failed after their retries
+
+            :type timeout: float | None
+            :rtype: bool
+            :returns: False on timeout
+        """
+        deadline = None if timeout is None else time() + timeout
+        with self._cond:
+            while any(self._queued.values()) or any(self._busy.values()) or self._delayed:
+                left = None if deadline is None else deadline - time()
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def close(self):
+        """ Send the queued messages, with their retries, and stop the workers """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self):
+        """ Get the current state
+
+            :rtype: dict
+            :returns: { queued: { lane: n }, busy: { lane: n }, delayed: n, sent, failed }.
+                `delayed`: retries waiting for their time
+        """
+        with self._cond:
+            return {'queued': dict(self._queued), 'busy': dict(self._busy), 'delayed': len(self._delayed),
+                    'sent': self.sent, 'failed': self.failed}
+
+
+    #region Scheduling
+
+    def _free(self, lane, used, used_by_lane, capacity):
+        """ Is there capacity for the lane, keeping the unused reservations of the other lanes? """
+        held = sum(max(0, n - used_by_lane.get(other, 0)) for other, n in self.reserved.items() if other != lane)
+        return used + held < capacity
+
+    def _enqueue(self, lane, provider, message, attempt):
+        """ Put a message into its lane. Call with the lock held """
+        queues = self._queues[lane]
+        if not self._queued[lane]:
+            self._pass[lane] = max(self._pass[lane], self._vtime)  # idle lanes don't bank their turns
+        if provider not in queues:
+            queues[provider] = deque()
+        queues[provider].append((message, attempt))
+        self._queued[lane] += 1
+
+    def _undelay(self):
+        """ Queue the retries whose time has come. Call with the lock held
+
+            :rtype: float | None
+            :returns: Seconds till the next retry is due, or None if there are none
+        """
+        now = time()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, lane, provider, message, attempt = heapq.heappop(self._delayed)
+            self._enqueue(lane, provider, message, attempt)
+        return self._delayed[0][0] - now if self._delayed else None
+
+    def _pick(self):
+        """ Take the next message to send. Call with the lock held
+
+            :rtype: tuple | None
+            :returns: (lane, provider, message, attempt)
+        """
+        busy = sum(self._busy.values())
+        # Lowest virtual time first; ties go to the heavier lane, then by name, not by the dict order
+        for _, _, lane in sorted((self._pass[lane], -self.lanes[lane], lane) for lane, n in self._queued.items() if n):
+            if not self._free(lane, busy, self._busy, self.workers):
+                continue
+            queues = self._queues[lane]
+            for provider, queue in queues.items():
+                in_flight = self._in_flight.get(provider, {})
+                if not self._free(lane, sum(in_flight.values()), in_flight, self.per_provider):
+                    continue
+
+                message, attempt = queue.popleft()
+                del queues[provider]
+                if queue:
+                    queues[provider] = queue  # round-robin between providers: move to the end
+                self._queued[lane] -= 1
+                self._vtime = self._pass[lane]
+                self._pass[lane] += 1.0 / self.lanes[lane]
+                return lane, provider, message, attempt
+        return None
+
+    def _retry_policy(self, provider):
+        """ Get the retry policy of a provider
+
+            :type provider: str
+            :rtype: smsframework.retry.RetryPolicy | None
+        """
+        return self.gateway.get_provider(provider).retry_policy or self.gateway.retry_policy
+
+    def _run(self):
+        """ Worker thread """
+        while True:
+            with self._cond:
+                while True:
+                    due = self._undelay()
+                    picked = self._pick()
+                    if picked is not None:
+                        break
+                    if self._closed and not any(self._queued.values()) and due is None:
+                        return
+                    self._cond.wait(due)
+                lane, provider, message, attempt = picked
+                self._busy[lane] += 1
+                in_flight = self._in_flight.setdefault(provider, {})
+                in_flight[lane] = in_flight.get(lane, 0) + 1
+                self._cond.notify_all()  # a lane has room
+
+            # Single attempt: routed once, in submit(); retried by us
+            error = policy = None
+            try:
+                policy = self._retry_policy(provider)
+                if policy is not None and not attempt:
+                    policy.budget.deposit()
+                self.gateway._send_routed(message, provider, retry=False)
+            except exc.MessageSendError as e:
+                error = e  # reported with onSendError
+            except Exception as e:
+                error = e
+                logger.exception('Dispatcher failed to send {!r}'.format(message))
+            retry = None if error is None or policy is None else policy.retry(message, error, attempt)
+
+            with self._cond:
+                if error is None:
+                    self.sent += 1
+                elif retry is None:
+                    self.failed += 1
+                else:
+                    delay, retry_provider = retry
+                    heapq.heappush(self._delayed, (time() + delay, next(self._seq), lane,
+                                                   retry_provider or provider,  # failed before the provider was tried
+                                                   message, attempt + 1))
+                self._busy[lane] -= 1
+                in_flight[lane] -= 1
+                self._cond.notify_all()
+
+    #endregion
+
@@ -6,6 +6,17 @@ class ConnectionError(ProviderError):
     """ Connection failed """
 
 
+class ForwardError(ProviderError):
+    """ Forwarding to some of the clients failed
+
+        The `errors` attribute is a dict { client: exception }
+    """
+
+    def __init__(self, message, errors=None):
+        super(ForwardError, self).__init__(message, errors or {})
+        self.errors = errors or {}
+
+
 #region Sending errors
 
 class MessageSendError(ProviderError):
@@ -36,4 +47,16 @@ class CreditError(MessageSendError):
     """ Not enough money on the account """
 
 
+class DeadlineError(MessageSendError):
+    """ Sending deadline exceeded """
+
+
+class OverloadError(MessageSendError):
+    """ Sending rejected: too many messages in flight """
+
+
+class BlockedError(MessageSendError):
+    """ Sending rejected: the destination number is blocked (opted out) """
+
+
 #endregion
@@ -9,3 +9,15 @@ def digits_only(num):
         :rtype: str
     """
     return re.sub(r'[^\d]+', '', num)
+
+
+def get_logger(name):
+    """ Get a logger, importing `logging` on demand: it takes a good part of the `import smsframework` time
+
+        Use it in modules that are always imported, and only log on errors.
+
+        :type name: str
+        :rtype: logging.Logger
+    """
+    import logging
+    return logging.getLogger(name)
@@ -0,0 +1,153 @@
+""" ASGI receiver. Requires Python 3.5+ """
+
+import asyncio
+import logging
+
+from .http import Request, Response, receiver_routes, health_handler
+from .events import collect_awaitables
+
+logger = logging.getLogger(__name__)
+
+
+class AsgiReceiver(object):
+    """ ASGI application that serves the receivers of all providers
+
+        Providers are served under '/{prefix}/provider-name', using the routes from
+        :meth:`smsframework.IProvider.make_receiver_routes`, just like :class:`smsframework.lib.wsgi.WsgiReceiver`.
+
+        Connections are handled on the event loop, without a thread per connection.
+        Route handlers are sync and may block (e.g. forward the message to another server):
+        they're called in the loop's default executor, so a slow one doesn't hold up the other connections.
+        Event handlers can be coroutine functions: they're awaited on the event loop before the response is sent,
+        so their failures are reported to the sender just like with sync handlers.
+
+        Create:
+            app = AsgiReceiver(gateway, '/sms')
+        Serve:
+            uvicorn.run(app)
+
+        With `lifecycle=True`, the server startup and shutdown open and close the gateway:
+        see :meth:`smsframework.Gateway.open` and :meth:`smsframework.Gateway.close`.
+    """
+
+    def __init__(self, gateway, prefix='/', max_body_size=1024 * 1024, health_path=None, lifecycle=False):
+        """ Create the application
+
+            :type gateway: smsframework.Gateway
+            :param gateway: The gateway to serve the receivers for
+            :type prefix: str
+            :param prefix: URL prefix to hide the receivers under
+            :type max_body_size: int
+            :param max_body_size: Max request body size, bytes. Larger requests are rejected
+            :type health_path: str | None
+            :param health_path: Full path to serve the gateway health at, e.g. '/health'. See :func:`health_handler`
+            :type lifecycle: bool
+            :param lifecycle: Open the gateway on the lifespan startup, close it on shutdown
+        """
+        self.gateway = gateway
+        self.prefix = prefix
+        self.max_body_size = max_body_size
+        self.health_path = health_path
+        self.lifecycle = lifecycle
+
+        #: Routes: { full path: handler }
+        #: :type: dict
+        self.routes = {}
+        self.build()
+
+    def build(self):
+        """ (Re)build the routes: call it after the providers have changed
+
+            :rtype: AsgiReceiver
+        """
+        routes = receiver_routes(self.gateway, self.prefix)
+        if self.health_path is not None:
+            routes[self.health_path.rstrip('/')] = health_handler(self.gateway)
+        self.routes = routes  # swap
+        return self
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise NotImplementedError('Unsupported ASGI scope: {}'.format(scope['type']))
+
+        # Route
+        handler = self.routes.get(scope['path'].rstrip('/'))
+        if handler is None:
+            return await self._respond(send, Response(b'Not Found', 404, [('Content-Type', 'text/plain')]))
+
+        # Read the request
+        chunks, size = [], 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            size += len(chunks[-1])
+            more_body = message.get('more_body', False)
+            if size > self.max_body_size:
+                return await self._respond(send, Response(b'Payload Too Large', 413, [('Content-Type', 'text/plain')]))
+
+        request = Request(
+            scope['method'],
+            scope['path'],
+            scope.get('query_string', b''),
+            {k.decode('latin-1').title(): v.decode('latin-1') for k, v in scope.get('headers', ())},
+            b''.join(chunks)
+        )
+
+        # Handle: sync, in a thread, collecting async event handlers
+        response, pending = await asyncio.get_event_loop().run_in_executor(None, self._handle, handler, request)
+
+        # Await async event handlers
+        try:
+            for awaitable in pending:
+                await awaitable
+        except Exception as e:
+            logger.exception('Async event handler error')
+            error_response = getattr(handler, 'error_response', None)  # the route's own error format
+            if error_response is not None:
+                response = error_response(e)
+            else:
+                response = Response(b'Internal Server Error', 500, [('Content-Type', 'text/plain')])
+        finally:
+            for awaitable in pending:
+                if hasattr(awaitable, 'close'):
+                    awaitable.close()  # those that were not awaited because of an error
+
+        # Respond
+        await self._respond(send, response)
+
+    @staticmethod
+    def _handle(handler, request):
+        """ Call a route handler, collecting the awaitables of async event handlers. Runs in a worker thread
+
+            :rtype: (Response, list)
+        """
+        with collect_awaitables() as pending:
+            return handler(request), pending
+
+    @staticmethod
+    async def _respond(send, response):
+        """ Send a Response """
+        headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers]
+        headers.append((b'content-length', str(len(response.body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': response.body})
+
+    async def _lifespan(self, receive, send):
+        """ Lifespan protocol: open & close the gateway, if enabled """
+        loop = asyncio.get_event_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.lifecycle:
+                    await loop.run_in_executor(None, self.gateway.open)  # failures are logged by the gateway
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.lifecycle:
+                    await loop.run_in_executor(None, self.gateway.close)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
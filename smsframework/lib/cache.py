@@ -0,0 +1,135 @@
+import threading
+import logging
+from functools import wraps
+from time import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight(object):
+    """ A value being loaded: concurrent callers wait for it """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TtlCache(object):
+    """ Cache with expiration, for slow read-only calls like provider balance lookups
+
+        * Values are cached for `ttl` seconds
+        * Concurrent lookups of the same key make a single call: the rest wait for its result (single-flight)
+        * For another `stale` seconds after the expiration, the old value is returned
+          while it's being refreshed in a background thread (stale-while-revalidate)
+
+        Errors are not cached.
+    """
+
+    def __init__(self, ttl=60, stale=0):
+        """
+            :type ttl: float
+            :param ttl: How long are the values fresh, seconds
+            :type stale: float
+            :param stale: How long can the expired values be used while refreshing, seconds
+        """
+        self.ttl = ttl
+        self.stale = stale
+
+        #: Cached values: { key: (value, expires) }
+        self._values = {}
+        #: Loads in progress: { key: _Flight }
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """ Get a value, loading it if necessary
+
+            :param key: Cache key
+            :type load: callable
+            :param load: Function that loads the value: load()
+            :returns: The value
+            :raises Exception: errors from load()
+        """
+        now = time()
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None and now < cached[1]:
+                return cached[0]  # fresh
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+            # Stale: refresh in the background
+            if cached is not None and now < cached[1] + self.stale:
+                if leader:
+                    threading.Thread(target=self._load, args=(key, load, flight), name='TtlCache refresh').start()
+                return cached[0]
+
+        # Missing or too old: wait for the value
+        if leader:
+            self._load(key, load, flight)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _load(self, key, load, flight):
+        """ Load a value, share it with the waiting callers """
+        try:
+            flight.value = load()
+        except Exception as e:
+            flight.error = e
+            logger.debug('Failed to load {!r}'.format(key), exc_info=True)
+        with self._lock:
+            if flight.error is None and self._flights.get(key) is flight:  # not invalidated meanwhile
+                self._values[key] = (flight.value, time() + self.ttl)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.done.set()
+
+    def invalidate(self, key=None):
+        """ Drop a cached value
+
+            :param key: Cache key. None to drop all values
+        """
+        with self._lock:
+            if key is None:
+                self._values.clear()
+                self._flights.clear()
+            else:
+                self._values.pop(key, None)
+                self._flights.pop(key, None)
+
+
+def cached(ttl=60, stale=0):
+    """ Cache the results of a read-only provider method
+
+        The cache is per provider instance, and the arguments are the key:
+
+            class MyProvider(IProvider):
+                @cached(ttl=60, stale=300)
+                def get_balance(self):
+                    ...
+
+        The caches are dropped by :meth:`IProvider.invalidate_cache`: see :class:`TtlCache`
+
+        :type ttl: float
+        :param ttl: How long are the values fresh, seconds
+        :type stale: float
+        :param stale: How long can the expired values be used while refreshing, seconds
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(self, *args, **kwargs):
+            caches = self.__dict__.setdefault('_api_caches', {})
+            cache = caches.get(f.__name__)
+            if cache is None:
+                cache = caches.setdefault(f.__name__, TtlCache(ttl, stale))
+            key = (args, tuple(sorted(kwargs.items())))
+            return cache.get(key, lambda: f(self, *args, **kwargs))
+        return wrapper
+    return decorator
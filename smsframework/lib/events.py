@@ -1,3 +1,13 @@
+import threading
+from time import time
+
+from . import get_logger
+
+
+#: Thread-local state: awaitables collector
+_local = threading.local()
+
+
 class EventHook(object):
     """ Event Pattern
 
@@ -5,25 +15,235 @@ class EventHook(object):
             event = EventHook()
         Subscribe:
             event += handler
+        Subscribe with a filter on the first argument:
+            event.subscribe(handler, provider='main', cls=MessageDelivered)
         Unsubscribe:
             event -= handler
         Fire:
             event(...)
 
+        Handlers can also be coroutine functions: the awaitables they return are handed over to
+        the enclosing :class:`collect_awaitables` block, which is set up by async receivers.
+
+        Thread-safe: subscriptions are kept in an immutable tuple which is replaced on every change,
+        so firing takes no lock and sees either the old or the new handlers, never a half-updated list.
+        The handlers of filtered events are looked up in an index by (type, provider) of the first argument,
+        which is filled in as the events are fired: handlers that don't match are never called.
+
         Based on: http://www.voidspace.org.uk/python/weblog/arch_d7_2007_02_03.shtml#e616
     """
 
     def __init__(self):
-        self.__handlers = []
+        # State: (subscriptions, handlers, index), replaced as a whole.
+        # subscriptions: tuple of (handler, provider, cls);
+        # handlers: tuple of all handlers; index: { (type, provider): tuple of handlers }, or None when there are no filters
+        self.__state = ((), (), None)
+        # Serializes the changes: firing doesn't need it
+        self.__lock = threading.Lock()
 
-    def __iadd__(self, handler):
-        self.__handlers.append(handler)
+    def subscribe(self, handler, provider=None, cls=None):
+        """ Subscribe a handler
+
+            The filters are matched against the first argument of the event:
+            a message or a status.
+
+            :type handler: callable
+            :param handler: The handler
+            :type provider: str | None
+            :param provider: Filter: only call the handler for this provider
+            :type cls: type | tuple[type] | None
+            :param cls: Filter: only call the handler for instances of this class
+            :rtype: EventHook
+        """
+        with self.__lock:
+            self.__update(self.__state[0] + ((handler, provider, cls),))
         return self
 
-    def __isub__(self, handler):
-        self.__handlers.remove(handler)
+    def unsubscribe(self, handler):
+        """ Unsubscribe a handler: its first subscription
+
+            :raises ValueError: Not subscribed
+        """
+        with self.__lock:
+            subscriptions = self.__state[0]
+            for i, subscription in enumerate(subscriptions):
+                if subscription[0] == handler:
+                    break
+            else:
+                raise ValueError('Handler is not subscribed: {!r}'.format(handler))
+            self.__update(subscriptions[:i] + subscriptions[i+1:])
         return self
 
+    def __update(self, subscriptions):
+        """ Replace the state. Call with the lock held """
+        filtered = any(provider is not None or cls is not None for _, provider, cls in subscriptions)
+        self.__state = (subscriptions, tuple(handler for handler, _, _ in subscriptions), {} if filtered else None)
+
+    def __iadd__(self, handler):
+        return self.subscribe(handler)
+
+    def __isub__(self, handler):
+        return self.unsubscribe(handler)
+
+    def __len__(self):
+        """ Get the number of handlers """
+        return len(self.__state[0])
+
+    def _handlers(self, args):
+        """ Get the handlers for the arguments
+
+            :rtype: tuple[callable]
+        """
+        subscriptions, handlers, index = self.__state
+        if index is None:
+            return handlers
+
+        arg = args[0] if args else None
+        provider = getattr(arg, 'provider', None)
+        key = (type(arg), provider)
+        handlers = index.get(key)
+        if handlers is None:
+            handlers = index[key] = tuple(
+                handler for handler, p, cls in subscriptions
+                if (p is None or p == provider) and (cls is None or isinstance(arg, cls)))
+        return handlers
+
     def __call__(self, *args, **kwargs):
-        for handler in self.__handlers:
-            handler(*args, **kwargs)
+        for handler in self._handlers(args):
+            result = handler(*args, **kwargs)
+            if result is not None and hasattr(result, '__await__'):
+                _defer_awaitable(handler, result)
+
+
+class EventBatcher(object):
+    """ Collects items into batches for a batch event
+
+        Create:
+            batcher = EventBatcher(event, max_size=100, max_wait=1.0)
+        Add an item:
+            batcher(item)
+        Fire the collected items now:
+            batcher.flush()
+        Stop the background thread, fire the collected items:
+            batcher.close()
+
+        The batches are fired from a background thread: event(items),
+        when `max_size` items are collected, or `max_wait` seconds after the first one.
+        Nothing is collected while the event has no handlers.
+
+        Errors raised by the handlers are logged: there's nobody to report them to.
+    """
+
+    def __init__(self, event, max_size=100, max_wait=1.0):
+        """
+            :type event: EventHook
+            :param event: The batch event to fire
+            :type max_size: int
+            :param max_size: Max number of items in a batch
+            :type max_wait: float
+            :param max_wait: Max time an item waits for its batch, seconds
+        """
+        self.event = event
+        self.max_size = max_size
+        self.max_wait = max_wait
+
+        self._items = []
+        self._first = None  # time of the first item
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closing = False
+
+    def __call__(self, item):
+        if not len(self.event):
+            return
+        with self._cond:
+            self._items.append(item)
+            if len(self._items) == 1:
+                self._first = time()
+                self._cond.notify()
+            elif len(self._items) >= self.max_size:
+                self._cond.notify()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='smsframework-batcher')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def flush(self):
+        """ Fire the collected items now, in the current thread """
+        with self._cond:
+            batch, self._items = self._items, []
+        self._fire(batch)
+
+    def close(self):
+        """ Stop the background thread, and fire the collected items in the current thread
+
+            Waits for the batch the thread may be firing. Items added afterwards are collected again, by a new thread.
+        """
+        with self._cond:
+            self._closing = True
+            thread = self._thread
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+        with self._cond:
+            self._closing = False
+            self._thread = None
+        self.flush()
+
+    def _fire(self, batch):
+        if not batch:
+            return
+        try:
+            self.event(batch)
+        except Exception:
+            get_logger(__name__).exception('Batch event handler has failed, {} items lost'.format(len(batch)))
+
+    def _run(self):
+        """ Background thread: fire the batches """
+        while True:
+            with self._cond:
+                while not self._items and not self._closing:
+                    self._cond.wait()
+                while 0 < len(self._items) < self.max_size and not self._closing:
+                    left = self._first + self.max_wait - time()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                if self._closing:
+                    return  # close() fires the rest
+                batch, self._items = self._items, []
+            self._fire(batch)
+
+
+class collect_awaitables(object):
+    """ Collect awaitables returned by async event handlers fired within the block
+
+        with collect_awaitables() as pending:
+            gateway.onReceive(message)
+        for awaitable in pending:
+            await awaitable
+
+        The block must not contain any `await`s: the collector is thread-local.
+    """
+
+    def __enter__(self):
+        self._previous = getattr(_local, 'awaitables', None)
+        _local.awaitables = []
+        return _local.awaitables
+
+    def __exit__(self, *exc_info):
+        _local.awaitables = self._previous
+
+
+def _defer_awaitable(handler, awaitable):
+    """ Hand over an awaitable returned by an async handler to the current collector
+
+        :raises RuntimeError: No collector: the event was fired outside of an async receiver
+    """
+    awaitables = getattr(_local, 'awaitables', None)
+    if awaitables is None:
+        if hasattr(awaitable, 'close'):
+            awaitable.close()  # never awaited: silence the warning
+        raise RuntimeError('Async event handler {!r} can only be used with an async receiver'.format(handler))
+    awaitables.append(awaitable)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+""" SMS encoding and segment count """
+from __future__ import unicode_literals
+
+#: GSM 03.38 basic character set: 1 septet each
+GSM_BASIC = frozenset(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+
+#: GSM 03.38 extension table: 2 septets each (escape + char)
+GSM_EXTENDED = frozenset('^{}\\[~]|€\f')
+
+#: Encodings
+GSM7 = 'gsm7'
+UCS2 = 'ucs2'
+
+#: Encoding: (single message length, segment length of a multipart message)
+SEGMENT_LENGTHS = {
+    GSM7: (160, 153),
+    UCS2: (70, 67),
+}
+
+
+def text_length(text):
+    """ Get the length of the text in both encodings
+
+        :type text: str | unicode
+        :rtype: tuple
+        :returns: (GSM-7 length in septets or None if the text is not GSM-compatible, UCS-2 length in code units)
+    """
+    ucs2 = len(text.encode('utf-16-le')) // 2
+    gsm = 0
+    for c in text:
+        if c in GSM_BASIC:
+            gsm += 1
+        elif c in GSM_EXTENDED:
+            gsm += 2
+        else:
+            return None, ucs2
+    return gsm, ucs2
+
+
+def count_segments(gsm_length, ucs2_length):
+    """ Get the encoding and the number of segments from the text lengths
+
+        :type gsm_length: int | None
+        :type ucs2_length: int
+        :rtype: tuple
+        :returns: (encoding, number of segments)
+    """
+    encoding, length = (GSM7, gsm_length) if gsm_length is not None else (UCS2, ucs2_length)
+    single, multi = SEGMENT_LENGTHS[encoding]
+    return encoding, 1 if length <= single else -(-length // multi)
+
+
+def segments(text):
+    """ Get the encoding and the number of segments of an SMS text
+
+        :type text: str | unicode
+        :rtype: tuple
+        :returns: (encoding, number of segments)
+    """
+    return count_segments(*text_length(text))
@@ -0,0 +1,138 @@
+import json
+
+try:  # Py3
+    from urllib.parse import parse_qs
+    from http.client import responses
+except ImportError:  # Py2
+    from urlparse import parse_qs
+    from httplib import responses
+
+
+class Request(object):
+    """ Framework-independent HTTP request, as seen by the receiver routes
+
+        See: :meth:`smsframework.IProvider.make_receiver_routes`
+    """
+
+    def __init__(self, method, path, query_string=b'', headers=None, body=b''):
+        """ Create the request
+
+            :type method: str
+            :param method: HTTP method, uppercase
+            :type path: str
+            :param path: Request path
+            :type query_string: bytes
+            :param query_string: Raw query string
+            :type headers: dict | None
+            :param headers: Request headers { Title-Case-Name: value }
+            :type body: bytes
+            :param body: Request body
+        """
+        self.method = method
+        self.path = path
+        self.query_string = query_string
+        self.headers = headers or {}
+        self.body = body
+
+    @property
+    def args(self):
+        """ Query string arguments. Only the first value is kept for repeated arguments
+
+            :rtype: dict
+        """
+        return self._parse_qs(self.query_string)
+
+    @property
+    def form(self):
+        """ Form data (application/x-www-form-urlencoded)
+
+            :rtype: dict
+        """
+        if not self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+            return {}
+        return self._parse_qs(self.body)
+
+    def get_data(self):
+        """ Get the request body
+
+            :rtype: bytes
+        """
+        return self.body
+
+    @staticmethod
+    def _parse_qs(qs):
+        if isinstance(qs, bytes):
+            qs = qs.decode('utf-8')
+        return {k: v[0] for k, v in parse_qs(qs).items()}
+
+    def __repr__(self):
+        return '{cls}({method!r}, {path!r})'.format(cls=self.__class__.__name__, method=self.method, path=self.path)
+
+
+class Response(object):
+    """ Framework-independent HTTP response, as returned by the receiver routes """
+
+    def __init__(self, body=b'', status=200, headers=None):
+        """ Create the response
+
+            :type body: bytes | str
+            :param body: Response body. Text is encoded as UTF-8
+            :type status: int
+            :param status: HTTP status code
+            :type headers: list[tuple[str, str]] | None
+            :param headers: Response headers
+        """
+        self.body = body.encode('utf-8') if not isinstance(body, bytes) else body
+        self.status = status
+        self.headers = headers or []
+
+    @property
+    def status_line(self):
+        """ Status line: e.g. '200 OK'
+
+            :rtype: str
+        """
+        return '{} {}'.format(self.status, responses.get(self.status, 'Unknown'))
+
+    def __repr__(self):
+        return '{cls}({status!r})'.format(cls=self.__class__.__name__, status=self.status)
+
+
+def receiver_routes(gateway, prefix='/'):
+    """ Collect the receiver routes of all providers under '/{prefix}/provider-name'
+
+        Providers that do not implement :meth:`smsframework.IProvider.make_receiver_routes` are skipped.
+
+        :type gateway: smsframework.Gateway
+        :type prefix: str
+        :param prefix: URL prefix to hide the receivers under
+        :rtype: dict
+        :returns: Routes: { full path: handler }. Paths have no trailing slash
+    """
+    prefix = '/' + prefix.strip('/') + '/' if prefix.strip('/') else '/'
+
+    routes = {}
+    for name, provider in gateway._providers.items():
+        try:
+            provider_routes = provider.make_receiver_routes()
+        except NotImplementedError:
+            continue  # Ignore providers that do not support it
+        for path, handler in provider_routes.items():
+            routes[(prefix + name + '/' + path.strip('/')).rstrip('/')] = handler
+    return routes
+
+
+def health_handler(gateway):
+    """ Make a handler that reports the gateway health: see :meth:`smsframework.Gateway.health`
+
+        Responds with the health as JSON: 200 when the gateway is ready, 503 when it's not.
+        Use it as the load balancer readiness probe.
+
+        :type gateway: smsframework.Gateway
+        :rtype: callable
+    """
+    def handler(request):
+        health = gateway.health()
+        return Response(json.dumps(health).encode('utf-8'), 200 if health['ready'] else 503,
+                        [('Content-Type', 'application/json')])
+    return handler
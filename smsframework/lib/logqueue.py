@@ -0,0 +1,144 @@
+import json
+import logging
+import threading
+
+try:  # Py3
+    from queue import Queue, Empty, Full
+except ImportError:  # Py2
+    from Queue import Queue, Empty, Full
+
+
+class LogQueue(object):
+    """ Non-blocking, batched log writer
+
+        Records are put into a bounded queue and written to the logger by a background listener thread,
+        so that log handler I/O (files, syslog, ...) never happens on the caller's thread.
+
+        Records are plain dicts: they're serialized to JSON lines by the listener, not by the caller.
+        The listener writes them in batches: every batch becomes a single log record with one JSON line per entry.
+
+        When the queue is full, or the writer is closed, records are dropped and counted: see `dropped`.
+
+        This is not `logging.handlers.QueueHandler` & `QueueListener`: they're Python 3 only,
+        format every record on the caller's thread, and write records one by one.
+
+        Create:
+            q = LogQueue(logger)
+        Write:
+            q.put({'dst': '123', 'body_len': 10})
+        Stop & flush:
+            q.close()
+    """
+
+    #: Stop marker
+    _STOP = object()
+
+    def __init__(self, logger, queue_size=10000, batch_size=100, level=logging.INFO):
+        """ Start the listener
+
+            :type logger: logging.Logger
+            :param logger: The logger to write the batches to
+            :type queue_size: int
+            :param queue_size: Max number of records waiting to be written. Overflowing records are dropped.
+            :type batch_size: int
+            :param batch_size: Max number of records written with a single log record
+            :type level: int
+            :param level: Logging level to write with
+        """
+        self.logger = logger
+        self.batch_size = batch_size
+        self.level = level
+
+        self._queue = Queue(queue_size)
+        self._lock = threading.Lock()  # counters, closing
+        self._closed = False
+
+        #: Counter: records accepted into the queue
+        self.queued = 0
+        #: Counter: records dropped because the queue was full
+        self.dropped = 0
+        #: Counter: records written to the logger
+        self.written = 0
+        #: Counter: batches written to the logger
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._listen, name='smsframework-logqueue')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, record):
+        """ Enqueue a record for writing. Never blocks.
+
+            :type record: dict
+            :param record: JSON-serializable record
+            :rtype: bool
+            :returns: False if the record was dropped
+        """
+        with self._lock:
+            try:
+                if self._closed:
+                    raise Full  # the listener won't write it
+                self._queue.put_nowait(record)
+            except Full:
+                self.dropped += 1
+                return False
+            else:
+                self.queued += 1
+                return True
+
+    def is_alive(self):
+        """ Is the listener running?
+
+            :rtype: bool
+        """
+        return self._thread.is_alive()
+
+    def close(self, timeout=None):
+        """ Write the remaining records and stop the listener
+
+            :type timeout: float | None
+            :param timeout: Max time to wait for the listener to finish
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True  # no more records: they would come after the stop marker
+        if not self._thread.is_alive():
+            return
+        self._queue.put(self._STOP)  # blocking: the stop marker should not be dropped
+        self._thread.join(timeout)
+
+    def _listen(self):
+        """ Listener thread: writes batches until stopped """
+        stop = False
+        while not stop:
+            # Wait for the first record, then grab whatever is available
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+
+            # Stop marker
+            if self._STOP in batch:
+                batch.remove(self._STOP)
+                stop = True
+
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        """ Write a batch of records to the logger
+
+            :type batch: list[dict]
+        """
+        try:
+            self.logger.log(self.level, '\n'.join(json.dumps(record, sort_keys=True) for record in batch))
+        except Exception:
+            # The listener should survive any failures; the records are counted as dropped
+            with self._lock:
+                self.dropped += len(batch)
+        else:
+            self.written += len(batch)
+            self.batches += 1
@@ -0,0 +1,125 @@
+""" Message id generators
+
+    Providers that make up their own message ids use a generator: a callable that returns a new unique int.
+    Pick one with the `msgid_generator` provider option, e.g. for the bundled providers:
+
+        gw.add_provider('null', NullProvider, msgid_generator=SnowflakeIdGenerator(node=3))
+"""
+import os
+import threading
+from itertools import count
+from time import time
+
+
+class CounterIdGenerator(object):
+    """ Sequential ids: 1, 2, 3, ...
+
+        Thread-safe without locks: `itertools.count` is atomic.
+        Unique within a process only.
+    """
+
+    def __init__(self, start=1):
+        self._counter = count(start)
+
+    def __call__(self):
+        return next(self._counter)
+
+
+class SnowflakeIdGenerator(object):
+    """ Time-ordered, node-unique 64-bit ids
+
+        Layout: 41 bits of milliseconds since `epoch`, 10 bits of node id, 12 bits of sequence.
+        Gives 4096 ids per millisecond per node; when they're used up, the next millisecond is borrowed,
+        so the ids keep coming and stay ordered. They're also ordered when the system clock goes back.
+
+        The (milliseconds, sequence) pair comes from an `itertools.count`, which is atomic:
+        the lock is only taken when the clock moves past it, at most once per millisecond.
+
+        Every process that generates ids has to have a unique node id: 0..1023.
+        When not given, it's taken from the SMSFRAMEWORK_NODE_ID environment variable,
+        or else from the process id: that is only unique among the processes of a single host,
+        and is derived again in forked child processes.
+
+        Ids may repeat when a process restarts with the same node id, and its predecessor has borrowed
+        more milliseconds than the restart took, or the clock was set back.
+    """
+
+    #: Default epoch: 2020-01-01, unix milliseconds
+    EPOCH = 1577836800000
+
+    NODE_BITS = 10
+    SEQUENCE_BITS = 12
+    MAX_NODE = (1 << NODE_BITS) - 1
+    MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+    #: When the counter is replaced, the new one starts at least this far ahead of the old one:
+    #: threads that have picked up the old counter but haven't advanced it yet won't collide with it
+    _MARGIN = 1024
+
+    def __init__(self, node=None, epoch=EPOCH):
+        """
+            :type node: int | None
+            :param node: Node id, 0..1023
+            :type epoch: int
+            :param epoch: Epoch, unix milliseconds
+        """
+        self.epoch = epoch
+        self._auto_node = node is None
+        self.node = self._default_node() if node is None else node
+        assert 0 <= self.node <= self.MAX_NODE, 'Node id out of range: {}'.format(self.node)
+        self._node_bits = self.node << self.SEQUENCE_BITS
+
+        # Counter of (milliseconds << SEQUENCE_BITS | sequence)
+        self._counter = count(self._now() << self.SEQUENCE_BITS)
+        self._lock = threading.Lock()
+
+        if self._auto_node and hasattr(os, 'register_at_fork'):  # Py3.7+
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    @classmethod
+    def _default_node(cls):
+        node = os.environ.get('SMSFRAMEWORK_NODE_ID')
+        return int(node) if node else os.getpid() & cls.MAX_NODE
+
+    def _after_fork(self):
+        self.node = self._default_node()
+        self._node_bits = self.node << self.SEQUENCE_BITS
+        self._lock = threading.Lock()
+
+    def _now(self):
+        """ Milliseconds since the epoch """
+        return int(time() * 1000) - self.epoch
+
+    def __call__(self):
+        v = next(self._counter)
+        now = self._now()
+        if now > v >> self.SEQUENCE_BITS:
+            v = self._catch_up(now)
+        return (v >> self.SEQUENCE_BITS << (self.NODE_BITS + self.SEQUENCE_BITS)) | self._node_bits | (v & self.MAX_SEQUENCE)
+
+    def _catch_up(self, now):
+        """ The clock has moved past the counter: start a new one at the current millisecond
+
+            :rtype: int
+            :returns: The next counter value
+        """
+        with self._lock:
+            v = next(self._counter)
+            if v >> self.SEQUENCE_BITS < now:  # not replaced by another thread yet
+                v = max(now << self.SEQUENCE_BITS, v + self._MARGIN)
+                self._counter = count(v + 1)
+            return v
+
+    def parse(self, msgid):
+        """ Decompose an id
+
+            :type msgid: int | str
+            :rtype: tuple
+            :returns: (unix time, seconds; node id; sequence)
+        """
+        msgid = int(msgid)
+        return (
+            ((msgid >> (self.NODE_BITS + self.SEQUENCE_BITS)) + self.epoch) / 1000.0,
+            (msgid >> self.SEQUENCE_BITS) & self.MAX_NODE,
+            msgid & self.MAX_SEQUENCE,
+        )
@@ -0,0 +1,92 @@
+from .http import Request, Response, receiver_routes, health_handler
+
+
+class WsgiReceiver(object):
+    """ Lightweight WSGI application that serves the receivers of all providers
+
+        This is a dependency-free alternative to the Flask blueprints:
+        every request is dispatched with a single dict lookup by path.
+
+        Providers are served under '/{prefix}/provider-name', using the routes from
+        :meth:`smsframework.IProvider.make_receiver_routes`.
+        Providers that don't implement it are skipped.
+
+        Create:
+            app = WsgiReceiver(gateway, '/sms')
+        Serve:
+            wsgiref.simple_server.make_server('', 8000, app).serve_forever()
+    """
+
+    def __init__(self, gateway, prefix='/', health_path=None):
+        """ Create the application
+
+            :type gateway: smsframework.Gateway
+            :param gateway: The gateway to serve the receivers for
+            :type prefix: str
+            :param prefix: URL prefix to hide the receivers under
+            :type health_path: str | None
+            :param health_path: Full path to serve the gateway health at, e.g. '/health'. See :func:`health_handler`
+        """
+        self.gateway = gateway
+        self.prefix = prefix
+        self.health_path = health_path
+
+        #: Routes: { full path: handler }
+        #: :type: dict
+        self.routes = {}
+        self.build()
+
+    def build(self):
+        """ (Re)build the routes: call it after the providers have changed
+
+            :rtype: WsgiReceiver
+        """
+        routes = receiver_routes(self.gateway, self.prefix)
+        if self.health_path is not None:
+            routes[self.health_path.rstrip('/')] = health_handler(self.gateway)
+        self.routes = routes  # swap
+        return self
+
+    def __call__(self, environ, start_response):
+        # Route
+        handler = self.routes.get(environ.get('PATH_INFO', '').rstrip('/'))
+        if handler is None:
+            response = Response(b'Not Found', 404, [('Content-Type', 'text/plain')])
+        else:
+            response = handler(self.make_request(environ))
+
+        # Respond
+        start_response(response.status_line, response.headers + [('Content-Length', str(len(response.body)))])
+        return [response.body]
+
+    @staticmethod
+    def make_request(environ):
+        """ Convert WSGI environ into a Request
+
+            :type environ: dict
+            :rtype: smsframework.lib.http.Request
+        """
+        # Headers
+        headers = {
+            key[5:].replace('_', '-').title(): value
+            for key, value in environ.items()
+            if key.startswith('HTTP_')
+        }
+        if environ.get('CONTENT_TYPE'):
+            headers['Content-Type'] = environ['CONTENT_TYPE']
+
+        # Body
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        body = environ['wsgi.input'].read(length) if length > 0 else b''
+
+        # Finish
+        return Request(
+            environ.get('REQUEST_METHOD', 'GET'),
+            environ.get('PATH_INFO', ''),
+            environ.get('QUERY_STRING', '').encode('latin-1'),
+            headers,
+            body
+        )
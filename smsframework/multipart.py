@@ -0,0 +1,171 @@
+import logging
+import threading
+from collections import OrderedDict
+from time import time
+
+from .data import IncomingMessage
+from .lib.events import EventHook
+
+logger = logging.getLogger(__name__)
+
+
+class _PartSet(object):
+    """ Parts of a message being reassembled """
+
+    __slots__ = ('first', 'total', 'parts')
+
+    def __init__(self, first, total):
+        self.first = first  # arrival time of the first part
+        self.total = total
+        self.parts = {}  # { part number: IncomingMessage }
+
+
+class MultipartReassembler(object):
+    """ Reassembles multipart (concatenated) incoming messages
+
+        Long messages arrive as several parts, each one carrying the concatenation info
+        from the User Data Header in `message.meta`:
+
+        * 'concat_ref': reference number, shared by all parts of a message
+        * 'concat_parts': total number of parts
+        * 'concat_part': part number, 1-based
+
+        The parts are kept until all of them arrive, and then are combined into a single `IncomingMessage`:
+        its body is the concatenated bodies, the other fields are taken from the first part.
+        `meta['concat_msgids']` lists the msgids of the parts. Messages without the concatenation info pass through.
+
+        Use it with the Gateway: `onReceive` is then only fired for complete messages:
+
+            gw.reassembly = MultipartReassembler(timeout=60, max_sets=10000)
+
+        Memory is bounded even when parts are lost: incomplete messages are dropped after `timeout` seconds,
+        and the oldest ones are dropped when there are more than `max_sets` of them.
+        Dropped parts are reported with the `onDrop(parts)` event; its errors are logged.
+        Counters: `combined`, `expired`, `evicted`.
+    """
+
+    #: Max number of parts: the reference number is 8 or 16 bits, but the number of parts is always 8 bits
+    MAX_PARTS = 255
+
+    def __init__(self, timeout=60, max_sets=10000):
+        """
+            :type timeout: float
+            :param timeout: Max time to wait for the missing parts, seconds
+            :type max_sets: int
+            :param max_sets: Max number of incomplete messages kept
+        """
+        self.timeout = timeout
+        self.max_sets = max_sets
+
+        #: Incomplete messages dropped: handler(parts), the list of received parts ordered by part number
+        self.onDrop = EventHook()
+
+        #: Counters
+        self.combined = 0
+        self.expired = 0
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        # Incomplete messages, oldest first: { (provider, src, ref): _PartSet }
+        self._sets = OrderedDict()
+
+    def __len__(self):
+        """ Get the number of incomplete messages """
+        return len(self._sets)
+
+    def __call__(self, message):
+        """ Add a received message
+
+            :type message: IncomingMessage
+            :param message: The message, with `provider` set
+            :rtype: IncomingMessage | None
+            :returns: The message to handle: the message itself when it's not a part,
+                the combined message when it was the last missing part, or None
+        """
+        try:
+            ref = message.meta['concat_ref']
+            total = int(message.meta['concat_parts'])
+            number = int(message.meta['concat_part'])
+        except (KeyError, TypeError, ValueError):
+            return message
+        if total == 1 or not 1 <= number <= total <= self.MAX_PARTS:
+            return message  # a single part, or invalid
+
+        now = time()
+        dropped = []
+        key = (message.provider, message.src, ref)
+        with self._lock:
+            dropped.extend(self._expire(now))
+
+            parts = self._sets.get(key)
+            if parts is None or parts.total != total:
+                if parts is not None:  # the reference was reused: the old message is incomplete
+                    dropped.append(self._sets.pop(key))
+                    self.evicted += 1
+                parts = self._sets[key] = _PartSet(now, total)
+                while len(self._sets) > self.max_sets:
+                    dropped.append(self._sets.popitem(last=False)[1])
+                    self.evicted += 1
+
+            parts.parts[number] = message  # a repeated part replaces the previous one
+            complete = len(parts.parts) == total
+            if complete:
+                del self._sets[key]
+                self.combined += 1
+
+        for part_set in dropped:
+            self._drop(part_set)
+
+        return self._combine(parts) if complete else None
+
+    def expire(self):
+        """ Drop the incomplete messages that have timed out
+
+            This is done whenever a part is added. Call it periodically if there may be no traffic for long
+        """
+        with self._lock:
+            dropped = self._expire(time())
+        for part_set in dropped:
+            self._drop(part_set)
+
+    def _expire(self, now):
+        """ Remove the timed out sets. Call with the lock held
+
+            :rtype: list[_PartSet]
+        """
+        dropped = []
+        while self._sets:
+            key, parts = next(iter(self._sets.items()))
+            if parts.first + self.timeout > now:
+                break
+            del self._sets[key]
+            dropped.append(parts)
+            self.expired += 1
+        return dropped
+
+    def _drop(self, part_set):
+        """ Report the parts of an incomplete message """
+        parts = [part_set.parts[n] for n in sorted(part_set.parts)]
+        logger.warning('Dropped incomplete multipart message from {}: {} of {} parts'.format(
+            parts[0].src, len(parts), part_set.total))
+        try:
+            self.onDrop(parts)
+        except Exception:
+            logger.exception('onDrop handler has failed')  # the part being received is fine: don't fail it
+
+    def _combine(self, part_set):
+        """ Combine the parts into a single message
+
+            :rtype: IncomingMessage
+        """
+        parts = [part_set.parts[n] for n in range(1, part_set.total + 1)]
+        first = parts[0]
+
+        meta = dict(first.meta)
+        del meta['concat_part']
+        meta['concat_msgids'] = [part.msgid for part in parts]
+
+        message = IncomingMessage(first.src, ''.join(part.body for part in parts),
+                                  msgid=first.msgid, dst=first.dst, rtime=first.rtime, meta=meta)
+        message.provider = first.provider
+        return message
@@ -1,6 +1,28 @@
 """ Bundled providers """
 
+import sys
+
 from .null import NullProvider
 from .log import LogProvider
 from .loopback import LoopbackProvider
-from .forward import ForwardClientProvider, ForwardServerProvider
+from .pool import PoolProvider
+from .registry import register_provider, get_provider_class
+
+#: Providers imported on first access: { name: module }
+_lazy = {
+    'ForwardClientProvider': '.forward',
+    'ForwardServerProvider': '.forward',
+}
+
+
+def __getattr__(name):
+    """ Import optional providers on first access (Python 3.7+) """
+    if name not in _lazy:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    from importlib import import_module
+    value = getattr(import_module(_lazy[name], __name__), name)
+    globals()[name] = value  # cache
+    return value
+
+if sys.version_info < (3, 7):  # no module __getattr__: import eagerly
+    from .forward import ForwardClientProvider, ForwardServerProvider
@@ -2,6 +2,11 @@ from datetime import date, datetime, time
 from json import JSONDecoder, JSONEncoder
 import inspect
 
+try:  # Py3
+    from inspect import getfullargspec as getargspec
+except ImportError:  # Py2
+    from inspect import getargspec
+
 
 class JsonExEncoder(JSONEncoder):
     """ JsonEx encoder, which can marshall objects and exceptions """
@@ -79,7 +84,7 @@ class JsonExDecoder(JSONDecoder):
                         o = C()
                     else:
                         # Classes with a constructor
-                        argspec = inspect.getargspec(C.__init__)
+                        argspec = getargspec(C.__init__)
 
                         # Arguments should be named after properties
                         args = [props.pop(a) for a in argspec.args[1:]]  # (self, (....))
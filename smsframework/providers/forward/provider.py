@@ -1,5 +1,7 @@
-import json, base64
+import json, base64, socket
 from functools import wraps
+from time import time
+import threading
 import logging
 
 
@@ -11,12 +13,14 @@ except ImportError: # Py2
     from urlparse import urlsplit, urlunsplit
 
 from smsframework import IProvider, exc
+from smsframework.lib.http import Response
 from .jsonex import JsonExEncoder, JsonExDecoder
+from .subscriptions import SubscriptionIndex
 
 logger = logging.getLogger(__name__)
 
-try: from asynctools.threading import Parallel
-except ImportError: Parallel = None
+try: from concurrent.futures import ThreadPoolExecutor, wait as futures_wait
+except ImportError: ThreadPoolExecutor = None  # Py2 without `futures`
 
 
 #region JsonEx
@@ -32,15 +36,10 @@ classes = {C.__name__: C for C in (
 )}
 
 exceptions = {E.__name__: E for E in (
-    ProviderError, ConnectionError,
-    MessageSendError, RequestError, UnsupportedError, ServerError, AuthError, LimitsError, CreditError
+    ProviderError, ConnectionError, ForwardError,
+    MessageSendError, RequestError, UnsupportedError, ServerError, AuthError, LimitsError, CreditError, DeadlineError
 )}
 
-try:
-    from flask import make_response
-    from werkzeug.exceptions import HTTPException
-except ImportError: pass
-
 def jsonex_dumps(data):
     """ Serialize with JsonEx
     :rtype: basestring
@@ -57,6 +56,9 @@ def jsonex_loads(s):
 
 def jsonex_api(f):
     """ View wrapper for JsonEx responses. Catches exceptions as well """
+    from flask import make_response  # local import as the user is not required to use Flask at all
+    from werkzeug.exceptions import HTTPException
+
     @wraps(f)
     def wrapper(*args, **kwargs):
         # Call, catch exceptions
@@ -75,6 +77,30 @@ def jsonex_api(f):
     return wrapper
 
 
+def jsonex_handler(f):
+    """ Receiver route wrapper for JsonEx requests & responses. Catches exceptions as well
+
+    The wrapped function gets the unserialized request body and returns the response data.
+    See :meth:`smsframework.IProvider.make_receiver_routes`
+    """
+    @wraps(f)
+    def wrapper(request):
+        # Call, catch exceptions
+        try:
+            code, res = 200, f(jsonex_loads(request.get_data()))
+        except Exception as e:
+            logger.exception('Method error')
+            return error_response(e)
+
+        # Response
+        return Response(jsonex_dumps(res), code, [('Content-Type', 'application/json')])
+
+    def error_response(e):
+        return Response(jsonex_dumps({'error': e}), 500, [('Content-Type', 'application/json')])
+    wrapper.error_response = error_response
+    return wrapper
+
+
 def _parse_authentication(url):
     """ Parse authentication data from the URL and put it in the `headers` dict. With caching behavior
     :param url: URL
@@ -104,12 +130,14 @@ def _parse_authentication(url):
 _parse_authentication._memoize = {}
 
 
-def jsonex_request(url, data, headers=None):
+def jsonex_request(url, data, headers=None, timeout=None):
     """ Make a request with JsonEx
     :param url: URL
     :type url: str
     :param data: Data to POST
     :type data: dict
+    :param timeout: Socket timeout, seconds
+    :type timeout: float | None
     :return: Response
     :rtype: dict
     :raises exc.ConnectionError: Connection error
@@ -123,7 +151,8 @@ def jsonex_request(url, data, headers=None):
     # Request
     try:
         req = Request(url, headers=headers)
-        response = urlopen(req, jsonex_dumps(data))
+        kwargs = {} if timeout is None else {'timeout': timeout}  # urlopen() has no "no timeout" value
+        response = urlopen(req, jsonex_dumps(data), **kwargs)
         res_str = response.read()
         res = jsonex_loads(res_str)
     except HTTPError as e:
@@ -133,6 +162,8 @@ def jsonex_request(url, data, headers=None):
             raise exc.ServerError('Server at "{}" failed: {}'.format(url, e))
     except URLError as e:
         raise exc.ConnectionError('Connection to "{}" failed: {}'.format(url, e))
+    except socket.timeout as e:
+        raise exc.ConnectionError('Connection to "{}" timed out: {}'.format(url, e))
 
     # Errors?
     if 'error' in res:  # Exception object
@@ -150,13 +181,16 @@ class ForwardClientProvider(IProvider):
         - Receives messages from a remote ForwardServerProvider
     """
 
-    def __init__(self, gateway, name, server_url):
+    def __init__(self, gateway, name, server_url, timeout=30):
         """ Init the forwarding client
         :param server_url: Server URL.
             The URL should point to ForwardServerProvider registered on the server
         :type server_url: str
+        :param timeout: Request timeout, seconds, for messages that have no deadline. None for no timeout
+        :type timeout: float | None
         """
         self.server_url = server_url.rstrip('/') + '/'  # ensure trailing slash
+        self.timeout = timeout
         super(ForwardClientProvider, self).__init__(gateway, name)
 
     def send(self, message):
@@ -167,7 +201,12 @@ class ForwardClientProvider(IProvider):
         :raise Exception: any exception reported by the other side
         :raise urllib2.URLError: Connection error
         """
-        res = jsonex_request(self.server_url + '/im'.lstrip('/'), {'message': message})
+        # Timeout: the server gets the remaining time budget, as clocks may differ
+        timeout = message.time_left(self.timeout)
+        if timeout is not None and timeout <= 0:
+            raise exc.DeadlineError('Sending deadline exceeded')
+
+        res = jsonex_request(self.server_url + '/im'.lstrip('/'), {'message': message, 'timeout': timeout}, timeout=timeout)
         msg = res['message']  # OutgoingMessage object
 
         # Replace properties in the original object (so it's the same object, like with other providers)
@@ -182,15 +221,22 @@ class ForwardClientProvider(IProvider):
         from .receiver_client import bp
         return bp
 
+    def make_receiver_routes(self):
+        """ Create the lightweight receiver so server can send messages to us
+        :rtype: dict
+        """
+        return {
+            '/im': jsonex_handler(lambda req: {'message': self._receive_message(req['message'])}),
+            '/status': jsonex_handler(lambda req: {'status': self._receive_status(req['status'])}),
+        }
+
     def _receive_message(self, message):
         # Overriden method to preserve the original provider name
-        self.gateway.onReceive(message)
-        return message
+        return self._deliver_message(message)
 
     def _receive_status(self, status):
         # Overriden method to preserve the original provider name
-        self.gateway.onStatus(status)
-        return status
+        return self._deliver_status(status)
 
 
 class ForwardServerProvider(IProvider):
@@ -200,62 +246,256 @@ class ForwardServerProvider(IProvider):
         - Forwards all received messages and statuses to clients
         - Receives messages from clients and sends them through the gateway
     """
-    def __init__(self, gateway, name, clients):
+    def __init__(self, gateway, name, clients, subscriptions=None, max_workers=16, client_concurrency=4, timeout=30):
         """ Init server
         :param clients: List of client URLs to forward the messages to.
             The URL should point to ForwardClientProvider registered on the client
         :type clients: list[str]
+        :param subscriptions: Client subscriptions: { client URL: { 'prefixes': [...], 'keywords': [...], 'providers': [...] } }.
+            When given, objects are only forwarded to matching clients. See :class:`SubscriptionIndex`
+        :type subscriptions: dict | None
+        :param max_workers: Max number of threads forwarding objects to clients in parallel
+        :type max_workers: int
+        :param client_concurrency: Max number of concurrent requests to a single client
+        :type client_concurrency: int
+        :param timeout: Forwarding timeout, seconds: covers both waiting for a busy client and the request itself
+        :type timeout: float
         """
-        self.clients = clients
+        self._clients = list(clients)
+        self.max_workers = max_workers
+        self.client_concurrency = client_concurrency
+        self.timeout = timeout
         super(ForwardServerProvider, self).__init__(gateway, name)
 
+        #: Fan-out executor, created on first use
+        self._executor = None
+        #: Per-client concurrency limits: { client: number of requests in progress }
+        self._busy = {}
+        self._slots = threading.Condition()
+        self._lock = threading.Lock()
+
+        #: Subscription index, if subscriptions are used
+        #: :type: SubscriptionIndex | None
+        self.subscriptions = SubscriptionIndex(self._clients, subscriptions) if subscriptions is not None else None
+
         # Hook into the gateway
-        self.gateway.onReceive += self.forward
-        self.gateway.onStatus += self.forward
+        self._hooked = False
+        self._hook(True)
+
+    @property
+    def clients(self):
+        """ Client URLs. Change them with :meth:`add_client`, :meth:`remove_client`, or assign a new list
+        :rtype: tuple[str]
+        """
+        return tuple(self._clients)
+
+    @clients.setter
+    def clients(self, clients):
+        self._clients = list(clients)
+        if self.subscriptions is not None:
+            self.subscriptions.set_clients(self._clients)
+
+    def add_client(self, client):
+        """ Add a client: it receives everything, unless it subscribes. See :meth:`subscribe`
+        :param client: Client URL
+        :type client: str
+        :rtype: ForwardServerProvider
+        """
+        if client not in self._clients:
+            self.clients = self._clients + [client]
+        return self
+
+    def remove_client(self, client):
+        """ Remove a client, and its subscriptions
+        :param client: Client URL
+        :type client: str
+        :rtype: ForwardServerProvider
+        """
+        self.clients = [c for c in self._clients if c != client]
+        return self
+
+    def subscribe(self, client, prefixes=(), keywords=(), providers=()):
+        """ Subscribe a client to some objects only. See :meth:`SubscriptionIndex.subscribe`
+
+        :param client: Client URL. Unknown clients are added
+        :type client: str
+        :rtype: ForwardServerProvider
+        """
+        self.add_client(client)
+        if self.subscriptions is None:
+            self.subscriptions = SubscriptionIndex(self._clients)
+        self.subscriptions.subscribe(client, prefixes, keywords, providers)
+        return self
 
     def choose_clients(self, obj):
         """ Given a message, decides which clients will receive it.
 
-        Override to have custom routing. Default: send to all clients
+        Override to have custom routing. Default: send to subscribed clients, or to all clients if there are no subscriptions
 
         :param obj: The object to be forwarded
         :type obj: smsframework.data.IncomingMessage|smsframework.data.MessageStatus
         :return: List of client URLs to forward the message to
         :rtype: list[str]
         """
-        return self.clients
+        if self.subscriptions is None:
+            return list(self._clients)
+        return list(self.subscriptions.match(obj))
 
-    def _forward_object_to_client(self, client, obj):
+    def _forward_object_to_client(self, client, obj, timeout=None):
         """ Forward an object to client
         :type client: str
         :type obj: smsframework.data.IncomingMessage|smsframework.data.MessageStatus
+        :param timeout: Request timeout, seconds
+        :type timeout: float | None
         :rtype: smsframework.data.IncomingMessage|smsframework.data.MessageStatus
         :raise Exception: any exception reported by the other side
         """
         url, name = ('/im', 'message') if isinstance(obj, IncomingMessage) else ('/status', 'status')
-        res = jsonex_request(client.rstrip('/') + '/' + url.lstrip('/'), {name: obj})
+        res = jsonex_request(client.rstrip('/') + '/' + url.lstrip('/'), {name: obj}, timeout=timeout)
         return res[name]
 
+    def _get_executor(self):
+        """ Get the fan-out executor
+        :rtype: concurrent.futures.ThreadPoolExecutor
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers)
+        return self._executor
+
+    def _acquire(self, client, deadline):
+        """ Take a request slot of the client, waiting for one till the deadline
+        :type client: str
+        :param deadline: Time to give up at. Past: don't wait
+        :type deadline: float
+        :rtype: bool
+        """
+        with self._slots:
+            while self._busy.get(client, 0) >= self.client_concurrency:
+                left = deadline - time()
+                if left <= 0:
+                    return False
+                self._slots.wait(left)
+            self._busy[client] = self._busy.get(client, 0) + 1
+            return True
+
+    def _release(self, client):
+        """ Give a request slot of the client back """
+        with self._slots:
+            self._busy[client] -= 1
+            if not self._busy[client]:
+                del self._busy[client]
+            self._slots.notify_all()
+
+    def _forward_acquired(self, client, obj, deadline):
+        """ Forward an object to client with a slot taken, and release it
+        :type client: str
+        :type obj: smsframework.data.IncomingMessage|smsframework.data.MessageStatus
+        :param deadline: Time by which forwarding should finish
+        :type deadline: float
+        """
+        try:
+            return self._forward_object_to_client(client, obj, timeout=max(0.001, deadline - time()))
+        finally:
+            self._release(client)
+
     def forward(self, obj):
         """ Forward an object to clients.
 
+        Clients are handled in parallel by the provider's thread pool.
+        All clients are tried, even if some of them fail.
+
         :param obj: The object to be forwarded
         :type obj: smsframework.data.IncomingMessage|smsframework.data.MessageStatus
-        :raises Exception: if any of the clients failed
+        :raises exc.ForwardError: if any of the clients failed. See `ForwardError.errors`
         """
         assert isinstance(obj, (IncomingMessage, MessageStatus)), 'Tried to forward an object of an unsupported type: {}'.format(obj)
         clients = self.choose_clients(obj)
+        deadline = time() + self.timeout
+        errors = {}
 
-        if Parallel:
-            pll = Parallel(self._forward_object_to_client)
+        if ThreadPoolExecutor is None or len(clients) <= 1:
+            # Sequentially: no need for a thread
             for client in clients:
-                pll(client, obj)
-            results, errors = pll.join()
-            if errors:
-                raise errors[0]
+                if not self._acquire(client, deadline):
+                    errors[client] = exc.LimitsError('Client "{}" is busy'.format(client))
+                    continue
+                try:
+                    self._forward_acquired(client, obj, deadline)
+                except Exception as e:
+                    errors[client] = e
         else:
+            # Parallel. Slots are taken here, before submitting: the workers never wait for a busy client
+            executor = self._get_executor()
+            futures = {}
+            busy = []
             for client in clients:
-                self._forward_object_to_client(client, obj)
+                if self._acquire(client, 0):
+                    futures[executor.submit(self._forward_acquired, client, obj, deadline)] = client
+                else:
+                    busy.append(client)
+            for client in busy:  # the free ones are in progress already
+                if self._acquire(client, deadline):
+                    futures[executor.submit(self._forward_acquired, client, obj, deadline)] = client
+                else:
+                    errors[client] = exc.LimitsError('Client "{}" is busy'.format(client))
+            done, not_done = futures_wait(futures, max(0, deadline - time()))
+
+            for future in not_done:
+                if future.cancel():
+                    self._release(futures[future])  # never started
+                errors[futures[future]] = exc.ConnectionError('Forwarding to "{}" timed out'.format(futures[future]))
+            for future in done:
+                if future.exception() is not None:
+                    errors[futures[future]] = future.exception()
+
+        if errors:
+            raise exc.ForwardError(
+                'Forwarding failed for {} of {} clients: {}'.format(len(errors), len(clients), ', '.join(
+                    '{!r}'.format(e) for e in errors.values()
+                )),
+                errors
+            )
+
+    def _hook(self, on):
+        """ Subscribe to the gateway events, or unsubscribe """
+        with self._lock:
+            if self._hooked == on:
+                return
+            self._hooked = on
+            if on:
+                self.gateway.onReceive += self.forward
+                self.gateway.onStatus += self.forward
+            else:
+                self.gateway.onReceive -= self.forward
+                self.gateway.onStatus -= self.forward
+
+    def open(self):
+        """ Start forwarding: hook into the gateway, start the fan-out threads """
+        self._hook(True)
+        self._get_executor()
+
+    def close(self):
+        """ Stop forwarding: unhook from the gateway, stop the fan-out threads
+
+            A provider retired by `ConfigGateway.reload()` no longer forwards the gateway's objects.
+        """
+        self._hook(False)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _send_forwarded(self, req):
+        """ Send a message forwarded by a client
+        :param req: The request: { message: OutgoingMessage, timeout: float | None }
+        :type req: dict
+        :rtype: data.OutgoingMessage
+        """
+        message = req['message']
+        if req.get('timeout') is not None:
+            message.options(deadline=time() + req['timeout'])  # the client's remaining budget
+        return self.send(message)
 
     def send(self, message):
         """ Send a message by looping back to gateway so it sends with some other provider
@@ -272,3 +512,11 @@ class ForwardServerProvider(IProvider):
         """
         from .receiver_server import bp
         return bp
+
+    def make_receiver_routes(self):
+        """ Create the lightweight receiver: it gets messages from clients and sends them
+        :rtype: dict
+        """
+        return {
+            '/im': jsonex_handler(lambda req: {'message': self._send_forwarded(req)}),
+        }
@@ -11,5 +11,5 @@ bp = Blueprint('smsframework-forward-server', __name__, url_prefix='/')
 def im():
     """ Incoming message handler: sent by ForwardClientProvider """
     req = jsonex_loads(request.get_data())
-    message = g.provider.send(req['message'])
+    message = g.provider._send_forwarded(req)
     return {'message': message}
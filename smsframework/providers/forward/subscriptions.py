@@ -0,0 +1,149 @@
+from collections import namedtuple
+
+from smsframework.lib import digits_only
+from smsframework.data import IncomingMessage
+
+
+#: Compiled subscriptions: immutable, swapped as a whole on every change
+_Index = namedtuple('_Index', ('lengths', 'prefixes', 'keywords', 'providers', 'catchall', 'all_statuses'))
+
+
+class SubscriptionIndex(object):
+    """ Subscription index: decides which clients receive an object forwarded by :class:`ForwardServerProvider`
+
+        Clients subscribe to:
+
+        * `prefixes`: destination number prefixes of incoming messages (e.g. short codes)
+        * `keywords`: the first word of incoming messages, case-insensitive
+        * `providers`: names of providers the messages and statuses were received with
+
+        Clients with no subscriptions receive everything.
+        Status reports have no number and no text: they're matched by provider only,
+        so clients that have no `providers` subscriptions receive all of them.
+
+        Lookups are hash-based: one dict lookup per distinct prefix length, plus one for the keyword and the provider.
+    """
+
+    def __init__(self, clients, subscriptions=None):
+        """ Build the index
+
+            :type clients: collections.Iterable[str]
+            :param clients: All client URLs. Change them with :meth:`set_clients`
+            :type subscriptions: dict | None
+            :param subscriptions: Subscriptions: { client URL: { 'prefixes': [...], 'keywords': [...], 'providers': [...] } }
+        """
+        #: Client URLs
+        #: :type: tuple[str]
+        self.clients = tuple(clients)
+
+        #: Subscriptions: { client: (prefixes, keywords, providers) }
+        #: :type: dict[str, tuple[set, set, set]]
+        self._subscriptions = {}
+
+        for client, subscription in (subscriptions or {}).items():
+            self.subscribe(client, **subscription)
+        self._compile()
+
+    def subscribe(self, client, prefixes=(), keywords=(), providers=()):
+        """ Add subscriptions for a client
+
+            :type client: str
+            :param client: Client URL. Unknown clients are added.
+            :type prefixes: collections.Iterable[str]
+            :param prefixes: Destination number prefixes. Non-digit chars are cut off
+            :type keywords: collections.Iterable[str]
+            :param keywords: Message keywords
+            :type providers: collections.Iterable[str]
+            :param providers: Provider names
+            :rtype: SubscriptionIndex
+        """
+        if client not in self.clients:
+            self.clients += (client,)
+
+        p, k, n = self._subscriptions.setdefault(client, (set(), set(), set()))
+        p.update(digits_only(prefix) for prefix in prefixes)
+        k.update(keyword.upper() for keyword in keywords)
+        n.update(providers)
+
+        self._compile()
+        return self
+
+    def unsubscribe(self, client):
+        """ Remove all subscriptions of a client: it will receive everything
+
+            :type client: str
+            :param client: Client URL
+            :rtype: SubscriptionIndex
+        """
+        self._subscriptions.pop(client, None)
+        self._compile()
+        return self
+
+    def set_clients(self, clients):
+        """ Replace the client URLs. Subscriptions of the removed clients are dropped
+
+            :type clients: collections.Iterable[str]
+            :rtype: SubscriptionIndex
+        """
+        self.clients = tuple(clients)
+        for client in set(self._subscriptions) - set(self.clients):
+            del self._subscriptions[client]
+        self._compile()
+        return self
+
+    def _compile(self):
+        """ Build the lookup tables and swap them in """
+        prefixes, keywords, providers = {}, {}, {}
+        for client, (p, k, n) in self._subscriptions.items():
+            for prefix in p:
+                prefixes.setdefault(len(prefix), {}).setdefault(prefix, set()).add(client)
+            for keyword in k:
+                keywords.setdefault(keyword, set()).add(client)
+            for name in n:
+                providers.setdefault(name, set()).add(client)
+
+        catchall = frozenset(c for c in self.clients if c not in self._subscriptions)
+        self._index = _Index(
+            lengths=tuple(sorted(prefixes)),
+            prefixes={n: {prefix: frozenset(c) for prefix, c in t.items()} for n, t in prefixes.items()},
+            keywords={keyword: frozenset(c) for keyword, c in keywords.items()},
+            providers={name: frozenset(c) for name, c in providers.items()},
+            catchall=catchall,
+            all_statuses=catchall | frozenset(c for c, (p, k, n) in self._subscriptions.items() if not n),
+        )
+
+    def match(self, obj):
+        """ Get the clients that should receive the object
+
+            :type obj: smsframework.data.IncomingMessage|smsframework.data.MessageStatus
+            :param obj: The object to be forwarded
+            :rtype: set[str]
+        """
+        index = self._index  # snapshot: safe against concurrent changes
+        matched = set(index.catchall)
+
+        # Provider
+        if obj.provider in index.providers:
+            matched |= index.providers[obj.provider]
+
+        # Status reports: no more criteria
+        if not isinstance(obj, IncomingMessage):
+            matched |= index.all_statuses
+            return matched
+
+        # Prefix
+        dst = obj.dst or ''
+        for n in index.lengths:
+            if n > len(dst):
+                break
+            clients = index.prefixes[n].get(dst[:n])
+            if clients:
+                matched |= clients
+
+        # Keyword
+        if index.keywords and obj.body:
+            words = obj.body.split(None, 1)
+            if words and words[0].upper() in index.keywords:
+                matched |= index.keywords[words[0].upper()]
+
+        return matched
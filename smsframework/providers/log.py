@@ -10,25 +10,61 @@ class LogProvider(NullProvider):
 
         Configuration: target logger
 
-        Sending: does nothing, increments message.msgid, prints the message to the log
+        Sending: does nothing, populates message.msgid, prints the message to the log
 
         Receipt: Not implemented
 
         Status: Not implemented
     """
 
-    def __init__(self, gateway, name, logger=None):
+    def __init__(self, gateway, name, logger=None, nonblocking=False, queue_size=10000, batch_size=100,
+                 msgid_generator=None):
         """ Configure provider
 
             :type logger: logging.Logger | None
             :param logger: The logger to use. Default logger is used if nothing provided
+            :type nonblocking: bool
+            :param nonblocking: Write to the log from a background thread.
+                In this mode, messages are logged in batches of JSON lines: {dst, provider, msgid, body_len},
+                and are dropped (and counted) when the queue overflows. See: :class:`smsframework.lib.logqueue.LogQueue`
+            :type queue_size: int
+            :param queue_size: Non-blocking mode: max number of messages waiting to be logged
+            :type batch_size: int
+            :param batch_size: Non-blocking mode: max number of messages logged with a single log record
+            :type msgid_generator: callable | None
+            :param msgid_generator: Message id generator, see :class:`NullProvider`
         """
-        super(LogProvider, self).__init__(gateway, name)
+        super(LogProvider, self).__init__(gateway, name, msgid_generator)
         self.logger = logger or logging.getLogger(__name__)
 
+        #: Non-blocking mode queue
+        #: :type: smsframework.lib.logqueue.LogQueue | None
+        self.queue = None
+        if nonblocking:
+            from ..lib.logqueue import LogQueue  # local import: it starts a thread & needs json
+            self.queue = LogQueue(self.logger, queue_size, batch_size)
+
     def send(self, message):
-        # Log
-        self.logger.info('Sent SMS to {message.dst}: {message.body}'.format(message=message))
+        # Blocking mode
+        if self.queue is None:
+            self.logger.info('Sent SMS to {message.dst}: {message.body}'.format(message=message))
+            return super(LogProvider, self).send(message)
+
+        # Non-blocking mode: log once the msgid is known
+        message = super(LogProvider, self).send(message)
+        self.queue.put({
+            'dst': message.dst,
+            'provider': self.name,
+            'msgid': message.msgid,
+            'body_len': len(message.body),
+        })
+        return message
+
+    def health_check(self):
+        """ Non-blocking mode: the background thread must be running """
+        return self.queue is None or self.queue.is_alive()
 
-        # Finish
-        return super(LogProvider, self).send(message)
+    def close(self):
+        """ Non-blocking mode: write the remaining messages and stop the background thread """
+        if self.queue is not None:
+            self.queue.close()
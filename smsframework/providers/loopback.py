@@ -8,7 +8,7 @@ class LoopbackProvider(NullProvider):
 
         Sends messages to registered subscriber callbacks.
 
-        Configuration: none
+        Configuration: `msgid_generator`: message id generator, see :mod:`smsframework.lib.msgid`
 
         Sending: sends message to a registered subscriber (see: :meth:`LoopbackProvider.subscribe`),
             silently ignores other messages
@@ -18,8 +18,8 @@ class LoopbackProvider(NullProvider):
         Status: always reports success (if was requested for the message)
     """
 
-    def __init__(self, gateway, name):
-        super(LoopbackProvider, self).__init__(gateway, name)
+    def __init__(self, gateway, name, msgid_generator=None):
+        super(LoopbackProvider, self).__init__(gateway, name, msgid_generator)
 
         #: Virtual subscribers
         #: { Phone number : callable(message) }
@@ -53,8 +53,7 @@ class LoopbackProvider(NullProvider):
             :rtype: IncomingMessage
         """
         # Create the message
-        self._msgid += 1
-        message = IncomingMessage(src, body, self._msgid)
+        message = IncomingMessage(src, body, self.msgid_generator())
 
         # Log traffic
         self._traffic.append(message)
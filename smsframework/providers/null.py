@@ -1,23 +1,29 @@
 from ..IProvider import IProvider
+from ..lib.msgid import CounterIdGenerator
 
 
 class NullProvider(IProvider):
     """ Null Provider
 
-        Configuration: none
+        Configuration: `msgid_generator`: message id generator, see :mod:`smsframework.lib.msgid`
 
-        Sending: does nothing, but increments message.msgid
+        Sending: does nothing, but populates message.msgid
 
         Receipt: Not implemented
 
         Status: Not implemented
     """
 
-    def __init__(self, gateway, name):
+    def __init__(self, gateway, name, msgid_generator=None):
+        """ Configure provider
+
+            :type msgid_generator: callable | None
+            :param msgid_generator: Message id generator: a thread-safe callable that returns a unique int.
+                Default: sequential ids, unique within the provider
+        """
         super(NullProvider, self).__init__(gateway, name)
-        self._msgid = 0
+        self.msgid_generator = msgid_generator or CounterIdGenerator()
 
     def send(self, message):
-        self._msgid += 1
-        message.msgid = str(self._msgid)
+        message.msgid = str(self.msgid_generator())
         return message
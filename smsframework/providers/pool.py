@@ -0,0 +1,215 @@
+import random
+import threading
+from itertools import count
+from time import time
+
+from ..IProvider import IProvider
+from .. import exc
+
+
+class PoolMember(object):
+    """ A provider in the pool, with its balancing state """
+
+    def __init__(self, provider, weight=1):
+        #: The provider
+        #: :type: IProvider
+        self.provider = provider
+
+        #: Balancing weight
+        self.weight = weight
+
+        #: Number of messages being sent right now
+        self.outstanding = 0
+
+        #: Ejected till this time: not used by the pool
+        self.ejected_until = 0
+
+    @property
+    def ejected(self):
+        """ Is the member ejected from the pool?
+
+            :rtype: bool
+        """
+        return self.ejected_until > time()
+
+    def __repr__(self):
+        return '{cls}({provider!r}, weight={weight!r}, outstanding={outstanding!r}, ejected={ejected!r})'.format(
+            cls=self.__class__.__name__,
+            provider=self.provider,
+            weight=self.weight,
+            outstanding=self.outstanding,
+            ejected=self.ejected
+        )
+
+
+class PoolProvider(IProvider):
+    """ Pool Provider
+
+        Balances the messages between multiple providers, e.g. multiple accounts of the same service.
+        To the Gateway, routers and messages, the pool looks like a single provider.
+
+        Configuration: member providers, balancing strategy
+
+        Sending: with one of the members. Members that fail are ejected from the pool for a while.
+
+        Receipt: with the first member
+
+        Status: with the first member
+    """
+
+    #: Errors caused by the message itself: they do not eject the member
+    MESSAGE_ERRORS = (exc.RequestError, exc.UnsupportedError)
+
+    def __init__(self, gateway, name, members, strategy='round-robin', eject_time=30):
+        """ Configure provider
+
+            :type members: list[tuple]
+            :param members: Member providers: list of (Provider, config) or (Provider, config, weight) tuples.
+                `Provider` is a class or a registered provider name: just like with :meth:`Gateway.add_provider`.
+                Members share the name of the pool.
+            :type strategy: str
+            :param strategy: Balancing strategy:
+                'round-robin': members are used in turn;
+                'weighted': members are picked randomly, proportionally to their weight;
+                'least-outstanding': the member with the fewest messages being sent, relative to its weight.
+            :type eject_time: float
+            :param eject_time: How long a failed member stays out of the pool, seconds
+        """
+        super(PoolProvider, self).__init__(gateway, name)
+        assert members, 'The pool has no members'
+        assert strategy in self._strategies, 'Unknown balancing strategy: {}'.format(strategy)
+
+        self.strategy = strategy
+        self.eject_time = eject_time
+
+        #: Pool members
+        #: :type: list[PoolMember]
+        self.members = [self._make_member(*member) for member in members]
+
+        self._choose = getattr(self, self._strategies[strategy])
+        self._counter = count()
+        self._lock = threading.Lock()  # outstanding counters
+
+    def _make_member(self, Provider, config=None, weight=1):
+        """ Create a pool member
+
+            :rtype: PoolMember
+        """
+        if isinstance(Provider, str):
+            from .registry import get_provider_class
+            Provider = get_provider_class(Provider)
+        assert issubclass(Provider, IProvider), 'Provider does not implement IProvider'
+        assert weight > 0, 'Member weight should be positive'
+        return PoolMember(Provider(self.gateway, self.name, **(config or {})), weight)
+
+
+    #region Balancing
+
+    _strategies = {
+        'round-robin': '_choose_round_robin',
+        'weighted': '_choose_weighted',
+        'least-outstanding': '_choose_least_outstanding',
+    }
+
+    def _candidates(self):
+        """ Get the members that are not ejected. If all of them are, use all of them anyway
+
+            :rtype: list[PoolMember]
+        """
+        now = time()
+        return [m for m in self.members if m.ejected_until <= now] or self.members
+
+    def _choose_round_robin(self):
+        candidates = self._candidates()
+        return candidates[next(self._counter) % len(candidates)]
+
+    def _choose_weighted(self):
+        candidates = self._candidates()
+        point = random.random() * sum(m.weight for m in candidates)
+        for member in candidates:
+            point -= member.weight
+            if point < 0:
+                return member
+        return candidates[-1]
+
+    def _choose_least_outstanding(self):
+        candidates = self._candidates()
+        start = next(self._counter) % len(candidates)  # break ties in turn
+        candidates = candidates[start:] + candidates[:start]
+        return min(candidates, key=lambda m: float(m.outstanding) / m.weight)
+
+    def eject(self, member, eject_time=None):
+        """ Eject a member from the pool for a while
+
+            :type member: PoolMember
+            :type eject_time: float | None
+            :param eject_time: How long, seconds. Default: the configured `eject_time`
+        """
+        member.ejected_until = time() + (self.eject_time if eject_time is None else eject_time)
+
+    #endregion
+
+
+    def send(self, message):
+        member = self._choose()
+        with self._lock:
+            member.outstanding += 1
+
+        try:
+            message = member.provider.send(message)
+        except self.MESSAGE_ERRORS:
+            raise
+        except Exception:
+            self.eject(member)
+            raise
+        finally:
+            with self._lock:
+                member.outstanding -= 1
+
+        # Look like a single provider
+        message.provider = self.name
+        return message
+
+    def open(self):
+        errors = []
+        for member in self.members:
+            try:
+                member.provider.open()
+            except Exception as e:
+                errors.append(e)
+        if len(errors) == len(self.members):
+            raise errors[0]  # the pool can work as long as some members can
+
+    def health_check(self):
+        """ Healthy when any member is """
+        error = None
+        for member in self.members:
+            try:
+                if member.provider.health_check():
+                    return True
+            except Exception as e:
+                error = e
+        if error is not None:
+            raise error
+        return False
+
+    def close(self):
+        errors = []
+        for member in self.members:
+            try:
+                member.provider.close()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]  # the other members are closed anyway
+
+    def invalidate_cache(self):
+        super(PoolProvider, self).invalidate_cache()
+        for member in self.members:
+            member.provider.invalidate_cache()
+
+    def make_receiver_blueprint(self):
+        return self.members[0].provider.make_receiver_blueprint()
+
+    def make_receiver_routes(self):
+        return self.members[0].provider.make_receiver_routes()
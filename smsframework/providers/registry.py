@@ -0,0 +1,71 @@
+from importlib import import_module
+
+#: Provider names: { name: 'module:Class' | Provider }
+#: Resolved lazily: modules are only imported when the provider is used
+_registry = {
+    'null': 'smsframework.providers.null:NullProvider',
+    'log': 'smsframework.providers.log:LogProvider',
+    'loopback': 'smsframework.providers.loopback:LoopbackProvider',
+    'pool': 'smsframework.providers.pool:PoolProvider',
+    'forward-client': 'smsframework.providers.forward.provider:ForwardClientProvider',
+    'forward-server': 'smsframework.providers.forward.provider:ForwardServerProvider',
+}
+
+#: Entry point group third-party providers register themselves in
+ENTRY_POINT_GROUP = 'smsframework.providers'
+
+
+def register_provider(name, Provider):
+    """ Register a provider name, so it can be used with `Gateway.add_provider(name, 'provider-name')`
+
+        :type name: str
+        :param name: Provider name
+        :type Provider: type | str
+        :param Provider: Provider class, or a 'module:Class' string to import it lazily
+    """
+    _registry[name] = Provider
+
+
+def get_provider_class(name):
+    """ Get a provider class by its registered name
+
+        Names are looked up among the bundled & registered providers first,
+        then among the 'smsframework.providers' entry points of the installed packages:
+
+            entry_points={'smsframework.providers': ['clickatell = smsframework_clickatell:ClickatellProvider']}
+
+        :type name: str
+        :param name: Provider name
+        :rtype: type
+        :raises KeyError: unknown provider name
+    """
+    # Registered
+    if name not in _registry:
+        _registry[name] = _find_entry_point(name)
+    Provider = _registry[name]
+
+    # Import
+    if isinstance(Provider, str):
+        module, cls = Provider.split(':', 1)
+        Provider = _registry[name] = getattr(import_module(module), cls)
+    return Provider
+
+
+def _find_entry_point(name):
+    """ Find a provider among the entry points
+
+        :rtype: type
+        :raises KeyError: not found
+    """
+    try:  # Py3.8+
+        from importlib.metadata import entry_points
+        eps = entry_points()
+        eps = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, 'select') else eps.get(ENTRY_POINT_GROUP, ())
+    except ImportError:
+        from pkg_resources import iter_entry_points
+        eps = iter_entry_points(ENTRY_POINT_GROUP)
+
+    for ep in eps:
+        if ep.name == name:
+            return ep.load()
+    raise KeyError('Unknown provider: {}'.format(name))
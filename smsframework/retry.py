@@ -0,0 +1,141 @@
+import random
+import threading
+from collections import deque
+from time import time
+
+from . import exc
+
+
+class RetryBudget(object):
+    """ Retry budget: limits retries to a share of the requests, to prevent retry storms
+
+        Allows `min_per_second` retries per second, plus `ratio` retries per request,
+        both counted over a sliding window of `ttl` seconds.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=10, ttl=10):
+        """
+            :type ratio: float
+            :param ratio: Retries allowed per request
+            :type min_per_second: float
+            :param min_per_second: Retries allowed per second regardless of the number of requests
+            :type ttl: int
+            :param ttl: Window, seconds
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.ttl = ttl
+
+        #: Per-second buckets: deque([ [second, requests, retries] ])
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    def _bucket(self):
+        """ Get the current bucket, expire the old ones. Call with the lock held """
+        now = int(time())
+        while self._buckets and self._buckets[0][0] <= now - self.ttl:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0])
+        return self._buckets[-1]
+
+    def deposit(self):
+        """ Count a request """
+        with self._lock:
+            self._bucket()[1] += 1
+
+    def withdraw(self):
+        """ Try to spend the budget on a retry
+
+            :rtype: bool
+            :returns: False if the budget is exhausted
+        """
+        with self._lock:
+            bucket = self._bucket()
+            requests = sum(b[1] for b in self._buckets)
+            retries = sum(b[2] for b in self._buckets)
+            if retries >= self.min_per_second * self.ttl + self.ratio * requests:
+                return False
+            bucket[2] += 1
+            return True
+
+
+class RetryPolicy(object):
+    """ Retry policy: decides whether, when, and with which provider a failed message is retried
+
+        Set it for the whole gateway, or for some providers:
+
+            gw.retry_policy = RetryPolicy()
+            gw.get_provider('main').retry_policy = RetryPolicy(failover=['backup'])
+
+        Only transient errors are retried: see `retry_on`.
+        Delays grow exponentially, with full jitter: random(0, min(max_backoff, backoff * 2 ** attempt)).
+
+        :meth:`Gateway.send` sleeps between the attempts;
+        queued senders use :meth:`retry` to schedule the next attempt instead:
+        see :class:`smsframework.dispatcher.Dispatcher`.
+    """
+
+    #: Transient errors that are retried by default
+    RETRY_ON = (exc.ConnectionError, exc.ServerError, exc.LimitsError)
+
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30, retry_on=None, failover=None, budget=None):
+        """
+            :type max_attempts: int
+            :param max_attempts: Max number of attempts, including the first one
+            :type backoff: float
+            :param backoff: Base delay, seconds
+            :type max_backoff: float
+            :param max_backoff: Max delay, seconds
+            :type retry_on: tuple[type] | None
+            :param retry_on: Exception classes to retry on. Default: `RETRY_ON`
+            :type failover: list[str] | None
+            :param failover: Provider names to retry with, in turn. Default: retry with the same provider
+            :type budget: RetryBudget | None
+            :param budget: Retry budget. Default: a new `RetryBudget()`
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on or self.RETRY_ON
+        self.failover = failover or []
+        self.budget = budget or RetryBudget()
+
+    def delay(self, attempt):
+        """ Get the delay before the next attempt
+
+            :type attempt: int
+            :param attempt: The number of the failed attempt, 0-based
+            :rtype: float
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def retry(self, message, error, attempt):
+        """ Decide on retrying a failed message
+
+            :type message: smsframework.data.OutgoingMessage
+            :param message: The failed message. `message.provider` is the provider that has failed
+            :type error: Exception
+            :param error: The error
+            :type attempt: int
+            :param attempt: The number of the failed attempt, 0-based
+            :rtype: tuple | None
+            :returns: (delay, provider name) for the next attempt, or None to give up
+        """
+        # Give up?
+        if attempt + 1 >= self.max_attempts or not isinstance(error, self.retry_on):
+            return None
+
+        # Too late?
+        delay = self.delay(attempt)
+        time_left = message.time_left()
+        if time_left is not None and delay >= time_left:
+            return None
+
+        # Budget
+        if not self.budget.withdraw():
+            return None
+
+        # Next attempt
+        provider = self.failover[attempt % len(self.failover)] if self.failover else message.provider
+        return delay, provider
@@ -0,0 +1,200 @@
+import random
+import threading
+from time import time
+
+from . import exc
+
+
+class ProviderStats(object):
+    """ Live statistics of a provider: exponentially weighted moving averages
+
+        Thread-safe: samples are added under a lock, reads take none.
+    """
+
+    __slots__ = ('latency', 'error_rate', 'count', '_lock')
+
+    def __init__(self):
+        #: EWMA send latency, seconds
+        self.latency = 0.0
+        #: EWMA error rate, 0..1
+        self.error_rate = 0.0
+        #: Number of samples
+        self.count = 0
+
+        self._lock = threading.Lock()
+
+    def add(self, latency, error, alpha):
+        """ Add a sample
+
+            :type latency: float
+            :param latency: Send latency, seconds
+            :type error: bool
+            :param error: Has the send failed?
+            :type alpha: float
+            :param alpha: Smoothing factor
+        """
+        with self._lock:  # concurrent sends: read-modify-write
+            if self.count == 0:
+                self.latency, self.error_rate = latency, float(error)
+            else:
+                self.latency += alpha * (latency - self.latency)
+                self.error_rate += alpha * (float(error) - self.error_rate)
+            self.count += 1
+
+    def __repr__(self):
+        return '{cls}(latency={latency:.3f}, error_rate={error_rate:.3f}, count={count!r})'.format(
+            cls=self.__class__.__name__,
+            latency=self.latency,
+            error_rate=self.error_rate,
+            count=self.count
+        )
+
+
+class AdaptiveRouter(object):
+    """ Latency- and cost-aware router
+
+        Picks the cheapest provider for every message, where the cost is:
+
+            (price + latency_weight * EWMA latency) / (1 - EWMA error rate)
+
+        that is, the expected cost of a successful send.
+        The statistics are gathered from the outcomes of the messages it has routed.
+
+        Use it as the Gateway router:
+
+            gw.router = AdaptiveRouter(gw, prices={
+                'a': {'': 0.05, '1': 0.01},  # 0.05 anywhere, 0.01 to the US
+                'b': {'44': 0.02},  # UK only
+            })
+
+        Note that the Gateway only calls the router for messages with routing values: see `OutgoingMessage.route()`
+    """
+
+    #: Errors that say nothing about the provider: caused by the message itself, or raised by the gateway
+    #: before the message was handed over to the provider. They're not counted
+    IGNORED_ERRORS = (exc.RequestError, exc.UnsupportedError, exc.DeadlineError, exc.OverloadError, exc.BlockedError)
+
+    def __init__(self, gateway, prices, latency_weight=0.01, alpha=0.1, explore=0.05):
+        """ Create the router and subscribe to the Gateway events
+
+            :type gateway: smsframework.Gateway
+            :type prices: dict
+            :param prices: Price table: { provider name: { number prefix: price } }.
+                The longest matching prefix wins; use '' for the default price.
+                Providers that have no price for the number are not used for it.
+            :type latency_weight: float
+            :param latency_weight: Price of a second of latency
+            :type alpha: float
+            :param alpha: Smoothing factor for the moving averages: the higher, the faster it adapts
+            :type explore: float
+            :param explore: Share of messages routed randomly, so that the stats of all providers stay up to date
+        """
+        self.gateway = gateway
+        self.latency_weight = latency_weight
+        self.alpha = alpha
+        self.explore = explore
+
+        #: Provider statistics
+        #: :type: dict[str, ProviderStats]
+        self.stats = {name: ProviderStats() for name in prices}
+
+        self.set_prices(prices)
+
+        #: Routed message being sent in this thread: (message, provider name, start time)
+        self._local = threading.local()
+
+        gateway.onSend += self._on_send
+        gateway.onSendError += self._on_send_error
+
+    def set_prices(self, prices):
+        """ Replace the price table
+
+            :type prices: dict
+            :param prices: Price table: { provider name: { number prefix: price } }
+        """
+        # Compile: [ (prefix length, { prefix: [ (provider, price) ] }) ], longest prefixes first
+        table = {}
+        for name, provider_prices in prices.items():
+            self.stats.setdefault(name, ProviderStats())
+            for prefix, price in provider_prices.items():
+                table.setdefault(len(prefix), {}).setdefault(prefix, []).append((name, price))
+        self._prices = sorted(table.items(), reverse=True)  # swap
+
+    def get_prices(self, number):
+        """ Get the prices of providers for a number
+
+            :type number: str
+            :param number: Phone number, digits only
+            :rtype: dict
+            :returns: { provider name: price }
+        """
+        prices = {}
+        for length, prefixes in self._prices:
+            for name, price in prefixes.get(number[:length], ()):
+                prices.setdefault(name, price)  # longest prefix wins
+        return prices
+
+    def cost(self, name, price):
+        """ Get the expected cost of a successful send
+
+            :type name: str
+            :param name: Provider name
+            :type price: float
+            :param price: Provider's price for the message
+            :rtype: float
+        """
+        stats = self.stats[name]
+        return (price + self.latency_weight * stats.latency) / (1.0 - min(stats.error_rate, 0.99))
+
+    def __call__(self, message, *args):
+        prices = self.get_prices(message.dst or '')
+        if not prices:
+            return None  # default provider
+
+        if self.explore and random.random() < self.explore:
+            name = random.choice(list(prices))
+        else:
+            name = min(prices, key=lambda n: self.cost(n, prices[n]))
+
+        self._local.sending = (message, name, time())
+        return name
+
+    def resume(self, message, name):
+        """ Start measuring a message that was routed earlier, and is being sent now, in this thread
+
+            The Gateway calls it for queued messages: see :class:`smsframework.dispatcher.Dispatcher`
+
+            :type message: data.OutgoingMessage
+            :type name: str
+            :param name: The provider the message was routed to
+        """
+        if message.provider is not None or message.routing_values is None:
+            return  # not routed by a router
+        if name not in self.get_prices(message.dst or ''):
+            return  # the default provider
+        self._local.sending = (message, name, time())
+
+    #region Statistics
+
+    def _record(self, message, error):
+        """ Record the outcome of a routed message
+
+            :type error: bool | None
+            :param error: Has the send failed? None to discard the sample
+        """
+        sending = getattr(self._local, 'sending', None)
+        if sending is None or sending[0] is not message:
+            return  # not routed by us
+        self._local.sending = None
+
+        m, name, started = sending
+        if error is not None:
+            self.stats[name].add(time() - started, error, self.alpha)
+
+    def _on_send(self, message):
+        self._record(message, False)
+
+    def _on_send_error(self, message, e):
+        self._record(message, None if isinstance(e, self.IGNORED_ERRORS) else True)
+
+    #endregion
@@ -0,0 +1,302 @@
+import pickle
+import logging
+import threading
+import multiprocessing
+from time import time
+from zlib import crc32
+
+from .lib.events import EventHook
+
+try:  # Py3
+    from queue import Full
+except ImportError:  # Py2
+    from Queue import Full
+
+logger = logging.getLogger(__name__)
+
+
+def _portable(obj):
+    """ Make an object that can be sent to the parent process: the object itself, if it can be pickled, or a copy
+
+        Copies drop the attributes that can't be pickled, e.g. the `reply()` closures of LoopbackProvider.
+        Unpicklable exceptions become RuntimeErrors.
+    """
+    try:
+        pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        return obj
+    except Exception:
+        pass
+    if isinstance(obj, Exception):
+        return RuntimeError('{}: {}'.format(obj.__class__.__name__, obj))
+    copy = obj.__class__.__new__(obj.__class__)
+    for k, v in vars(obj).items():
+        try:
+            pickle.dumps(v, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            continue
+        setattr(copy, k, v)
+    return copy
+
+
+def _dumps(events):
+    """ Serialize events for the parent process
+
+        :type events: list[tuple]
+        :rtype: bytes
+    """
+    try:
+        return pickle.dumps(events, pickle.HIGHEST_PROTOCOL)
+    except Exception:  # fix the arguments that fail only
+        events = [(event[0],) + tuple(map(_portable, event[1:])) for event in events]
+        return pickle.dumps(events, pickle.HIGHEST_PROTOCOL)
+
+
+def _worker(factory, inbox, outbox):
+    """ Worker process: sends the batches of messages from the inbox, reports the outcomes and events to the outbox
+
+        :type factory: callable
+        :param factory: Gateway factory
+        :type inbox: multiprocessing.Queue
+        :type outbox: multiprocessing.Queue
+    """
+    events = []
+    gateway = factory()
+    gateway.onStatus += lambda status: events.append(('status', status))
+    gateway.onReceive += lambda message: events.append(('receive', message))
+
+    for batch in iter(inbox.get, None):
+        for message in batch:
+            try:
+                message = gateway.send(message)
+            except Exception as e:
+                events.append(('error', message, e))
+            else:
+                events.append(('send', message))
+        outbox.put(_dumps(events))
+        del events[:]
+
+
+class ShardedGateway(object):
+    """ Sends messages with a pool of worker processes, to use multiple CPU cores
+
+        Every worker has its own Gateway made by the `factory`: a picklable callable, e.g. a module-level function.
+        Messages are sharded by the destination number, so the messages to a number are sent in order.
+
+        The outcomes and the events of the workers are reported in the parent process by a collector thread:
+        handlers of `onSend`, `onSendError`, `onStatus`, `onReceive` run in that thread.
+        Note that the messages are copied to the workers: the events get the copies, populated by the providers.
+
+            def make_gateway():
+                gw = Gateway()
+                gw.add_provider('main', ClickatellProvider, ...)
+                return gw
+
+            with ShardedGateway(make_gateway, processes=4) as sgw:
+                sgw.onSendError += on_send_error
+                for message in messages:
+                    sgw.send(message)
+                sgw.join()
+
+        Messages are handed over to the workers in batches of `batch_size`, which amortizes the IPC overhead:
+        a partial batch waits until :meth:`flush` or :meth:`join`.
+
+        When a worker process dies, e.g. the factory fails, its messages are never done:
+        :meth:`send` and :meth:`join` raise `RuntimeError` instead of waiting forever.
+    """
+
+    def __init__(self, factory, processes=None, batch_size=100, queue_size=10, context=None):
+        """ Start the worker processes
+
+            :type factory: callable
+            :param factory: Picklable function that creates a Gateway for a worker
+            :type processes: int | None
+            :param processes: Number of worker processes. Default: the number of CPUs
+            :type batch_size: int
+            :param batch_size: Number of messages handed over to a worker at once
+            :type queue_size: int
+            :param queue_size: Max number of batches waiting in a worker's queue: send() blocks when it's full
+            :param context: multiprocessing context, e.g. `multiprocessing.get_context('spawn')`. Default: the default one
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        context = context or multiprocessing
+
+        #: Event: a message was sent: onSend(message)
+        self.onSend = EventHook()
+        #: Event: a message has failed: onSendError(message, error)
+        self.onSendError = EventHook()
+        #: Event: a worker has received a message: onReceive(message)
+        self.onReceive = EventHook()
+        #: Event: a worker has received a status: onStatus(status)
+        self.onStatus = EventHook()
+
+        #: Counter: messages sent
+        self.sent = 0
+        #: Counter: messages failed
+        self.failed = 0
+
+        self._outstanding = 0
+        self._cond = threading.Condition()
+
+        self._batches = [[] for i in range(self.processes)]
+        self._batches_lock = threading.Lock()
+
+        self._outbox = context.Queue()
+        self._inboxes = [context.Queue(queue_size) for i in range(self.processes)]
+        self._workers = [context.Process(target=_worker, args=(factory, inbox, self._outbox),
+                                         name='smsframework-shard-{}'.format(i))
+                         for i, inbox in enumerate(self._inboxes)]
+        for p in self._workers:
+            p.daemon = True
+            p.start()
+
+        self._collector = threading.Thread(target=self._collect, name='smsframework-shard-collector')
+        self._collector.daemon = True
+        self._collector.start()
+
+    def shard(self, message):
+        """ Get the worker number for a message
+
+            :type message: smsframework.OutgoingMessage
+            :rtype: int
+        """
+        return crc32((message.dst or '').encode()) % self.processes
+
+    def send(self, message):
+        """ Queue a message for sending. Blocks when the worker's queue is full
+
+            The outcome is reported with `onSend` or `onSendError`
+
+            :type message: smsframework.OutgoingMessage
+            :raises RuntimeError: the worker has died
+        """
+        with self._cond:
+            self._outstanding += 1
+
+        shard = self.shard(message)
+        with self._batches_lock:
+            batch = self._batches[shard]
+            batch.append(message)
+            if len(batch) < self.batch_size:
+                return
+            self._batches[shard] = []
+        if not self._put(shard, batch):
+            self._check()
+
+    def flush(self):
+        """ Hand over the partial batches to the workers
+
+            :raises RuntimeError: a worker has died
+        """
+        with self._batches_lock:
+            batches, self._batches = self._batches, [[] for i in range(self.processes)]
+        alive = [self._put(shard, batch) for shard, batch in enumerate(batches) if batch]
+        if not all(alive):
+            self._check()
+
+    def send_many(self, messages):
+        """ Send messages and wait till they're done
+
+            :type messages: collections.Iterable[smsframework.OutgoingMessage]
+            :rtype: tuple
+            :returns: (number of messages sent, number of messages failed) in total
+        """
+        for message in messages:
+            self.send(message)
+        self.join()
+        return self.sent, self.failed
+
+    def join(self, timeout=None):
+        """ Wait till all queued messages are done
+
+            :type timeout: float | None
+            :rtype: bool
+            :returns: False on timeout
+            :raises RuntimeError: a worker or the collector has died: the messages will never be done
+        """
+        self.flush()
+        deadline = None if timeout is None else time() + timeout
+        with self._cond:
+            while self._outstanding:
+                left = None if deadline is None else deadline - time()
+                if left is not None and left <= 0:
+                    break
+                self._cond.wait(1.0 if left is None else min(left, 1.0))  # check the liveness every second
+                if self._outstanding:
+                    self._check()
+            return not self._outstanding
+
+    def close(self):
+        """ Finish the queued messages, stop the workers
+
+            Dead workers are logged, not waited for.
+        """
+        try:
+            self.flush()
+        except RuntimeError as e:
+            logger.error(str(e))
+        for shard in range(self.processes):
+            self._put(shard, None)
+        for p in self._workers:
+            p.join()
+        for inbox, p in zip(self._inboxes, self._workers):
+            if p.exitcode:
+                inbox.cancel_join_thread()  # nobody reads it: don't wait to flush it at exit
+        self._outbox.put(None)
+        self._collector.join()
+
+    def _put(self, shard, item):
+        """ Hand an item over to a worker, waiting while its queue is full
+
+            :rtype: bool
+            :returns: False if the worker is dead: the item would never be taken
+        """
+        while True:
+            try:
+                self._inboxes[shard].put(item, timeout=1.0)
+                return True
+            except Full:
+                if not self._workers[shard].is_alive():
+                    return False
+
+    def _check(self):
+        """ Check that the workers and the collector are alive
+
+            :raises RuntimeError: one of them has died
+        """
+        for p in self._workers:
+            if not p.is_alive():
+                raise RuntimeError('ShardedGateway: worker {} has died, exit code {}'.format(p.name, p.exitcode))
+        if not self._collector.is_alive():
+            raise RuntimeError('ShardedGateway: the collector thread has died')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _collect(self):
+        """ Collector thread: report the outcomes and the events of the workers """
+        for events in iter(self._outbox.get, None):
+            done = 0
+            for event in pickle.loads(events):
+                name, args = event[0], event[1:]
+                try:
+                    if name == 'send':
+                        done += 1
+                        self.sent += 1
+                        self.onSend(*args)
+                    elif name == 'error':
+                        done += 1
+                        self.failed += 1
+                        self.onSendError(*args)
+                    elif name == 'status':
+                        self.onStatus(*args)
+                    elif name == 'receive':
+                        self.onReceive(*args)
+                except Exception:
+                    logger.exception('ShardedGateway: {} event handler has failed'.format(name))
+            with self._cond:
+                self._outstanding -= done
+                self._cond.notify_all()
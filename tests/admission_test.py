@@ -0,0 +1,125 @@
+import unittest
+import threading
+from time import sleep
+
+from smsframework import Gateway, OutgoingMessage, exc
+from smsframework.providers import NullProvider
+from smsframework.admission import AdmissionControl
+
+
+class SlowProvider(NullProvider):
+    """ Sends when released """
+
+    def __init__(self, gateway, name):
+        super(SlowProvider, self).__init__(gateway, name)
+        self.release = threading.Semaphore(0)
+        self.sent = []
+
+    def send(self, message):
+        self.release.acquire()
+        self.sent.append(message.body)
+        return super(SlowProvider, self).send(message)
+
+
+class AdmissionControlTest(unittest.TestCase):
+    """ Test AdmissionControl """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.a = self.gw.add_provider('a', SlowProvider)
+        self.b = self.gw.add_provider('b', SlowProvider)
+        self.errors = []
+        self.threads = []
+
+    def send(self, body, provider='a', escalate=False):
+        """ Send in a thread """
+        def send():
+            try:
+                self.gw.send(OutgoingMessage('+1', body, provider=provider).options(escalate=escalate))
+            except exc.OverloadError as e:
+                self.errors.append((body, e))
+        t = threading.Thread(target=send)
+        t.start()
+        self.threads.append(t)
+        sleep(0.02)  # let it reach the admission
+
+    def finish(self, *providers):
+        for p in providers:
+            for i in range(10):
+                p.release.release()
+        for t in self.threads:
+            t.join(1)
+
+    def test_reject(self):
+        """ Test limits & rejection """
+        self.gw.admission = ac = AdmissionControl(max_in_flight=3, max_in_flight_per_provider={'a': 2}, max_queue=1)
+        self.send('1')
+        self.send('2')
+        self.send('3')  # queued: 'a' is full
+        self.send('4', 'b')  # admitted: 'b' has a slot
+        self.assertEqual(ac.stats(), {'in_flight': 3, 'in_flight_per_provider': {'a': 2, 'b': 1},
+                                      'queued': 1, 'admitted': 3, 'rejected': 0, 'dropped': 0})
+
+        # Queue is full
+        send_errors = []
+        self.gw.onSendError += lambda message, e: send_errors.append(e)
+        self.assertRaises(exc.OverloadError, self.gw.send, OutgoingMessage('+1', '5', provider='b'))
+        self.assertEqual(ac.rejected, 1)
+        self.assertIsInstance(send_errors[0], exc.OverloadError)
+
+        self.finish(self.a, self.b)
+        self.assertEqual(sorted(self.a.sent), ['1', '2', '3'])
+        self.assertEqual(ac.stats()['in_flight'], 0)
+        self.assertEqual(ac.admitted, 4)
+
+        # Queue timeout
+        self.a.release = threading.Semaphore(0)
+        self.gw.admission = ac = AdmissionControl(max_in_flight=1, max_queue=1, queue_timeout=0.01)
+        self.send('6')
+        self.assertRaises(exc.OverloadError, self.gw.send, OutgoingMessage('+1', '7', provider='b'))
+        self.finish(self.a)
+        self.assertEqual(ac.rejected, 1)
+
+    def test_priority(self):
+        """ Test priorities and dropping """
+        self.gw.admission = ac = AdmissionControl(max_in_flight=1, max_queue=2, policy='drop-lowest')
+        self.send('1')
+        self.send('2')
+        self.send('3')
+        self.send('4', escalate=True)  # drops '3'
+        self.send('5')  # rejected
+        self.assertEqual([body for body, e in self.errors], ['3', '5'])
+        self.assertEqual((ac.dropped, ac.rejected), (1, 1))
+
+        self.finish(self.a)
+        self.assertEqual(self.a.sent, ['1', '4', '2'])
+
+    def test_block(self):
+        """ Test the blocking policy """
+        self.gw.admission = ac = AdmissionControl(max_in_flight_per_provider=1, policy='block')
+        for i in range(5):
+            self.send(str(i))
+        self.assertEqual(ac.queued, 4)
+        self.finish(self.a)
+        self.assertEqual(self.a.sent, ['0', '1', '2', '3', '4'])
+        self.assertEqual(self.errors, [])
+
+    def test_handover(self):
+        """ Test that a freed slot goes to the first waiter that can use it """
+        self.gw.admission = ac = AdmissionControl(max_in_flight=2, max_in_flight_per_provider={'a': 1}, max_queue=5)
+        self.send('1')
+        self.send('2', 'b')
+        self.send('3')  # queued: 'a' is full
+        self.send('4', 'b')  # queued: the gateway is full
+        self.assertEqual(ac.queued, 2)
+
+        # '3' comes first, but 'a' is still full
+        self.b.release.release()
+        sleep(0.05)
+        self.assertEqual(self.b.sent, ['2'])
+        self.assertEqual(ac.stats()['in_flight_per_provider'], {'a': 1, 'b': 1})
+        self.assertEqual(ac.queued, 1)
+
+        self.finish(self.a, self.b)
+        self.assertEqual((self.a.sent, self.b.sent), (['1', '3'], ['2', '4']))
+        self.assertEqual(ac.admitted, 4)
@@ -0,0 +1,72 @@
+import unittest
+from testfixtures import Replace
+
+from smsframework import Gateway, OutgoingMessage
+from smsframework import MessageAccepted, MessageDelivered, MessageExpired, MessageError
+from smsframework.providers import NullProvider
+from smsframework.analytics import DeliveryStats
+
+
+class DeliveryStatsTest(unittest.TestCase):
+    """ Test DeliveryStats """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.gw.add_provider('a', NullProvider)
+        self.gw.add_provider('b', NullProvider)
+        self.stats = DeliveryStats(self.gw, bucket=3600, prefix_length=2)
+        self.clock = [7200.0]
+
+    def send(self, dst, provider='a'):
+        with Replace('smsframework.analytics.time', lambda: self.clock[0]):
+            return self.gw.send(OutgoingMessage(dst, 'hi', provider=provider)).msgid
+
+    def status(self, Status, msgid, provider='a', after=0):
+        status = Status(msgid)
+        status.provider = provider
+        with Replace('smsframework.analytics.time', lambda: self.clock[0] + after):
+            self.gw.onStatus(status)
+
+    def test_stats(self):
+        """ Test counters and rates """
+        m = [self.send('+4420'), self.send('+4421'), self.send('+1555'), self.send('+1556')]
+        self.status(MessageAccepted, m[0])
+        self.status(MessageDelivered, m[0], after=1)
+        self.status(MessageDelivered, m[1], after=10)
+        self.status(MessageExpired, m[2], after=100)
+        self.status(MessageError, m[3])
+        self.status(MessageDelivered, 'unknown')
+        self.status(MessageDelivered, m[0])  # duplicate
+        self.assertEqual(self.stats.unknown, 2)
+
+        self.clock[0] += 3600
+        b = [self.send('+4420', 'b'), self.send('+4420', 'b')]
+        self.status(MessageDelivered, b[0], 'b', after=5)
+
+        self.assertEqual(self.stats.query(), {
+            'sent': 6, 'accepted': 1, 'delivered': 3, 'expired': 1, 'error': 1,
+            'delivery_rate': 0.5, 'error_rate': 2 / 6.,
+        })
+        self.assertEqual(self.stats.query(provider='a')['delivery_rate'], 0.5)
+        self.assertEqual(self.stats.query(provider='a', prefix='1')['error_rate'], 1.0)
+        self.assertEqual(self.stats.query(provider='c')['delivery_rate'], None)
+
+        # Grouping
+        self.assertEqual({k: v['sent'] for k, v in self.stats.query(by='prefix').items()}, {'44': 4, '15': 2})
+        self.assertEqual({k: v['delivered'] for k, v in self.stats.query(by='provider').items()}, {'a': 2, 'b': 1})
+        self.assertEqual({k: v['sent'] for k, v in self.stats.query(by='bucket').items()}, {7200: 4, 10800: 2})
+        self.assertEqual(self.stats.query(since=10800)['sent'], 2)
+        self.assertEqual(self.stats.query(until=10799)['sent'], 4)
+
+    def test_latency(self):
+        """ Test latency percentiles """
+        self.assertIsNone(self.stats.latency(0.5))
+
+        for i in range(100):
+            self.status(MessageDelivered, self.send('+1555'), after=i + 0.5)
+
+        median = self.stats.latency(0.5)
+        self.assertTrue(40 < median < 60, median)
+        self.assertTrue(80 < self.stats.latency(0.95) <= 100)
+        self.assertTrue(self.stats.latency(0.01) < 1)
+        self.assertIsNone(self.stats.latency(0.5, provider='b'))
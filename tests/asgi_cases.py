@@ -0,0 +1,137 @@
+""" ASGI receiver tests: Python 3.5+ syntax, imported by asgi_test """
+
+import unittest
+import asyncio
+import threading
+from time import time
+
+from smsframework import Gateway
+from smsframework.providers import ForwardClientProvider, LoopbackProvider
+from smsframework import IncomingMessage, MessageDelivered
+from smsframework.providers.forward.provider import jsonex_dumps, jsonex_loads
+
+
+def run(coro):
+    """ Run a coroutine on a new event loop: asyncio.run() is Python 3.7+ """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+async def call(app, path, data=b'', method='POST'):
+    """ Make a request to an ASGI app, return (status, headers, body) """
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'headers': [(b'content-type', b'application/json')],
+    }
+    chunks = [
+        {'type': 'http.request', 'body': data[:10], 'more_body': True},
+        {'type': 'http.request', 'body': data[10:], 'more_body': False},
+    ]
+    sent = []
+
+    async def receive():
+        return chunks.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]['status'], dict(sent[0]['headers']), sent[1]['body']
+
+
+class AsgiReceiverTest(unittest.TestCase):
+    """ Test Gateway.receiver_asgi_app() """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.gw.add_provider('lo', LoopbackProvider)
+        self.gw.add_provider('fwd', ForwardClientProvider, server_url='http://localhost')
+        self.app = self.gw.receiver_asgi_app('/sms')
+
+    def request(self, path, data):
+        """ Make a request, return (status, headers, body) """
+        return run(call(self.app, path, jsonex_dumps(data)))
+
+    def test_sync_handlers(self):
+        """ Test sync event handlers """
+        received = []
+        self.gw.onReceive += received.append
+
+        status, headers, body = self.request('/sms/fwd/im', {'message': IncomingMessage('+123', 'hi')})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-type'], b'application/json')
+        self.assertEqual(jsonex_loads(body)['message'].body, 'hi')
+        self.assertEqual(len(received), 1)
+
+        status, headers, body = self.request('/sms/lo/im', {})
+        self.assertEqual(status, 404)
+
+    def test_async_handlers(self):
+        """ Test async event handlers """
+        statuses = []
+
+        async def on_status(status):
+            await asyncio.sleep(0)
+            statuses.append(status)
+        self.gw.onStatus += on_status
+
+        status, headers, body = self.request('/sms/fwd/status', {'status': MessageDelivered('1')})
+        self.assertEqual(status, 200)
+        self.assertEqual(len(statuses), 1)
+        self.assertIsInstance(statuses[0], MessageDelivered)
+
+        # Async handlers can't be used with sync receivers
+        self.assertRaises(RuntimeError, self.gw.onStatus, MessageDelivered('1'))
+
+    def test_async_handler_error(self):
+        """ Test failing async event handlers """
+        async def on_receive(message):
+            raise OverflowError(':(')
+        self.gw.onReceive += on_receive
+
+        status, headers, body = self.request('/sms/fwd/im', {'message': IncomingMessage('+123', 'hi')})
+        self.assertEqual(status, 500)
+        self.assertEqual(str(jsonex_loads(body)['error']), ':(')  # the route's error format: JsonEx
+
+    def test_blocking_handlers(self):
+        """ Test that route handlers don't block the event loop """
+        release = threading.Event()
+        self.gw.onReceive += lambda message: release.wait(1)
+
+        async def requests():
+            start = time()
+            slow = asyncio.ensure_future(call(self.app, '/sms/fwd/im', jsonex_dumps({'message': IncomingMessage('+1', 'a')})))
+            await asyncio.sleep(0.05)
+            status = await call(self.app, '/sms/fwd/status', jsonex_dumps({'status': MessageDelivered('1')}))
+            self.assertLess(time() - start, 0.5)  # not stuck behind the slow one
+            release.set()
+            return status[0], (await slow)[0]
+
+        self.assertEqual(run(requests()), (200, 200))
+
+    def test_lifespan(self):
+        """ Test the lifespan protocol: open & close the gateway, serve the health """
+        app = self.gw.receiver_asgi_app('/sms', health_path='/health', lifecycle=True)
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+        states = []
+
+        async def receive():
+            states.append(self.gw.state)
+            if len(states) == 2:  # started up: check the health
+                sent.append((await call(app, '/health', method='GET'))[0])
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        run(app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(states, ['new', 'open'])
+        self.assertEqual(sent, ['lifespan.startup.complete', 200, 'lifespan.shutdown.complete'])
+        self.assertEqual(self.gw.state, 'closed')
@@ -0,0 +1,4 @@
+import sys
+
+if sys.version_info >= (3, 5):
+    from asgi_cases import AsgiReceiverTest  # async syntax
@@ -0,0 +1,103 @@
+import unittest
+import threading
+from time import sleep
+from testfixtures import LogCapture
+
+from smsframework import Gateway, IncomingMessage, MessageDelivered
+from smsframework.providers import LoopbackProvider
+from smsframework.lib.events import EventHook, EventBatcher
+
+
+class BatchEventsTest(unittest.TestCase):
+    """ Test onStatusBatch, onReceiveBatch """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.lo = self.gw.add_provider('lo', LoopbackProvider)
+        self.addCleanup(self.gw.close)
+
+    def test_batches(self):
+        """ Test batch events alongside per-item events """
+        statuses, batches = [], []
+        self.gw.onStatus += statuses.append
+        self.gw.onStatusBatch += batches.append
+        self.gw.status_batcher.max_wait = 10
+
+        for i in range(5):
+            self.lo._receive_status(MessageDelivered(str(i)))
+        self.assertEqual(len(statuses), 5)
+        self.assertEqual(batches, [])
+
+        self.gw.flush_batches()
+        self.assertEqual([[s.msgid for s in b] for b in batches], [['0', '1', '2', '3', '4']])
+        self.assertEqual(batches[0][0].provider, 'lo')
+
+        # Incoming messages
+        received = []
+        self.gw.onReceiveBatch += received.append
+        self.lo.received('+123', 'hi')
+        self.gw.flush_batches()
+        self.assertEqual([[m.body for m in b] for b in received], [['hi']])
+        self.assertEqual(len(batches), 1)
+
+    def test_batcher(self):
+        """ Test size and time windows """
+        event = EventHook()
+        batcher = EventBatcher(event, max_size=3, max_wait=0.05)
+        batches = []
+        done = threading.Event()
+        def handler(batch):
+            batches.append(batch)
+            done.set()
+
+        # Nothing is collected without handlers
+        batcher(0)
+        event += handler
+        batcher.flush()
+        self.assertEqual(batches, [])
+
+        # Size
+        for i in range(3):
+            batcher(i)
+        self.assertTrue(done.wait(1))
+        self.assertEqual(batches, [[0, 1, 2]])
+
+        # Time
+        done.clear()
+        batcher(3)
+        sleep(0.01)
+        self.assertEqual(len(batches), 1)
+        self.assertTrue(done.wait(1))
+        self.assertEqual(batches, [[0, 1, 2], [3]])
+
+        # Errors are logged
+        event -= handler
+        event += lambda batch: 1 / 0
+        with LogCapture('smsframework.lib.events') as l:
+            batcher(4)
+            batcher.flush()
+        self.assertIn('1 items lost', str(l))
+        batcher.close()
+
+    def test_close(self):
+        """ Test stopping the thread """
+        event = EventHook()
+        batches = []
+        event += batches.append
+        batcher = EventBatcher(event, max_size=100, max_wait=60)
+
+        batcher(0)
+        thread = batcher._thread
+        self.assertTrue(thread.is_alive())
+        batcher.close()
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(batches, [[0]])  # fired
+
+        # Used again: a new thread
+        batcher.max_wait = 0.01
+        batcher(1)
+        self.assertIsNot(batcher._thread, thread)
+        sleep(0.1)
+        self.assertEqual(batches, [[0], [1]])
+        batcher.close()
+        self.assertIsNone(batcher._thread)
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from smsframework import Gateway, OutgoingMessage, exc
+from smsframework.providers import LoopbackProvider
+from smsframework.blocklist import Blocklist
+
+
+class BlocklistTest(unittest.TestCase):
+    """ Test Blocklist """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'optout.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_blocklist(self):
+        """ Test lookups & changes """
+        bl = Blocklist(['+1 (234) 567', '012', '999', ''])
+        self.assertEqual(len(bl), 3)
+        self.assertIn('1234567', bl)
+        self.assertIn('012', bl)
+        self.assertNotIn('12', bl)  # leading zeros matter
+        self.assertNotIn('', bl)
+        self.assertNotIn(None, bl)
+        self.assertNotIn('1' * 19, bl)
+
+        bl.add('555', '999')
+        bl.remove('012', '777')
+        self.assertEqual(len(bl), 3)
+        self.assertIn('555', bl)
+        self.assertNotIn('012', bl)
+        self.assertEqual(list(bl), ['555', '999', '1234567'])  # shorter first
+
+        bl.add('012')
+        bl.remove('555')
+        self.assertEqual(list(bl), ['012', '999', '1234567'])
+        bl.compact()
+        self.assertEqual(list(bl), ['012', '999', '1234567'])
+        self.assertEqual(bl._state[1:], (set(), set()))
+
+    def test_file(self):
+        """ Test save, load, reload """
+        Blocklist(['1', '2', '3']).save(self.path)
+        bl = Blocklist.load(self.path)
+        self.assertEqual(list(bl), ['1', '2', '3'])
+        self.assertNotIsInstance(bl._state[0], array)  # mapped, not copied
+
+        # Changes are saved
+        bl.add('4')
+        bl.remove('1')
+        bl.save()
+        self.assertEqual(list(Blocklist.load(self.path)), ['2', '3', '4'])
+
+        # Another process replaces the file: the old mapping keeps working until reloaded
+        other = Blocklist.load(self.path)
+        other.add('5')
+        other.save()
+        self.assertNotIn('5', bl)
+        bl.add('6')
+        bl.reload()
+        self.assertIn('5', bl)
+        self.assertNotIn('6', bl)  # not saved
+
+        # Empty
+        Blocklist().save(self.path)
+        self.assertEqual(len(Blocklist.load(self.path)), 0)
+
+        # Invalid
+        with open(self.path, 'wb') as f:
+            f.write(b'hello')
+        self.assertRaises(ValueError, Blocklist.load, self.path)
+        with open(self.path, 'wb') as f:
+            f.write(Blocklist.MAGIC + b'123')
+        self.assertRaises(ValueError, Blocklist.load, self.path)
+
+    def test_gateway(self):
+        """ Test blocking messages """
+        gw = Gateway()
+        lo = gw.add_provider('lo', LoopbackProvider)
+        gw.blocklist = Blocklist(['123'])
+        errors = []
+        gw.onSendError += lambda message, e: errors.append((message.dst, e))
+
+        gw.send(OutgoingMessage('+456', 'hi'))
+        self.assertRaises(exc.BlockedError, gw.send, OutgoingMessage('+123', 'hi'))
+        self.assertEqual([m.dst for m in lo.get_traffic()], ['456'])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0][0], '123')
+        self.assertIsInstance(errors[0][1], exc.BlockedError)
@@ -0,0 +1,99 @@
+import unittest
+import threading
+from time import sleep
+
+from smsframework import Gateway, OutgoingMessage, exc
+from smsframework.providers import NullProvider
+from smsframework.lib.cache import TtlCache, cached
+
+
+class BalanceProvider(NullProvider):
+    """ Provider with a slow balance API """
+
+    def __init__(self, gateway, name):
+        super(BalanceProvider, self).__init__(gateway, name)
+        self.balance = 100
+        self.calls = 0
+        self.credit_error = False
+
+    @cached(ttl=60)
+    def get_balance(self, currency='EUR'):
+        self.calls += 1
+        sleep(0.05)
+        return '{} {}'.format(self.balance, currency)
+
+    def send(self, message):
+        if self.credit_error:
+            raise exc.CreditError('No money')
+        return super(BalanceProvider, self).send(message)
+
+
+class CacheTest(unittest.TestCase):
+    """ Test TtlCache """
+
+    def test_ttl(self):
+        """ Test expiration """
+        cache = TtlCache(ttl=0.05)
+        self.assertEqual(cache.get('a', lambda: 1), 1)
+        self.assertEqual(cache.get('a', lambda: 2), 1)  # fresh
+        sleep(0.06)
+        self.assertEqual(cache.get('a', lambda: 3), 3)  # expired
+
+        # Errors are not cached
+        def fail():
+            raise exc.ServerError(':(')
+        cache.invalidate('a')
+        self.assertRaises(exc.ServerError, cache.get, 'a', fail)
+        self.assertEqual(cache.get('a', lambda: 4), 4)
+
+    def test_single_flight(self):
+        """ Test that concurrent lookups make a single call """
+        gw = Gateway()
+        p = gw.add_provider('main', BalanceProvider)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(p.get_balance())) for i in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ['100 EUR'] * 10)
+        self.assertEqual(p.calls, 1)
+
+        # Arguments are the key
+        self.assertEqual(p.get_balance('USD'), '100 USD')
+        self.assertEqual(p.get_balance(currency='USD'), '100 USD')
+        self.assertEqual(p.calls, 3)
+
+    def test_stale(self):
+        """ Test stale-while-revalidate """
+        calls = []
+        def load():
+            calls.append(1)
+            sleep(0.05)
+            return len(calls)
+
+        cache = TtlCache(ttl=0.2, stale=10)
+        self.assertEqual(cache.get('a', load), 1)
+        sleep(0.21)
+
+        # Stale value is returned at once, refreshed in the background
+        self.assertEqual(cache.get('a', load), 1)
+        self.assertEqual(cache.get('a', load), 1)
+        sleep(0.1)
+        self.assertEqual(cache.get('a', load), 2)  # fresh
+        self.assertEqual(len(calls), 2)
+
+    def test_credit_error(self):
+        """ Test invalidation on CreditError """
+        gw = Gateway()
+        p = gw.add_provider('main', BalanceProvider)
+        self.assertEqual(p.get_balance(), '100 EUR')
+
+        p.balance = 0
+        self.assertEqual(p.get_balance(), '100 EUR')  # cached
+
+        p.credit_error = True
+        self.assertRaises(exc.CreditError, gw.send, OutgoingMessage('+123', 'hi'))
+        self.assertEqual(p.get_balance(), '0 EUR')
+        self.assertEqual(p.calls, 2)
@@ -0,0 +1,151 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+from time import sleep
+
+from smsframework import Gateway, MessageTemplate
+from smsframework.providers import LoopbackProvider
+from smsframework.campaign import Campaign, CsvRecipients
+
+
+class CampaignTest(unittest.TestCase):
+    """ Test Campaign """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.lo = self.gw.add_provider('lo', LoopbackProvider)
+        self.template = MessageTemplate('Hi {name}')
+
+        self.dir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.dir, 'campaign.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_run(self):
+        """ Test sending """
+        recipients = (('+{}'.format(i), {'name': str(i)}) for i in range(100))
+        progress = []
+        campaign = Campaign(self.gw, self.template, recipients, concurrency=4, progress_every=30)
+        campaign.onProgress += lambda c: progress.append(c.sent)
+        campaign.run()
+
+        self.assertEqual((campaign.sent, campaign.failed, campaign.offset), (100, 0, 100))
+        self.assertEqual(progress, [30, 60, 90, 100])
+        self.assertGreater(campaign.rate, 0)
+        self.assertEqual(sorted(m.body for m in self.lo.get_traffic()), sorted('Hi {}'.format(i) for i in range(100)))
+
+        # Bad recipient data
+        campaign = Campaign(self.gw, self.template, [('+1', {}), ('+2', {'name': 'b'})])
+        campaign.run()
+        self.assertEqual((campaign.sent, campaign.failed), (1, 1))
+
+    def test_resume(self):
+        """ Test resuming a CSV campaign """
+        path = os.path.join(self.dir, 'users.csv')
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(u'phone,name\n')
+            for i in range(50):
+                f.write(u'+{},"J\xfcrgen\n{}"\n'.format(i, i))  # multiline, non-ASCII values
+
+        # Stop half-way
+        def stop(campaign):
+            if campaign.sent >= 20:
+                campaign.stop()
+        campaign = Campaign(self.gw, self.template, CsvRecipients(path, dst='phone'), checkpoint=self.checkpoint,
+                            concurrency=2, checkpoint_every=5, progress_every=1)
+        campaign.onProgress += stop
+        campaign.run()
+        traffic = self.lo.get_traffic()
+        self.assertLess(len(traffic), 50)
+        self.assertEqual(campaign.offset, len(traffic))
+
+        # Resume
+        campaign = Campaign(self.gw, self.template, CsvRecipients(path, dst='phone'), checkpoint=self.checkpoint)
+        campaign.run()
+        self.assertEqual((campaign.sent, campaign.offset), (50, 50))
+        traffic += self.lo.get_traffic()
+        self.assertEqual(sorted(int(m.dst) for m in traffic), list(range(50)))
+        self.assertEqual(max(traffic, key=lambda m: int(m.dst)).body, u'Hi J\xfcrgen\n49')
+
+    def test_skip_done(self):
+        """ Test that messages done above the offset are skipped """
+        with io.open(self.checkpoint, 'w', encoding='utf-8') as f:
+            f.write(u'{"offset": 2, "position": null}\n{"i": 3, "msgid": "1"}\n{"i": 4, "er')  # crashed
+
+        recipients = [('+{}'.format(i), {'name': str(i)}) for i in range(6)]
+        campaign = Campaign(self.gw, self.template, recipients, checkpoint=self.checkpoint)
+        campaign.run()
+        self.assertEqual(sorted(m.dst for m in self.lo.get_traffic()), ['2', '4', '5'])
+        self.assertEqual((campaign.sent, campaign.skipped, campaign.offset), (4, 1, 6))
+
+        with io.open(self.checkpoint, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line) for line in f], [{'offset': 6, 'position': None, 'sent': 4, 'failed': 0}])
+
+    def test_compaction(self):
+        """ Test that the checkpoint stays small, and keeps the outcomes above the offset """
+        recipients = [('+{}'.format(i), {'name': str(i)}) for i in range(1000)]
+        campaign = Campaign(self.gw, self.template, recipients, checkpoint=self.checkpoint, checkpoint_every=10)
+        campaign.run()
+        with io.open(self.checkpoint, encoding='utf-8') as f:
+            self.assertLess(len(f.readlines()), 10 + campaign.window + campaign.concurrency)
+
+        # Crashed with messages done above the offset
+        with io.open(self.checkpoint, 'w', encoding='utf-8') as f:
+            f.write(u'{"offset": 2, "position": null, "sent": 1, "failed": 1}\n{"i": 3}\n{"i": 5, "error": true}\n')
+        campaign = Campaign(self.gw, self.template, recipients[:6], checkpoint=self.checkpoint)
+        campaign._load_checkpoint()
+        self.assertEqual((campaign.offset, campaign.sent, campaign.failed), (2, 2, 2))
+        campaign.checkpoint_every = 1
+
+        def check(campaign):  # the outcomes above the offset are kept: the ones read already, and the ones not yet
+            with io.open(self.checkpoint, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+            self.assertIn({'i': 5, 'error': True}, records)
+            self.assertEqual(records[0]['sent'] + records[0]['failed'] + len(records) - 1,
+                             campaign.sent + campaign.failed)
+        campaign.onProgress += check
+        campaign.progress_every = 1
+        campaign.run()
+        self.assertEqual((campaign.offset, campaign.sent, campaign.failed, campaign.skipped), (6, 4, 2, 2))
+
+    def test_window(self):
+        """ Test that reading waits for a hung message: the outcomes above the offset stay bounded """
+        release = threading.Event()
+        send = self.lo.send
+        def hanging_send(message):
+            if message.body == 'Hi 0':
+                release.wait()
+            return send(message)
+        self.lo.send = hanging_send
+
+        recipients = (('+{}'.format(i), {'name': str(i)}) for i in range(100))
+        campaign = Campaign(self.gw, self.template, recipients, concurrency=2, window=2)
+        t = threading.Thread(target=campaign.run)
+        t.start()
+        sleep(0.2)
+        self.assertEqual((campaign.offset, campaign.sent), (0, 3))  # window + concurrency recipients read
+        self.assertEqual(len(campaign._completed), 3)
+
+        release.set()
+        t.join(5)
+        self.assertEqual((campaign.offset, campaign.sent), (100, 100))
+
+    def test_failures(self):
+        """ Test that failing handlers don't stop the campaign, and dead workers don't hang it """
+        def fail(campaign):
+            raise OverflowError(':(')
+        recipients = [('+{}'.format(i), {'name': str(i)}) for i in range(10)]
+        campaign = Campaign(self.gw, self.template, recipients, progress_every=1)
+        campaign.onProgress += fail
+        campaign.run()
+        self.assertEqual(campaign.sent, 10)
+
+        # Dead workers
+        campaign = Campaign(self.gw, self.template, recipients, concurrency=1, window=1)
+        campaign._worker = lambda queue: None  # exits right away
+        self.assertRaises(RuntimeError, campaign.run)
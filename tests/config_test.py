@@ -0,0 +1,155 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+from time import sleep
+
+from smsframework import OutgoingMessage
+from smsframework.providers import NullProvider
+from smsframework.config import ConfigGateway
+
+
+class ClosingProvider(NullProvider):
+    """ Remembers being closed; sends when released """
+
+    def __init__(self, gateway, name, label=None):
+        super(ClosingProvider, self).__init__(gateway, name)
+        self.label = label
+        self.closed = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def send(self, message):
+        self.release.wait()
+        assert not self.closed, 'Closed provider used'
+        return super(ClosingProvider, self).send(message)
+
+    def close(self):
+        self.closed = True
+
+
+P = '{}:ClosingProvider'.format(__name__)
+
+
+class ConfigGatewayTest(unittest.TestCase):
+    """ Test ConfigGateway """
+
+    def send(self, gw, dst, *route, **options):
+        return gw.send(OutgoingMessage(dst, 'hi').route(*route).options(**options)).provider
+
+    def test_routing(self):
+        """ Test providers & routing """
+        gw = ConfigGateway({
+            'providers': {
+                'main': {'type': P},
+                'uk': {'type': P},
+                'fast': {'type': 'null'},
+            },
+            'routes': [
+                {'prefix': '44', 'provider': 'uk'},
+                {'prefix': '447', 'escalate': True, 'provider': 'fast'},
+                {'route': 'otp', 'provider': 'fast'},
+            ],
+        })
+        self.assertEqual(gw.default_provider, 'main')
+        self.assertEqual(self.send(gw, '+1'), 'main')
+        self.assertEqual(self.send(gw, '+44'), 'uk')
+        self.assertEqual(self.send(gw, '+447'), 'uk')
+        self.assertEqual(self.send(gw, '+447', escalate=True), 'fast')
+        self.assertEqual(self.send(gw, '+1', 'otp'), 'fast')
+        self.assertEqual(self.send(gw, '+44', 'otp'), 'uk')  # longer prefix first
+        self.assertEqual(gw.send(OutgoingMessage('+44', 'hi', provider='main')).provider, 'main')
+
+        # Invalid configurations
+        self.assertRaises(AssertionError, ConfigGateway, {'providers': {}})
+        self.assertRaises(AssertionError, ConfigGateway, {'providers': {'a': {'type': 'null'}}, 'default': 'b'})
+        self.assertRaises(AssertionError, ConfigGateway, {'providers': {'a': {'type': 'null'}}, 'typo': 1})
+        self.assertRaises(AssertionError, ConfigGateway, {'providers': {'a': {'type': 'null'}},
+                                                          'routes': [{'prefix': '1', 'provider': 'b'}]})
+        self.assertRaises(KeyError, ConfigGateway, {'providers': {'a': {'type': 'unknown'}}})
+        self.assertRaises(TypeError, ConfigGateway, {'providers': {'a': {'type': 'null', 'wrong': 1}}})
+
+    def test_reload(self):
+        """ Test reloading """
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, 'sms.json')
+        config = {
+            'providers': {'a': {'type': P, 'label': 1}, 'b': {'type': P, 'label': 1}},
+            'default': 'a',
+        }
+        with open(path, 'w') as f:
+            json.dump(config, f)
+
+        gw = ConfigGateway(path)
+        a, b = gw.get_provider('a'), gw.get_provider('b')
+
+        # A send in progress
+        a.release.clear()
+        sent = []
+        t = threading.Thread(target=lambda: sent.append(self.send(gw, '+1')))
+        t.start()
+        sleep(0.05)
+
+        # Reload: 'a' is changed, 'b' is kept, 'c' is new
+        config['providers']['a']['label'] = 2
+        config['providers']['c'] = {'type': P}
+        config['routes'] = [{'prefix': '1', 'provider': 'c'}]
+        with open(path, 'w') as f:
+            json.dump(config, f)
+        gw.reload()
+        self.assertIsNot(gw.get_provider('a'), a)
+        self.assertIs(gw.get_provider('b'), b)
+        self.assertEqual(self.send(gw, '+1'), 'c')  # new config in effect
+
+        # The send in progress finishes with the old provider, and then it's closed
+        sleep(0.05)
+        self.assertFalse(a.closed)
+        a.release.set()
+        t.join(1)
+        self.assertEqual(sent, ['a'])
+        sleep(0.05)
+        self.assertTrue(a.closed)
+        self.assertFalse(b.closed)
+
+        # Failed reload: nothing changes; the providers made are closed
+        c = gw.get_provider('c')
+        config['providers']['c']['label'] = 3
+        config['providers']['d'] = {'type': 'unknown'}
+        self.assertRaises(KeyError, gw.reload, config)
+        self.assertIs(gw.get_provider('c'), c)
+        self.assertEqual(gw.path, path)
+
+        # Removed
+        gw.reload({'providers': {'b': {'type': P, 'label': 1}}}, wait=True)
+        self.assertTrue(c.closed)
+        self.assertEqual(gw.default_provider, 'b')
+        self.assertRaises(KeyError, gw.get_provider, 'a')
+
+    def test_reload_forward_server(self):
+        """ Test that retired forwarding servers stop forwarding """
+        gw = ConfigGateway({'providers': {'main': {'type': P}}})
+        events = (gw.onReceive, gw.onStatus)
+
+        gw.reload({'providers': {'main': {'type': P}, 'fwd': {'type': 'forward-server', 'clients': ['http://a']}}})
+        self.assertEqual([len(e) for e in events], [1, 1])
+
+        # Changed: the new one replaces the old one
+        gw.reload({'providers': {'main': {'type': P}, 'fwd': {'type': 'forward-server', 'clients': ['http://b']}}},
+                  wait=True)
+        self.assertEqual([len(e) for e in events], [1, 1])
+        self.assertEqual(gw.get_provider('fwd').clients, ('http://b',))
+
+        # Failed reload: the providers made are unhooked
+        self.assertRaises(KeyError, gw.reload, {'providers': {
+            'main': {'type': P},
+            'fwd2': {'type': 'forward-server', 'clients': ['http://c']},
+            'x': {'type': 'unknown'},
+        }})
+        self.assertEqual([len(e) for e in events], [1, 1])
+
+        # Removed
+        gw.reload({'providers': {'main': {'type': P}}}, wait=True)
+        self.assertEqual([len(e) for e in events], [0, 0])
@@ -0,0 +1,120 @@
+import unittest
+import threading
+from time import sleep
+from testfixtures import Replace
+
+from smsframework import Gateway, OutgoingMessage, exc
+from smsframework.providers import NullProvider
+from smsframework.dedupe import Deduplicator
+
+
+class GatedProvider(NullProvider):
+    """ Sends when the gate is open; fails on request """
+
+    def __init__(self, gateway, name):
+        super(GatedProvider, self).__init__(gateway, name)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = 0  # number of sends to fail
+        self.sent = []
+
+    def send(self, message):
+        self.gate.wait()
+        if self.fail:
+            self.fail -= 1
+            raise exc.ServerError('Down')
+        self.sent.append(message.body)
+        return super(GatedProvider, self).send(message)
+
+
+class DedupeTest(unittest.TestCase):
+    """ Test Deduplicator """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.p = self.gw.add_provider('p', GatedProvider)
+        self.gw.dedupe = self.dedupe = Deduplicator(window=60, max_size=10)
+
+    def send(self, dst, body, src=None):
+        return self.gw.send(OutgoingMessage(dst, body, src))
+
+    def test_dedupe(self):
+        """ Test suppressing duplicates """
+        sent = []
+        self.gw.onSend += sent.append
+
+        with Replace('smsframework.dedupe.time', lambda: 1000.0):
+            self.dedupe._rotated = 1000.0
+            a = self.send('+1', 'hi')
+            self.assertEqual(a.msgid, '1')
+            dup = self.send('+1', 'hi')
+            self.assertEqual((dup.msgid, dup.provider), ('1', 'p'))
+            self.assertIsNot(dup, a)
+
+            self.assertEqual(self.send('+2', 'hi').msgid, '2')
+            self.assertEqual(self.send('+1', 'hello').msgid, '3')
+            self.assertEqual(self.send('+1', 'hi', src='me').msgid, '4')
+
+        self.assertEqual(self.p.sent, ['hi', 'hi', 'hello', 'hi'])
+        self.assertEqual(len(sent), 4)  # duplicates don't fire onSend
+        self.assertEqual(self.dedupe.suppressed, 1)
+
+        # Still within the window, in the previous bucket
+        with Replace('smsframework.dedupe.time', lambda: 1059.0):
+            self.assertEqual(self.send('+1', 'hi').msgid, '1')
+        with Replace('smsframework.dedupe.time', lambda: 1061.0):
+            self.assertEqual(self.send('+1', 'hi').msgid, '5')
+
+        # Long after: everything is forgotten
+        with Replace('smsframework.dedupe.time', lambda: 1200.0):
+            self.send('+9', 'x')
+        self.assertEqual(len(self.dedupe), 1)
+
+    def test_max_size(self):
+        """ Test memory bound """
+        for i in range(50):
+            self.send(str(i), 'hi')
+        self.assertLessEqual(len(self.dedupe), 10)
+        self.assertEqual(self.send('49', 'hi').msgid, '50')  # remembered
+
+    def test_in_flight(self):
+        """ Test duplicates of a message being sent """
+        self.p.gate.clear()
+        results = []
+        def send(body='hi'):
+            try:
+                results.append(self.send('+1', body).msgid)
+            except exc.ServerError as e:
+                results.append(e)
+        threads = [threading.Thread(target=send) for _ in range(3)]
+        for t in threads:
+            t.start()
+        sleep(0.05)
+        self.p.gate.set()
+        for t in threads:
+            t.join(1)
+        self.assertEqual(results, ['1', '1', '1'])
+        self.assertEqual(self.p.sent, ['hi'])
+
+        # The original fails: the duplicate is sent
+        self.p.gate.clear()
+        self.p.fail = 1
+        threads = [threading.Thread(target=send, args=('again',)) for _ in range(2)]
+        del results[:]
+        for t in threads:
+            t.start()
+        sleep(0.05)
+        self.p.gate.set()
+        for t in threads:
+            t.join(1)
+        self.assertIsInstance(results[0], exc.ServerError)
+        self.assertEqual(results[1:], ['2'])
+
+        # Deadline while waiting
+        self.p.gate.clear()
+        t = threading.Thread(target=self.send, args=('+3', 'wait'))
+        t.start()
+        sleep(0.05)
+        self.assertRaises(exc.DeadlineError, self.gw.send, OutgoingMessage('+3', 'wait'), timeout=0.05)
+        self.p.gate.set()
+        t.join(1)
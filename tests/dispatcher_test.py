@@ -0,0 +1,165 @@
+import unittest
+import threading
+from time import sleep
+
+from smsframework import Gateway, OutgoingMessage, exc
+from smsframework.providers import NullProvider
+from smsframework.dispatcher import Dispatcher
+from smsframework.routing import AdaptiveRouter
+from smsframework.retry import RetryPolicy
+
+
+class SlowProvider(NullProvider):
+    """ Sends when released """
+
+    def __init__(self, gateway, name):
+        super(SlowProvider, self).__init__(gateway, name)
+        self.release = threading.Semaphore(0)
+        self.sent = []
+        self.sent_messages = []
+
+    def send(self, message):
+        self.release.acquire()
+        self.sent.append(message.body)
+        self.sent_messages.append(message)
+        return super(SlowProvider, self).send(message)
+
+
+class FlakyProvider(NullProvider):
+    """ Fails the first attempt of every message, and all attempts of 'down' """
+
+    def __init__(self, gateway, name):
+        super(FlakyProvider, self).__init__(gateway, name)
+        self.attempts = []
+
+    def send(self, message):
+        self.attempts.append(message.body)
+        if message.body == 'down' or self.attempts.count(message.body) == 1:
+            raise exc.ServerError('flaky')
+        return super(FlakyProvider, self).send(message)
+
+
+class DispatcherTest(unittest.TestCase):
+    """ Test Dispatcher """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.a = self.gw.add_provider('a', SlowProvider)
+        self.b = self.gw.add_provider('b', SlowProvider)
+
+    def submit(self, dispatcher, body, provider='a', escalate=False, **options):
+        dispatcher.submit(OutgoingMessage('+1', body, provider=provider).options(escalate=escalate, **options))
+
+    def finish(self, dispatcher):
+        for p in (self.a, self.b):
+            for i in range(100):
+                p.release.release()
+        self.assertTrue(dispatcher.join(5))
+        dispatcher.close()
+
+    def test_weighted(self):
+        """ Test weighted fair scheduling """
+        d = Dispatcher(self.gw, workers=1)
+        self.submit(d, 'first')
+        sleep(0.05)  # the worker is busy
+        for i in range(20):
+            self.submit(d, 'n')
+        for i in range(20):
+            self.submit(d, 'h', escalate=True)
+
+        self.finish(d)
+        self.assertEqual(self.a.sent[0], 'first')
+        self.assertEqual(self.a.sent[1:11], ['h'] * 10)  # the high lane has caught up
+        self.assertEqual(self.a.sent[11:22].count('n'), 1)  # then 10:1
+        self.assertEqual(len(self.a.sent), 41)
+        self.assertEqual((d.sent, d.failed), (41, 0))
+
+    def test_lane_option(self):
+        """ Test explicit lanes """
+        d = Dispatcher(self.gw, workers=1, lanes={'high': 10, 'normal': 5, 'bulk': 1})
+        self.submit(d, 'first')
+        sleep(0.05)
+        for i in range(5):
+            self.submit(d, 'b', lane='bulk')
+        for i in range(5):
+            self.submit(d, 'n')
+        self.submit(d, 'h', escalate=True, lane='high')
+        self.assertRaises(AssertionError, self.submit, d, 'x', lane='unknown')
+
+        self.finish(d)
+        # 'bulk' gets a turn every 5 'normal' ones; it goes before 'normal' as 'normal' has already sent 'first'.
+        # Lanes with the same virtual time go by weight: 'high' before 'bulk', and 'normal' before 'bulk'
+        self.assertEqual(self.a.sent, ['first', 'h', 'b', 'n', 'n', 'n', 'n', 'n', 'b', 'b', 'b', 'b'])
+
+    def test_reserved(self):
+        """ Test reserved capacity """
+        d = Dispatcher(self.gw, workers=3, reserved={'high': 1}, per_provider=2)
+        for i in range(5):
+            self.submit(d, 'n', provider='a')
+        self.submit(d, 'n', provider='b')
+        sleep(0.05)
+        # 'a': 1 slot is reserved; 'b': 1 worker left, not reserved
+        self.assertEqual(d.stats()['busy'], {'high': 0, 'normal': 2})
+
+        # High priority gets the reserved worker & slot right away
+        self.submit(d, 'h', provider='a', escalate=True)
+        sleep(0.05)
+        self.assertEqual(d.stats()['busy'], {'high': 1, 'normal': 2})
+        self.assertEqual(d.stats()['queued'], {'high': 0, 'normal': 4})
+
+        self.finish(d)
+        self.assertEqual(sorted(self.a.sent), ['h', 'n', 'n', 'n', 'n', 'n'])
+        self.assertEqual(self.b.sent, ['n'])
+        self.assertRaises(RuntimeError, self.submit, d, 'late')
+
+    def test_routing(self):
+        """ Test that messages are routed once, when submitted """
+        routed = []
+        def router(message, *values):
+            routed.append(message.body)
+            return 'b'
+        self.gw.router = router
+
+        d = Dispatcher(self.gw, workers=2)
+        for i in range(3):
+            d.submit(OutgoingMessage('+1', str(i)).route('x'))
+        self.finish(d)
+        self.assertEqual(sorted(self.b.sent), ['0', '1', '2'])
+        self.assertEqual(sorted(routed), ['0', '1', '2'])
+
+    def test_adaptive_router(self):
+        """ Test that the AdaptiveRouter records the stats of dispatched messages """
+        router = AdaptiveRouter(self.gw, {'a': {'': 2.0}, 'b': {'': 1.0}}, explore=0)
+        self.gw.router = router
+
+        d = Dispatcher(self.gw, workers=2)
+        for i in range(3):
+            d.submit(OutgoingMessage('+1', str(i)).route())
+        d.submit(OutgoingMessage('+1', 'explicit', provider='b').route())
+        self.finish(d)
+        self.assertEqual(sorted(self.b.sent), ['0', '1', '2', 'explicit'])
+        self.assertEqual(router.stats['b'].count, 3)  # explicit providers aren't counted
+        self.assertEqual(router.stats['a'].count, 0)
+
+    def test_retry(self):
+        """ Test that failed messages are queued again, and don't hold a worker while waiting """
+        flaky = self.gw.add_provider('flaky', FlakyProvider)
+        flaky.retry_policy = RetryPolicy(max_attempts=2)
+        flaky.retry_policy.delay = lambda attempt: 0.2
+
+        d = Dispatcher(self.gw, workers=1)
+        for body in ('x', 'down', 'y'):
+            self.submit(d, body, provider='flaky')
+        sleep(0.1)
+        # The only worker has tried them all, and is free
+        self.assertEqual(flaky.attempts, ['x', 'down', 'y'])
+        self.assertEqual(d.stats()['delayed'], 3)
+        self.assertEqual(d.stats()['busy'], {'high': 0, 'normal': 0})
+        self.submit(d, 'n')
+        sleep(0.05)
+        self.assertEqual(d.stats()['busy'], {'high': 0, 'normal': 1})  # not waiting for the retries
+
+        self.finish(d)
+        self.assertEqual(flaky.attempts, ['x', 'down', 'y', 'x', 'down', 'y'])
+        self.assertEqual(self.a.sent, ['n'])
+        self.assertEqual((d.sent, d.failed), (3, 1))  # 'down' has failed twice, counted once
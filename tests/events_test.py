@@ -0,0 +1,102 @@
+import unittest
+import threading
+
+from smsframework import Gateway, OutgoingMessage, MessageStatus, MessageAccepted, MessageDelivered
+from smsframework.providers import LoopbackProvider
+from smsframework.lib.events import EventHook
+
+
+class EventHookTest(unittest.TestCase):
+    """ Test EventHook """
+
+    def test_subscriptions(self):
+        """ Test subscribe, unsubscribe """
+        event = EventHook()
+        calls = []
+        a = lambda x: calls.append(('a', x))
+        b = lambda x: calls.append(('b', x))
+
+        event += a
+        event += b
+        event += a
+        self.assertEqual(len(event), 3)
+        event(1)
+        self.assertEqual(calls, [('a', 1), ('b', 1), ('a', 1)])
+
+        event -= a
+        del calls[:]
+        event(2)
+        self.assertEqual(calls, [('b', 2), ('a', 2)])
+
+        event -= a
+        event -= b
+        self.assertEqual(len(event), 0)
+        self.assertRaises(ValueError, event.unsubscribe, a)
+
+    def test_filters(self):
+        """ Test filtered subscriptions """
+        gw = Gateway()
+        a = gw.add_provider('a', LoopbackProvider)
+        gw.add_provider('b', LoopbackProvider)
+
+        calls = []
+        gw.onStatus.subscribe(lambda s: calls.append(('all', s.provider, s.msgid)))
+        gw.onStatus.subscribe(lambda s: calls.append(('a', s.provider, s.msgid)), provider='a')
+        gw.onStatus.subscribe(lambda s: calls.append(('delivered', s.provider, s.msgid)), cls=MessageDelivered)
+        gw.onStatus.subscribe(lambda s: calls.append(('a-accepted', s.provider, s.msgid)),
+                              provider='a', cls=MessageAccepted)  # MessageDelivered is a subclass
+
+        a._receive_status(MessageDelivered('1'))
+        gw.get_provider('b')._receive_status(MessageAccepted('2'))
+        a._receive_status(MessageAccepted('3'))
+        a._receive_status(MessageStatus('4'))
+        self.assertEqual(calls, [
+            ('all', 'a', '1'), ('a', 'a', '1'), ('delivered', 'a', '1'), ('a-accepted', 'a', '1'),
+            ('all', 'b', '2'),
+            ('all', 'a', '3'), ('a', 'a', '3'), ('a-accepted', 'a', '3'),
+            ('all', 'a', '4'), ('a', 'a', '4'),
+        ])
+
+        # The index is reset on changes
+        del calls[:]
+        handler = lambda s: calls.append(('new', s.provider, s.msgid))
+        gw.onStatus.subscribe(handler, provider='b')
+        gw.get_provider('b')._receive_status(MessageAccepted('5'))
+        self.assertEqual(calls, [('all', 'b', '5'), ('new', 'b', '5')])
+
+        del calls[:]
+        gw.onStatus -= handler
+        gw.get_provider('b')._receive_status(MessageAccepted('6'))
+        self.assertEqual(calls, [('all', 'b', '6')])
+
+        # Events with other arguments
+        sent = []
+        gw.onSend.subscribe(sent.append, provider='b')
+        gw.send(OutgoingMessage('+1', 'hi', provider='a'))
+        gw.send(OutgoingMessage('+1', 'hi', provider='b'))
+        self.assertEqual([m.provider for m in sent], ['b'])
+
+    def test_concurrent(self):
+        """ Test changing the subscriptions while firing """
+        event = EventHook()
+        calls = []
+        event += calls.append  # always subscribed
+        stop = threading.Event()
+
+        def churn():
+            handler = lambda x: None
+            while not stop.is_set():
+                event.subscribe(handler, provider='x')
+                event.unsubscribe(handler)
+        threads = [threading.Thread(target=churn) for _ in range(2)]
+        for t in threads:
+            t.start()
+        try:
+            for i in range(20000):
+                event(i)
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+        self.assertEqual(calls, list(range(20000)))
+        self.assertEqual(len(event), 1)
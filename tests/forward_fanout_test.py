@@ -0,0 +1,115 @@
+import unittest
+import threading
+import time
+
+from smsframework import Gateway, exc
+from smsframework.providers import ForwardServerProvider, NullProvider
+from smsframework import IncomingMessage
+
+
+class FakeServerProvider(ForwardServerProvider):
+    """ Server that simulates the clients instead of making requests """
+
+    def __init__(self, *args, **kwargs):
+        super(FakeServerProvider, self).__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.forwarded = []
+        self.running = self.max_running = 0
+
+    def _forward_object_to_client(self, client, obj, timeout=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if 'slow' in client:
+                time.sleep(0.2)
+            if 'fail' in client:
+                raise exc.ServerError(client)
+            with self.lock:
+                self.forwarded.append(client)
+            return obj
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class ForwardFanoutTest(unittest.TestCase):
+    """ Test ForwardServerProvider fan-out """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.gw.add_provider('main', NullProvider)
+
+    def tearDown(self):
+        self.fwd.close()
+
+    def add_server(self, clients, **config):
+        self.fwd = self.gw.add_provider('fwd', FakeServerProvider, clients=clients, **config)
+        ' :type: FakeServerProvider '
+        return self.fwd
+
+    def test_parallel(self):
+        """ Test that clients are handled in parallel """
+        fwd = self.add_server(['http://slow-{}'.format(i) for i in range(8)])
+
+        start = time.time()
+        fwd.forward(IncomingMessage('1', 'hi'))
+        self.assertLess(time.time() - start, 0.2 * 4)
+        self.assertEqual(len(fwd.forwarded), 8)
+
+        # The executor is reused
+        executor = fwd._executor
+        fwd.forward(IncomingMessage('1', 'hi'))
+        self.assertIs(fwd._executor, executor)
+
+    def test_errors(self):
+        """ Test that all errors are reported """
+        fwd = self.add_server(['http://a', 'http://fail-1', 'http://b', 'http://fail-2'])
+
+        with self.assertRaises(exc.ForwardError) as e:
+            fwd.forward(IncomingMessage('1', 'hi'))
+        self.assertEqual(set(e.exception.errors), {'http://fail-1', 'http://fail-2'})
+        self.assertIsInstance(e.exception.errors['http://fail-1'], exc.ServerError)
+        self.assertEqual(sorted(fwd.forwarded), ['http://a', 'http://b'])  # others still got it
+
+        # Errors propagate through the gateway
+        provider = self.gw.get_provider('main')
+        self.assertRaises(exc.ForwardError, provider._receive_message, IncomingMessage('1', 'hi'))
+
+    def test_timeout(self):
+        """ Test the forwarding timeout """
+        fwd = self.add_server(['http://a', 'http://slow'], timeout=0.05)
+
+        with self.assertRaises(exc.ForwardError) as e:
+            fwd.forward(IncomingMessage('1', 'hi'))
+        self.assertEqual(list(e.exception.errors), ['http://slow'])
+        self.assertIsInstance(e.exception.errors['http://slow'], exc.ConnectionError)
+
+    def test_client_concurrency(self):
+        """ Test the per-client concurrency limit """
+        fwd = self.add_server(['http://slow'], client_concurrency=2)
+
+        threads = [threading.Thread(target=fwd.forward, args=(IncomingMessage('1', 'hi'),)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(fwd.max_running, 2)
+        self.assertEqual(len(fwd.forwarded), 4)
+
+    def test_busy_client(self):
+        """ Test that a busy client doesn't hold up the others, nor the workers """
+        fwd = self.add_server(['http://slow', 'http://a'], client_concurrency=1, max_workers=2)
+
+        busy = threading.Thread(target=fwd._forward_acquired, args=('http://slow', None, time.time() + 1))
+        self.assertTrue(fwd._acquire('http://slow', 0))
+        busy.start()
+        self.assertFalse(fwd._acquire('http://slow', 0))  # busy
+
+        start = time.time()
+        fwd.forward(IncomingMessage('1', 'hi'))  # 'a' goes first, 'slow' waits for its slot
+        self.assertEqual(fwd.forwarded, ['http://a', 'http://slow', 'http://slow'])
+        self.assertLess(time.time() - start, 0.2 * 2 + 0.1)
+        busy.join()
+        self.assertEqual(fwd._busy, {})
@@ -0,0 +1,83 @@
+import unittest
+
+from smsframework import Gateway
+from smsframework.providers import ForwardServerProvider, NullProvider
+from smsframework import IncomingMessage, MessageDelivered
+
+
+class ForwardSubscriptionsTest(unittest.TestCase):
+    """ Test ForwardServerProvider subscriptions """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.gw.add_provider('main', NullProvider)
+        self.gw.add_provider('other', NullProvider)
+        self.gw.add_provider('fwd', ForwardServerProvider, clients=['http://a', 'http://b', 'http://c', 'http://all'], subscriptions={
+            'http://a': {'prefixes': ['+1', '4700']},
+            'http://b': {'prefixes': ['1555'], 'keywords': ['stop']},
+            'http://c': {'providers': ['other']},
+        })
+        self.fwd = self.gw.get_provider('fwd')
+        ' :type: ForwardServerProvider '
+
+    def choose(self, obj, provider='main'):
+        obj.provider = provider
+        return set(self.fwd.choose_clients(obj))
+
+    def test_no_subscriptions(self):
+        """ Test the default: fan-out to all clients """
+        self.gw.add_provider('fwd2', ForwardServerProvider, clients=['http://a', 'http://b'])
+        fwd = self.gw.get_provider('fwd2')
+        self.assertEqual(fwd.choose_clients(IncomingMessage('1', 'hi')), ['http://a', 'http://b'])
+
+    def test_prefixes(self):
+        """ Test prefix subscriptions """
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi', dst='+1 234')), {'http://a', 'http://all'})
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi', dst='15551234')), {'http://a', 'http://b', 'http://all'})
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi', dst='4700')), {'http://a', 'http://all'})
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi', dst='470')), {'http://all'})
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi')), {'http://all'})
+
+    def test_keywords(self):
+        """ Test keyword subscriptions """
+        self.assertEqual(self.choose(IncomingMessage('9', 'Stop it', dst='2')), {'http://b', 'http://all'})
+        self.assertEqual(self.choose(IncomingMessage('9', 'stopped', dst='2')), {'http://all'})
+        self.assertEqual(self.choose(IncomingMessage('9', '', dst='2')), {'http://all'})
+
+    def test_providers(self):
+        """ Test provider subscriptions """
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi', dst='2'), 'other'), {'http://c', 'http://all'})
+
+        # Statuses: clients without provider subscriptions get all of them
+        self.assertEqual(self.choose(MessageDelivered('1'), 'main'), {'http://a', 'http://b', 'http://all'})
+        self.assertEqual(self.choose(MessageDelivered('1'), 'other'), {'http://a', 'http://b', 'http://c', 'http://all'})
+
+    def test_subscribe(self):
+        """ Test runtime subscriptions """
+        clients = ['http://a']
+        self.gw.add_provider('fwd2', ForwardServerProvider, clients=clients).subscribe('http://b')
+        self.assertEqual(clients, ['http://a'])  # not modified
+
+        self.fwd.subscribe('http://all', prefixes=['7'])
+        self.fwd.subscribe('http://d', keywords=['HELP'])
+        self.assertIn('http://d', self.fwd.clients)
+        self.assertEqual(self.fwd.subscriptions.clients, self.fwd.clients)
+
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi', dst='2')), set())
+        self.assertEqual(self.choose(IncomingMessage('9', 'help', dst='70')), {'http://all', 'http://d'})
+
+        self.fwd.subscriptions.unsubscribe('http://d')
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi', dst='2')), {'http://d'})
+
+        # Clients added & removed
+        self.fwd.add_client('http://e')
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi', dst='2')), {'http://d', 'http://e'})
+        self.fwd.remove_client('http://e').remove_client('http://b')
+        self.assertEqual(self.choose(IncomingMessage('9', 'stop', dst='2')), {'http://d'})
+        self.assertNotIn('http://b', self.fwd.subscriptions._subscriptions)
+
+        # Clients replaced
+        clients = list(self.fwd.clients)
+        clients[clients.index('http://d')] = 'http://f'
+        self.fwd.clients = clients
+        self.assertEqual(self.choose(IncomingMessage('9', 'hi', dst='2')), {'http://f'})
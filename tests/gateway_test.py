@@ -1,6 +1,8 @@
 import unittest
 
-from smsframework import Gateway
+import time
+
+from smsframework import Gateway, exc
 from smsframework.providers import NullProvider
 from smsframework import OutgoingMessage, IncomingMessage, MessageStatus
 
@@ -44,6 +46,16 @@ class GatewayTest(unittest.TestCase):
         # Pass a non-IProvider class
         self.assertRaises(AssertionError, self.gw.add_provider, 'ok', Exception)
 
+    def test_provider_names(self):
+        """ Test adding providers by registered name """
+        from smsframework.providers import LoopbackProvider, register_provider
+
+        self.assertIsInstance(self.gw.add_provider('lo', 'loopback'), LoopbackProvider)
+        self.assertRaises(KeyError, self.gw.add_provider, 'zzz', 'unknown-provider')
+
+        register_provider('my-null', 'smsframework.providers.null:NullProvider')
+        self.assertIsInstance(self.gw.add_provider('my', 'my-null'), NullProvider)
+
     def test_routing(self):
         """ Test routing """
 
@@ -71,6 +83,31 @@ class GatewayTest(unittest.TestCase):
         self.assertRaises(AssertionError, self.gw.send, OutgoingMessage('', '', provider='zzz'))
 
 
+    def test_deadline(self):
+        """ Test sending deadlines """
+        errors = []
+        self.gw.onSendError += lambda message, e: errors.append(e)
+
+        time_left = []
+        self.gw.onSend += lambda message: time_left.append(message.time_left())
+
+        # Timeout sets the deadline for the send
+        msg = self.gw.send(OutgoingMessage('', ''), timeout=10)
+        self.assertAlmostEqual(time_left.pop(), 10, delta=1)
+        self.assertIsNone(msg.provider_options.deadline)  # the options are not modified
+        self.assertEqual(OutgoingMessage('', '').time_left(5), 5)
+        self.assertAlmostEqual(OutgoingMessage('', '').options(deadline=time.time() + 10).time_left(5), 5, delta=1)
+
+        # An earlier deadline is kept
+        msg = self.gw.send(OutgoingMessage('', '').options(deadline=time.time() + 1), timeout=10)
+        self.assertLess(time_left.pop(), 1)
+
+        # Deadline exceeded
+        msg = OutgoingMessage('', '').options(deadline=time.time() - 1)
+        self.assertRaises(exc.DeadlineError, self.gw.send, msg)
+        self.assertEqual(msg.msgid, None)  # not sent
+        self.assertIsInstance(errors[0], exc.DeadlineError)
+
     def test_events(self):
         """ Test events """
 
@@ -0,0 +1,177 @@
+import json
+import unittest
+from time import time, sleep
+
+from smsframework import Gateway, exc
+from smsframework.providers import NullProvider, LoopbackProvider, PoolProvider
+from smsframework.config import ConfigGateway
+
+
+class LifecycleProvider(NullProvider):
+    """ Records the lifecycle calls; takes `delay` seconds for each """
+
+    def __init__(self, gateway, name, delay=0, healthy=True, error=None):
+        super(LifecycleProvider, self).__init__(gateway, name)
+        self.delay = delay
+        self.healthy = healthy
+        self.error = error
+        self.calls = []
+
+    def _call(self, method):
+        self.calls.append(method)
+        sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+
+    def open(self):
+        self._call('open')
+
+    def health_check(self):
+        self._call('health_check')
+        return self.healthy
+
+    def close(self):
+        self._call('close')
+
+
+class LifecycleTest(unittest.TestCase):
+    """ Test Gateway.open(), health(), close() """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.a = self.gw.add_provider('a', LifecycleProvider, delay=0.2)
+        self.b = self.gw.add_provider('b', LifecycleProvider, delay=0.2)
+
+    def test_open_close(self):
+        """ Test open & close: in parallel """
+        self.assertFalse(self.gw.health()['ready'])  # not open yet
+
+        start = time()
+        self.assertEqual(self.gw.open(), {})
+        self.assertLess(time() - start, 0.35)
+        self.assertEqual(self.gw.state, 'open')
+
+        health = self.gw.health()
+        self.assertEqual(health, {
+            'ready': True,
+            'state': 'open',
+            'providers': {
+                'a': {'healthy': True, 'error': None},
+                'b': {'healthy': True, 'error': None},
+            },
+        })
+
+        start = time()
+        self.assertEqual(self.gw.close(), {})
+        self.assertLess(time() - start, 0.35)
+        self.assertEqual(self.gw.state, 'closed')
+        self.assertFalse(self.gw.health()['ready'])
+        self.assertEqual(self.a.calls, ['health_check', 'open', 'health_check', 'close', 'health_check'])
+
+    def test_failures(self):
+        """ Test failed & slow providers """
+        self.a.error = exc.ConnectionError('Down')
+        errors = self.gw.open()
+        self.assertEqual(list(errors), ['a'])
+        self.assertIsInstance(errors['a'], exc.ConnectionError)
+        self.assertEqual(self.gw.state, 'open')  # still open: the other providers work
+
+        health = self.gw.health()
+        self.assertFalse(health['ready'])
+        self.assertFalse(health['providers']['a']['healthy'])
+        self.assertIn("ConnectionError('Down'", health['providers']['a']['error'])
+        self.assertTrue(health['providers']['b']['healthy'])
+
+        # Only some providers are required
+        self.assertTrue(self.gw.health(required=['b'])['ready'])
+
+        # Unhealthy, without an error
+        self.b.healthy = False
+        self.assertEqual(self.gw.health(required=['b'])['providers']['b'], {'healthy': False, 'error': None})
+
+        # Timeout
+        self.a.error = None
+        self.a.delay = 1
+        start = time()
+        health = self.gw.health(timeout=0.3, required=[])
+        self.assertLess(time() - start, 0.6)
+        self.assertTrue(health['ready'])
+        self.assertFalse(health['providers']['a']['healthy'])
+        self.assertIn('timed out', health['providers']['a']['error'])
+
+        # Still running: not called again
+        calls = len(self.a.calls)
+        health = self.gw.health(timeout=0.3, required=[])
+        self.assertIn('still running', health['providers']['a']['error'])
+        self.assertEqual(len(self.a.calls), calls)
+
+        # Finished: called again
+        sleep(0.5)
+        self.a.delay = 0
+        self.assertTrue(self.gw.health()['providers']['a']['healthy'])
+        self.assertEqual(len(self.a.calls), calls + 1)
+
+    def test_close_flushes_batches(self):
+        """ Test close(): fires the batch events """
+        gw = Gateway()
+        lo = gw.add_provider('lo', LoopbackProvider)
+        batches = []
+        gw.onReceiveBatch += batches.append
+        gw.receive_batcher.max_wait = 60
+
+        lo.received('+123', 'hi')
+        self.assertEqual(batches, [])
+        gw.close()
+        self.assertEqual([m.body for m in batches[0]], ['hi'])
+
+    def test_pool(self):
+        """ Test PoolProvider: delegates to the members """
+        gw = Gateway()
+        pool = gw.add_provider('pool', PoolProvider, members=[(LifecycleProvider, {}), (LifecycleProvider, {})])
+        a, b = [m.provider for m in pool.members]
+
+        # Healthy when any member is
+        a.healthy = False
+        self.assertTrue(gw.health()['providers']['pool']['healthy'])
+        b.error = exc.ConnectionError('Down')
+        health = gw.health()['providers']['pool']
+        self.assertFalse(health['healthy'])
+        self.assertIn("ConnectionError('Down'", health['error'])
+
+        # Open fails only when all members fail
+        self.assertEqual(gw.open(), {})
+        a.error = exc.ConnectionError('Down too')
+        self.assertEqual(list(gw.open()), ['pool'])
+
+        # Close: all members, even when one fails
+        a.error, b.error = exc.ConnectionError('Down'), None
+        errors = gw.close()
+        self.assertIsInstance(errors['pool'], exc.ConnectionError)
+        self.assertEqual(a.calls[-1], 'close')
+        self.assertEqual(b.calls[-1], 'close')
+
+    def test_config_gateway(self):
+        """ Test ConfigGateway: new providers are warmed up when open """
+        P = '{}:LifecycleProvider'.format(__name__)
+        gw = ConfigGateway({'providers': {'a': {'type': P}}})
+        a = gw.get_provider('a')
+        self.assertEqual(a.calls, [])  # not open: no warm-up
+
+        gw.open()
+        gw.reload({'providers': {'a': {'type': P}, 'b': {'type': P}}}, wait=True)
+        self.assertEqual(a.calls, ['open'])  # kept
+        self.assertEqual(gw.get_provider('b').calls, ['open'])
+
+        # Failed warm-up: the reload fails
+        with self.assertRaises(exc.ConnectionError):
+            gw.reload({'providers': {'a': {'type': P}, 'c': {'type': P, 'error': exc.ConnectionError('Down')}}})
+        self.assertEqual(sorted(gw._providers), ['a', 'b'])
+
+    def test_health_route(self):
+        """ Test the health route. ASGI lifespan: see asgi_cases """
+        app = self.gw.receiver_wsgi_app('/sms', health_path='/health/')
+        responses = []
+        body = app({'PATH_INFO': '/health', 'REQUEST_METHOD': 'GET', 'wsgi.input': None},
+                   lambda status, headers: responses.append(status))
+        self.assertEqual(responses, ['503 Service Unavailable'])
+        self.assertEqual(json.loads(body[0].decode('utf-8'))['state'], 'new')
@@ -1,4 +1,7 @@
 import unittest
+import json
+import logging
+import threading
 from testfixtures import LogCapture
 
 from smsframework import Gateway
@@ -6,8 +9,8 @@ from smsframework.providers import LogProvider
 from smsframework import OutgoingMessage
 
 
-class LoopbackProviderTest(unittest.TestCase):
-    """ Test LoopbackProvider """
+class LogProviderTest(unittest.TestCase):
+    """ Test LogProvider """
 
     def setUp(self):
         self.gw = Gateway()
@@ -20,3 +23,55 @@ class LoopbackProviderTest(unittest.TestCase):
             l.check(
                 ('smsframework.providers.log', 'INFO', 'Sent SMS to {}: {}'.format(msg.dst, msg.body)),
             )
+
+    def test_nonblocking_send(self):
+        """ Test non-blocking mode: structured records, written by the listener """
+        self.gw.add_provider('nb', LogProvider, nonblocking=True, batch_size=2)
+        provider = self.gw.get_provider('nb')
+
+        with LogCapture() as l:
+            for i in range(3):
+                self.gw.send(OutgoingMessage('+1234', 'body', provider='nb'))
+            provider.close()
+
+            records = [json.loads(line) for r in l.records for line in r.getMessage().split('\n')]
+            self.assertEqual(records, [
+                {'dst': '1234', 'provider': 'nb', 'msgid': str(i), 'body_len': 4}
+                for i in (1, 2, 3)
+            ])
+        self.assertEqual(provider.queue.written, 3)
+        self.assertEqual(provider.queue.dropped, 0)
+
+        # Closed: records are dropped, not queued forever
+        self.assertFalse(provider.queue.put({'dst': '1234'}))
+        self.assertEqual(provider.queue.dropped, 1)
+        self.assertEqual(provider.queue.queued, 3)
+
+    def test_nonblocking_overload(self):
+        """ Test non-blocking mode: records are dropped when the queue overflows """
+        # A logger that blocks until released
+        release = threading.Event()
+
+        class BlockingHandler(logging.Handler):
+            def emit(self, record):
+                release.wait()
+
+        logger = logging.getLogger('smsframework.test.blocking')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)  # don't depend on the root logger level
+        logger.addHandler(BlockingHandler())
+
+        self.gw.add_provider('nb', LogProvider, logger=logger, nonblocking=True, queue_size=2, batch_size=1)
+        provider = self.gw.get_provider('nb')
+
+        # Send: never blocks, though the handler does
+        for i in range(10):
+            self.gw.send(OutgoingMessage('+1234', 'body', provider='nb'))
+
+        # Check
+        self.assertGreaterEqual(provider.queue.dropped, 7)  # 1 message is being written, 2 are queued
+        self.assertEqual(provider.queue.queued + provider.queue.dropped, 10)
+
+        release.set()
+        provider.close()
+        self.assertEqual(provider.queue.written, provider.queue.queued)
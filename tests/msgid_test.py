@@ -0,0 +1,99 @@
+import os
+import unittest
+import threading
+
+from smsframework import Gateway, OutgoingMessage
+from smsframework.providers import NullProvider, LoopbackProvider
+from smsframework.lib.msgid import CounterIdGenerator, SnowflakeIdGenerator
+
+
+class MsgidTest(unittest.TestCase):
+    """ Test message id generators """
+
+    def generate(self, generator, threads=4, n=20000):
+        """ Generate ids in threads
+
+            :returns: list of lists of ids, one per thread
+        """
+        results = [None] * threads
+        def run(i):
+            results[i] = [generator() for _ in range(n)]
+        workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        return results
+
+    def test_counter(self):
+        """ Test CounterIdGenerator """
+        gen = CounterIdGenerator()
+        self.assertEqual([gen(), gen()], [1, 2])
+
+        ids = sum(self.generate(gen), [])
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_snowflake(self):
+        """ Test SnowflakeIdGenerator """
+        gen = SnowflakeIdGenerator(node=5)
+
+        # Unique, ordered within a thread
+        results = self.generate(gen)
+        ids = sum(results, [])
+        self.assertEqual(len(set(ids)), len(ids))
+        for result in results:
+            self.assertEqual(result, sorted(result))
+
+        # Parse
+        t, node, seq = gen.parse(str(ids[-1]))
+        self.assertEqual(node, 5)
+        self.assertLess(seq, 4096)
+        self.assertAlmostEqual(t, gen._now() / 1000.0 + gen.epoch / 1000.0, delta=5)
+
+        # Nodes don't collide
+        other = SnowflakeIdGenerator(node=6)
+        self.assertEqual(set(ids) & set(other() for _ in range(10000)), set())
+
+        # Default node
+        os.environ['SMSFRAMEWORK_NODE_ID'] = '42'
+        try:
+            self.assertEqual(SnowflakeIdGenerator().node, 42)
+        finally:
+            del os.environ['SMSFRAMEWORK_NODE_ID']
+        self.assertEqual(SnowflakeIdGenerator().node, os.getpid() & 1023)
+        self.assertRaises(AssertionError, SnowflakeIdGenerator, node=1024)
+
+    def test_snowflake_clock(self):
+        """ Test SnowflakeIdGenerator: clock going back, sequence exhaustion """
+        gen = SnowflakeIdGenerator(node=1)
+        now = [gen._now()]
+        gen._now = lambda: now[0]
+
+        # Sequence exhausted: the next millisecond is borrowed
+        ids = [gen() for _ in range(5000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(ids[-1] >> 22, (ids[0] >> 22) + 1)
+
+        # Clock goes back: still ordered
+        now[0] -= 1000
+        more = [gen() for _ in range(10)]
+        self.assertGreater(more[0], ids[-1])
+
+        # Clock goes forward: catches up
+        now[0] += 2000
+        later = gen()
+        self.assertEqual(gen.parse(later)[2], 0)
+        self.assertEqual(later >> 22, now[0])
+
+    def test_providers(self):
+        """ Test msgid_generator provider option """
+        gw = Gateway()
+        null = gw.add_provider('null', NullProvider)
+        lo = gw.add_provider('lo', LoopbackProvider, msgid_generator=SnowflakeIdGenerator(node=7))
+
+        self.assertEqual(gw.send(OutgoingMessage('+1', 'a', provider='null')).msgid, '1')
+        self.assertEqual(gw.send(OutgoingMessage('+1', 'b', provider='null')).msgid, '2')
+
+        msgid = gw.send(OutgoingMessage('+1', 'c', provider='lo')).msgid
+        self.assertEqual(lo.msgid_generator.parse(msgid)[1], 7)
+        self.assertEqual(lo.msgid_generator.parse(lo.received('+1', 'hi').msgid)[1], 7)
@@ -0,0 +1,83 @@
+import unittest
+from testfixtures import LogCapture, Replace
+
+from smsframework import Gateway, IncomingMessage
+from smsframework.providers import LoopbackProvider
+from smsframework.multipart import MultipartReassembler
+
+
+class MultipartTest(unittest.TestCase):
+    """ Test MultipartReassembler """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.lo = self.gw.add_provider('lo', LoopbackProvider)
+        self.addCleanup(self.gw.close)
+        self.gw.reassembly = self.reassembly = MultipartReassembler(timeout=60, max_sets=2)
+        self.received = []
+        self.gw.onReceive += self.received.append
+        self.dropped = []
+        self.reassembly.onDrop += self.dropped.append
+
+    def part(self, src, body, ref, part, parts, msgid=None):
+        """ Receive a message part """
+        meta = {'concat_ref': ref, 'concat_part': part, 'concat_parts': parts}
+        return self.lo._receive_message(IncomingMessage(src, body, msgid or body, meta=meta))
+
+    def test_reassembly(self):
+        """ Test combining the parts """
+        # Out of order, interleaved with another sender & reference
+        self.part('+1', 'c', 7, 3, 3)
+        self.part('+1', 'a', 7, 1, 3)
+        self.part('+2', 'x', 7, 1, 2)
+        self.part('+1', 'z', 8, 2, 2)
+        self.assertEqual(self.received, [])
+        self.assertEqual(len(self.reassembly), 2)  # max_sets: +1/7 is evicted
+
+        self.part('+2', 'y', 7, 2, 2)
+        self.part('+1', 'b', 7, 2, 3)  # +1/7 starts over
+        self.part('+1', 'y', 8, 1, 2)
+        self.assertEqual([(m.src, m.body) for m in self.received], [('2', 'xy'), ('1', 'yz')])
+
+        m = self.received[0]
+        self.assertEqual(m.provider, 'lo')
+        self.assertEqual(m.msgid, 'x')
+        self.assertEqual(m.meta, {'concat_ref': 7, 'concat_parts': 2, 'concat_msgids': ['x', 'y']})
+
+        self.assertEqual(self.reassembly.combined, 2)
+        self.assertEqual(self.reassembly.evicted, 1)
+        self.assertEqual([[p.body for p in parts] for parts in self.dropped], [['a', 'c']])
+
+        # Not a part, single part, invalid part: pass through
+        del self.received[:]
+        self.lo.received('+1', 'plain')
+        self.part('+1', 'single', 9, 1, 1)
+        self.part('+1', 'invalid', 9, 3, 2)
+        self.assertEqual([m.body for m in self.received], ['plain', 'single', 'invalid'])
+
+        # Batch event gets the combined message
+        batches = []
+        self.gw.onReceiveBatch += batches.append
+        self.part('+3', 'q', 1, 1, 2)
+        self.part('+3', 'r', 1, 2, 2)
+        self.gw.flush_batches()
+        self.assertEqual([[m.body for m in b] for b in batches], [['qr']])
+
+    def test_expire(self):
+        """ Test timeouts """
+        with Replace('smsframework.multipart.time', lambda: 1000.0):
+            self.part('+1', 'a', 1, 1, 2)
+        with Replace('smsframework.multipart.time', lambda: 1030.0):
+            self.part('+2', 'a', 1, 1, 2)
+
+        with Replace('smsframework.multipart.time', lambda: 1070.0), LogCapture() as logs:
+            self.part('+1', 'b', 1, 2, 2)  # too late: starts over
+        self.assertEqual(self.received, [])
+        self.assertEqual(self.reassembly.expired, 1)
+        self.assertEqual([[p.src for p in parts] for parts in self.dropped], [['1']])
+        self.assertIn('1 of 2 parts', str(logs))
+
+        with Replace('smsframework.multipart.time', lambda: 1095.0):
+            self.reassembly.expire()
+        self.assertEqual(self.reassembly.expired, 2)
+        self.assertEqual(len(self.reassembly), 1)
@@ -0,0 +1,98 @@
+import unittest
+
+from smsframework import Gateway, exc
+from smsframework.providers import NullProvider, PoolProvider
+from smsframework import OutgoingMessage
+
+
+class AccountProvider(NullProvider):
+    """ A provider that fails on demand """
+
+    def __init__(self, gateway, name, account):
+        super(AccountProvider, self).__init__(gateway, name)
+        self.account = account
+        self.sent = []
+        self.error = None
+
+    def send(self, message):
+        if self.error:
+            raise self.error
+        self.sent.append(message)
+        return super(AccountProvider, self).send(message)
+
+
+class PoolProviderTest(unittest.TestCase):
+    """ Test PoolProvider """
+
+    def setUp(self):
+        self.gw = Gateway()
+
+    def add_pool(self, strategy, weights=(1, 1, 1)):
+        self.pool = self.gw.add_provider('main', PoolProvider, strategy=strategy, members=[
+            (AccountProvider, {'account': i}, weight)
+            for i, weight in enumerate(weights)
+        ])
+        ' :type: PoolProvider '
+        self.accounts = [m.provider for m in self.pool.members]
+        return self.pool
+
+    def send(self, n):
+        for i in range(n):
+            msg = self.gw.send(OutgoingMessage('+123', 'hi'))
+            self.assertEqual(msg.provider, 'main')
+        return [len(a.sent) for a in self.accounts]
+
+    def test_round_robin(self):
+        """ Test round-robin balancing """
+        self.add_pool('round-robin')
+        self.assertEqual(self.send(6), [2, 2, 2])
+        self.assertEqual(self.accounts[0].name, 'main')
+
+    def test_weighted(self):
+        """ Test weighted balancing """
+        self.add_pool('weighted', (1, 0.0001, 3))
+        counts = self.send(400)
+        self.assertEqual(sum(counts), 400)
+        self.assertGreater(counts[2], counts[0] * 2)
+        self.assertLess(counts[1], 5)
+
+    def test_least_outstanding(self):
+        """ Test least-outstanding-requests balancing """
+        self.add_pool('least-outstanding')
+        self.pool.members[0].outstanding = 5
+        self.pool.members[2].outstanding = 1
+        self.assertEqual(self.send(4), [0, 4, 0])
+
+    def test_ejection(self):
+        """ Test ejection of failing members """
+        self.add_pool('round-robin')
+
+        # Limits exceeded: ejected
+        self.accounts[1].error = exc.LimitsError('Too fast')
+        with self.assertRaises(exc.LimitsError):
+            self.send(3)
+        self.assertTrue(self.pool.members[1].ejected)
+        self.assertEqual(self.send(4), [3, 0, 2])
+
+        # Message errors: not ejected
+        self.accounts[0].error = exc.RequestError('Bad number')
+        with self.assertRaises(exc.RequestError):
+            self.send(1)
+        self.assertFalse(self.pool.members[0].ejected)
+
+        # Ejection expires
+        self.accounts[0].error = self.accounts[1].error = None
+        self.pool.members[1].ejected_until = 0
+        self.assertEqual(self.send(3), [4, 1, 3])
+
+    def test_all_ejected(self):
+        """ Test that the pool keeps trying when all members are ejected """
+        self.add_pool('round-robin')
+        for m in self.pool.members:
+            self.pool.eject(m)
+        self.assertEqual(self.send(3), [1, 1, 1])
+
+    def test_by_name(self):
+        """ Test members given by provider name """
+        pool = self.gw.add_provider('pool', 'pool', members=[('null', {}), ('loopback', {})])
+        self.assertEqual(self.gw.send(OutgoingMessage('+123', 'hi', provider='pool')).provider, 'pool')
@@ -0,0 +1,102 @@
+import unittest
+from time import time
+
+from smsframework import Gateway, OutgoingMessage, exc
+from smsframework.providers import NullProvider
+from smsframework.retry import RetryPolicy, RetryBudget
+
+
+class FlakyProvider(NullProvider):
+    """ Fails with the given errors, then succeeds """
+
+    def __init__(self, gateway, name, errors=()):
+        super(FlakyProvider, self).__init__(gateway, name)
+        self.errors = list(errors)
+        self.attempts = 0
+
+    def send(self, message):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return super(FlakyProvider, self).send(message)
+
+
+class RetryTest(unittest.TestCase):
+    """ Test RetryPolicy """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.gw.retry_policy = RetryPolicy(backoff=0)
+
+        self.errors = []
+        self.gw.onSendError += lambda message, e: self.errors.append(e)
+
+    def test_retry(self):
+        """ Test retrying transient errors """
+        p = self.gw.add_provider('main', FlakyProvider, errors=[exc.ConnectionError(), exc.ServerError()])
+        message = self.gw.send(OutgoingMessage('+123', 'hi'))
+        self.assertEqual(message.provider, 'main')
+        self.assertIsNotNone(message.msgid)
+        self.assertEqual(p.attempts, 3)
+        self.assertEqual(len(self.errors), 2)
+
+        # Max attempts
+        p.errors = [exc.ConnectionError()] * 3
+        self.assertRaises(exc.ConnectionError, self.gw.send, OutgoingMessage('+123', 'hi'))
+        self.assertEqual(p.attempts, 6)
+
+        # Permanent errors are not retried
+        p.errors = [exc.RequestError()]
+        self.assertRaises(exc.RequestError, self.gw.send, OutgoingMessage('+123', 'hi'))
+        self.assertEqual(p.attempts, 7)
+
+        # Without a policy
+        self.gw.retry_policy = None
+        p.errors = [exc.ConnectionError()]
+        self.assertRaises(exc.ConnectionError, self.gw.send, OutgoingMessage('+123', 'hi'))
+        self.assertEqual(p.attempts, 8)
+
+    def test_failover(self):
+        """ Test failover to other providers """
+        main = self.gw.add_provider('main', FlakyProvider, errors=[exc.ServerError()] * 5)
+        backup = self.gw.add_provider('backup', FlakyProvider, errors=[exc.ServerError()])
+        main.retry_policy = RetryPolicy(max_attempts=4, backoff=0, failover=['backup', 'main'])
+
+        message = self.gw.send(OutgoingMessage('+123', 'hi'))
+        self.assertEqual(message.provider, 'backup')
+        self.assertEqual((main.attempts, backup.attempts), (2, 2))
+
+    def test_budget(self):
+        """ Test the retry budget """
+        budget = RetryBudget(ratio=0.5, min_per_second=0)
+        self.assertFalse(budget.withdraw())
+        for i in range(4):
+            budget.deposit()
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+
+        # Exhausted budget: no retries
+        p = self.gw.add_provider('main', FlakyProvider)
+        self.gw.retry_policy = RetryPolicy(backoff=0, budget=RetryBudget(ratio=0, min_per_second=0))
+        p.errors = [exc.ConnectionError()]
+        self.assertRaises(exc.ConnectionError, self.gw.send, OutgoingMessage('+123', 'hi'))
+        self.assertEqual(p.attempts, 1)
+
+    def test_deadline(self):
+        """ Test that retries respect the deadline """
+        p = self.gw.add_provider('main', FlakyProvider, errors=[exc.ConnectionError()] * 2)
+        self.gw.retry_policy = RetryPolicy(backoff=1000, max_backoff=1000)
+
+        # The delay may not exceed the time left
+        policy = self.gw.retry_policy
+        message = OutgoingMessage('+123', 'hi').options(deadline=time() + 0.001)
+        self.assertIsNone(policy.retry(message, exc.ConnectionError(), 0))
+
+        # Without a deadline, the delay is within the backoff
+        delay, provider = policy.retry(OutgoingMessage('+123', 'hi'), exc.ConnectionError(), 0)
+        self.assertTrue(0 <= delay <= 1000)
+
+        # Gateway gives up
+        self.assertRaises(exc.ConnectionError, self.gw.send, OutgoingMessage('+123', 'hi'), timeout=0.001)
+        self.assertEqual(p.attempts, 1)
@@ -0,0 +1,91 @@
+import unittest
+import threading
+
+from smsframework import Gateway, exc
+from smsframework.providers import NullProvider
+from smsframework.routing import AdaptiveRouter, ProviderStats
+from smsframework.admission import AdmissionControl
+from smsframework import OutgoingMessage
+
+
+class FailingProvider(NullProvider):
+    error = None
+
+    def send(self, message):
+        if self.error:
+            raise self.error
+        return super(FailingProvider, self).send(message)
+
+
+class AdaptiveRouterTest(unittest.TestCase):
+    """ Test AdaptiveRouter """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.gw.add_provider('default', NullProvider)
+        self.gw.add_provider('a', FailingProvider)
+        self.gw.add_provider('b', FailingProvider)
+        self.router = self.gw.router = AdaptiveRouter(self.gw, explore=0, prices={
+            'a': {'': 0.05, '1': 0.01},
+            'b': {'1': 0.02, '44': 0.02},
+        })
+
+    def send(self, dst):
+        return self.gw.send(OutgoingMessage(dst, 'hi').route()).provider
+
+    def test_prices(self):
+        """ Test price-based routing """
+        self.assertEqual(self.router.get_prices('1555'), {'a': 0.01, 'b': 0.02})
+        self.assertEqual(self.router.get_prices('4420'), {'a': 0.05, 'b': 0.02})
+        self.assertEqual(self.router.get_prices('7'), {'a': 0.05})
+
+        self.assertEqual(self.send('+1555'), 'a')
+        self.assertEqual(self.send('+4420'), 'b')
+        self.assertEqual(self.send('+7'), 'a')
+
+        # No prices: default provider
+        self.router.set_prices({'b': {'44': 0.02}})
+        self.assertEqual(self.send('+7'), 'default')
+
+    def test_errors(self):
+        """ Test that failing providers are avoided """
+        self.gw.get_provider('a').error = exc.ServerError('Down')
+        self.assertRaises(exc.ServerError, self.send, '+1555')
+        self.assertEqual(self.router.stats['a'].count, 1)
+        self.assertEqual(self.router.stats['a'].error_rate, 1.0)
+        self.assertEqual(self.send('+1555'), 'b')
+        self.assertEqual(self.router(OutgoingMessage('+7', 'hi')), 'a')  # still the only one
+
+        # Message errors do not count
+        self.gw.get_provider('b').error = exc.RequestError('Bad number')
+        self.assertRaises(exc.RequestError, self.send, '+1555')
+        self.assertEqual(self.router.stats['b'].count, 1)
+
+        # Neither do the gateway's own errors
+        self.gw.admission = AdmissionControl(max_in_flight_per_provider={'b': 0})
+        self.assertRaises(exc.OverloadError, self.send, '+1555')
+        self.gw.admission = None
+        self.assertRaises(exc.DeadlineError, self.gw.send, OutgoingMessage('+1555', 'hi').route(), -1)
+        self.assertEqual(self.router.stats['b'].count, 1)
+        self.assertEqual(self.router.stats['b'].error_rate, 0.0)
+
+    def test_latency(self):
+        """ Test that slow providers are avoided """
+        self.router.stats['a'].add(2.0, False, 0.1)  # 2 seconds = 0.02
+        self.assertEqual(self.send('+1555'), 'b')
+        self.assertEqual(self.router.stats['b'].count, 1)
+
+        # Explicitly addressed messages are not counted
+        self.gw.send(OutgoingMessage('+1555', 'hi', provider='b'))
+        self.assertEqual(self.router.stats['b'].count, 1)
+
+    def test_concurrent_stats(self):
+        """ Test that concurrent samples are not lost """
+        stats = ProviderStats()
+        threads = [threading.Thread(target=lambda: [stats.add(1.0, True, 0.1) for i in range(5000)]) for t in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(stats.count, 40000)
+        self.assertAlmostEqual(stats.latency, 1.0)
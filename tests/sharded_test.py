@@ -0,0 +1,70 @@
+import unittest
+
+from smsframework import Gateway, OutgoingMessage, exc
+from smsframework.providers import LoopbackProvider, NullProvider
+from smsframework.sharded import ShardedGateway
+
+
+class DownProvider(NullProvider):
+    """ Fails to send """
+
+    def send(self, message):
+        raise exc.ServerError('boom')
+
+
+def make_gateway():
+    """ Gateway factory for the workers """
+    gw = Gateway()
+    lo = gw.add_provider('lo', LoopbackProvider)
+    gw.add_provider('down', DownProvider)
+    lo.subscribe('+999', lambda message: message.reply('pong'))
+    return gw
+
+
+def broken_gateway():
+    """ Gateway factory that fails """
+    raise OverflowError(':(')
+
+
+class ShardedGatewayTest(unittest.TestCase):
+    """ Test ShardedGateway """
+
+    def test_send(self):
+        """ Test sending with worker processes """
+        events = []
+        with ShardedGateway(make_gateway, processes=3) as sgw:
+            sgw.onSend += lambda message: events.append(('send', message.dst, message.body))
+            sgw.onSendError += lambda message, e: events.append(('error', message.dst, e))
+            sgw.onReceive += lambda message: events.append(('receive', message.src, message.body))
+            sgw.onStatus += lambda status: events.append(('status', status.msgid))
+
+            messages = [OutgoingMessage('+{}'.format(i % 10), str(i)) for i in range(100)]
+            messages.append(OutgoingMessage('+999', 'ping'))
+            messages.append(OutgoingMessage('+999', 'down', provider='down'))  # same batch: the reply can't be pickled
+            messages.append(OutgoingMessage('+1', 'fail', provider='unknown'))  # AssertionError in the worker
+            messages.append(OutgoingMessage('+2', 'status').options(status_report=True))
+            self.assertEqual(sgw.send_many(messages), (102, 2))
+
+        # Per-number order
+        for dst in map(str, range(10)):
+            sent = [int(e[2]) for e in events if e[:2] == ('send', dst) and e[2].isdigit()]
+            self.assertEqual(sent, list(range(int(dst), 100, 10)))
+
+        # Events
+        self.assertIn(('receive', '999', 'pong'), events)
+        errors = {e[1]: e[2] for e in events if e[0] == 'error'}
+        self.assertIsInstance(errors['1'], AssertionError)
+        self.assertIsInstance(errors['999'], exc.ServerError)  # picklable errors are kept as they are
+        self.assertEqual(len([e for e in events if e[0] == 'status']), 1)
+
+    def test_dead_worker(self):
+        """ Test that a dead worker doesn't hang the parent """
+        sgw = ShardedGateway(broken_gateway, processes=2, queue_size=1)
+        with self.assertRaises(RuntimeError):
+            sgw.send_many(OutgoingMessage('+{}'.format(i), 'hi') for i in range(1000))  # queues get full
+        sgw.close()
+
+        sgw = ShardedGateway(broken_gateway, processes=1)
+        sgw.send(OutgoingMessage('+1', 'hi'))
+        self.assertRaises(RuntimeError, sgw.join)  # waits for the message
+        sgw.close()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from smsframework import Gateway, MessageTemplate, OutgoingMessage, exc
+from smsframework.providers import LoopbackProvider
+from smsframework.lib.gsm import segments
+
+
+class PickyProvider(LoopbackProvider):
+    """ Does not send to '0' """
+
+    def send(self, message):
+        if message.dst == '0':
+            raise exc.RequestError('Invalid number')
+        return super(PickyProvider, self).send(message)
+
+
+class TemplateTest(unittest.TestCase):
+    """ Test MessageTemplate """
+
+    def test_render(self):
+        """ Test rendering """
+        t = MessageTemplate('Hi {name}, {{you}} owe {amount:.2f} {user[currency]}')
+        self.assertEqual(t.render(name='Ann', amount=1.5, user={'currency': 'EUR'}), 'Hi Ann, {you} owe 1.50 EUR')
+        self.assertRaises(KeyError, t.render, name='Ann')
+
+        # Messages
+        t = MessageTemplate('Hi {name}', src='+1').options(senderId='Shop').params(a=1).route('x')
+        m1, m2 = t.messages([('+1 (23)', {'name': 'Ann'}), ('+456', {'name': 'Bob'})])
+        self.assertIsInstance(m1, OutgoingMessage)
+        self.assertEqual((m1.dst, m1.body, m1.src), ('123', 'Hi Ann', '+1'))
+        self.assertEqual((m2.dst, m2.body), ('456', 'Hi Bob'))
+        self.assertIs(m1.provider_options, m2.provider_options)
+        self.assertEqual(m2.provider_options.senderId, 'Shop')
+        self.assertEqual(m2.provider_params, {'a': 1})
+        self.assertEqual(m2.routing_values, ('x',))
+        self.assertIsNone(m2.msgid)
+
+    def test_segments(self):
+        """ Test encoding and segment count """
+        self.assertEqual(segments('a' * 160), ('gsm7', 1))
+        self.assertEqual(segments('a' * 161), ('gsm7', 2))
+        self.assertEqual(segments(u'€' * 80), ('gsm7', 1))
+        self.assertEqual(segments(u'€' * 81), ('gsm7', 2))
+        self.assertEqual(segments(u'я' * 70), ('ucs2', 1))
+        self.assertEqual(segments(u'я' * 135), ('ucs2', 3))
+
+        t = MessageTemplate('a' * 150 + '{name}')
+        self.assertEqual(t.segments(name='b' * 10), ('gsm7', 1))
+        self.assertEqual(t.segments(name='b' * 11), ('gsm7', 2))
+        self.assertEqual(t.segments(name=u'я'), ('ucs2', 3))
+        for name in ('b', u'€' * 6, u'я' * 20):
+            self.assertEqual(t.segments(name=name), segments(t.render(name=name)))
+
+    def test_send_template(self):
+        """ Test Gateway.send_template() """
+        gw = Gateway()
+        lo = gw.add_provider('lo', PickyProvider)
+
+        errors = []
+        gw.onSendError += lambda message, e: errors.append(e)
+
+        t = MessageTemplate('Hi {name}')
+        recipients = (('+{}'.format(i), {'name': str(i)}) for i in (1, 2, 0, 3))
+        self.assertEqual(gw.send_template(t, recipients, timeout=10), (3, 1))
+        self.assertEqual([m.body for m in lo.get_traffic()], ['Hi 1', 'Hi 2', 'Hi 3'])
+        self.assertIsNone(t.provider_options.deadline)  # the template is not modified: it can be reused
+        self.assertEqual(gw.send_template(t, [('+4', {'name': '4'})], timeout=10), (1, 0))
+
+        # The batch timeout
+        self.assertRaises(exc.DeadlineError, gw.send_template, t, [('+1', {'name': 'a'})] * 3, timeout=-1)
+        self.assertEqual(len(errors), 2)
+        del errors[:]
+
+        # Deadline stops the sending
+        t.options(deadline=0)
+        self.assertRaises(exc.DeadlineError, gw.send_template, t, [('+1', {'name': 'a'})] * 3)
+        self.assertEqual(len(errors), 1)
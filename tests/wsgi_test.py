@@ -0,0 +1,114 @@
+import unittest
+import json
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from smsframework import Gateway, exc
+from smsframework.providers import ForwardClientProvider, ForwardServerProvider, LoopbackProvider
+from smsframework import OutgoingMessage, IncomingMessage, MessageDelivered
+from smsframework.multipart import MultipartReassembler
+from smsframework.providers.forward.provider import jsonex_dumps, jsonex_loads
+
+
+class WsgiReceiverTest(unittest.TestCase):
+    """ Test Gateway.receiver_wsgi_app() """
+
+    def setUp(self):
+        self.gw = Gateway()
+        self.gw.add_provider('lo', LoopbackProvider)
+        self.gw.add_provider('fwd', ForwardClientProvider, server_url='http://localhost')
+        self.gw.add_provider('srv', ForwardServerProvider, clients=[])
+        self.app = self.gw.receiver_wsgi_app('/sms/')
+        self.addCleanup(self.gw.close)
+
+        self.events = []
+        self.gw.onReceive += self.events.append
+        self.gw.onStatus += self.events.append
+
+    def request(self, path, data=None, method='POST'):
+        """ Make a request, return (status, headers, body) """
+        body = jsonex_dumps(data) if data is not None else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+        }
+        setup_testing_defaults(environ)
+
+        response = {}
+        def start_response(status, headers):
+            response['status'], response['headers'] = status, dict(headers)
+        res = b''.join(self.app(environ, start_response))
+        return response['status'], response['headers'], res
+
+    def test_routes(self):
+        """ Test routing """
+        self.assertEqual(set(self.app.routes), {'/sms/fwd/im', '/sms/fwd/status', '/sms/srv/im'})
+
+        status, headers, body = self.request('/sms/lo/im')
+        self.assertEqual(status, '404 Not Found')
+
+    def test_client(self):
+        """ Test ForwardClientProvider receivers """
+        # Message
+        status, headers, body = self.request('/sms/fwd/im/', {'message': IncomingMessage('+123', 'hi')})
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertEqual(jsonex_loads(body)['message'].body, 'hi')
+
+        # Status
+        status, headers, body = self.request('/sms/fwd/status', {'status': MessageDelivered('1')})
+        self.assertEqual(status, '200 OK')
+
+        self.assertEqual(len(self.events), 2)
+        self.assertIsInstance(self.events[0], IncomingMessage)
+        self.assertIsInstance(self.events[1], MessageDelivered)
+
+    def test_client_batches(self):
+        """ Test ForwardClientProvider receivers: batches & reassembly, the remote provider is kept """
+        self.gw.reassembly = MultipartReassembler()
+        messages, statuses = [], []
+        self.gw.onReceiveBatch += messages.extend
+        self.gw.onStatusBatch += statuses.extend
+
+        for part in (1, 2):
+            message = IncomingMessage('+123', 'hi' * part, meta={'concat_ref': 1, 'concat_part': part, 'concat_parts': 2})
+            message.provider = 'remote'
+            self.request('/sms/fwd/im', {'message': message})
+        status = MessageDelivered('1')
+        status.provider = 'remote'
+        self.request('/sms/fwd/status', {'status': status})
+        self.gw.receive_batcher.flush()
+        self.gw.status_batcher.flush()
+
+        self.assertEqual([(m.body, m.provider) for m in messages], [('hihihi', 'remote')])
+        self.assertEqual([(s.msgid, s.provider) for s in statuses], [('1', 'remote')])
+        self.assertEqual(self.events, [messages[0], statuses[0]])
+
+    def test_server(self):
+        """ Test ForwardServerProvider receiver """
+        status, headers, body = self.request('/sms/srv/im', {'message': OutgoingMessage('+123', 'hi')})
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(jsonex_loads(body)['message'].provider, 'lo')
+        self.assertEqual(len(self.gw.get_provider('lo').get_traffic()), 1)
+
+        # The client's time budget
+        status, headers, body = self.request('/sms/srv/im', {'message': OutgoingMessage('+123', 'hi'), 'timeout': 10})
+        self.assertEqual(status, '200 OK')
+        self.assertAlmostEqual(jsonex_loads(body)['message'].time_left(), 10, delta=1)
+
+        status, headers, body = self.request('/sms/srv/im', {'message': OutgoingMessage('+123', 'hi'), 'timeout': 0})
+        self.assertEqual(status, '500 Internal Server Error')
+        self.assertIsInstance(jsonex_loads(body)['error'], exc.DeadlineError)
+
+    def test_error(self):
+        """ Test error reporting """
+        def fail(message):
+            raise OverflowError(':(')
+        self.gw.onReceive += fail
+
+        status, headers, body = self.request('/sms/fwd/im', {'message': IncomingMessage('+123', 'hi')})
+        self.assertEqual(status, '500 Internal Server Error')
+        self.assertIn('OverflowError', json.loads(body.decode())['error']['?E'])